@@ -1,21 +1,281 @@
-from utils import bckndSql
-from utils.bckndTools import arrangementTextToObj, splitEndline, optCourseQueryListGenerator
-from flask import Flask, request, jsonify
+from utils import bckndCache, bckndCompress, bckndEnrollment, bckndJson, bckndSql, bckndSnapshot, bckndStream, bckndVersion, bckndWarmup
+from utils.bckndTools import MAX_WEEK, WEEK_FORMATS, applyWeekFormat, attachArrangementInfo, mergeSameCode, optCourseSectionRange, optCourseTimeGrid
+from flask import Flask, Response, request, jsonify, g
 import configparser
+import hashlib
+import json
 from datetime import datetime
 
 app = Flask(__name__)
+app.json = bckndJson.JSONProvider(app) # orjson 可用时用它编码响应
 
 CONFIG = configparser.ConfigParser()
 CONFIG.read('config.ini', encoding='utf-8')
 
 IS_DEBUG = CONFIG['Switch']['debug'] # 1 / 0
 
+# 数据版本，即最近一次爬取的时间，所有接口的数据都只在爬取后变化
+CRAWL_VERSION = bckndVersion.CrawlVersion(
+    checkInterval=CONFIG.getint('Version', 'check_interval', fallback=60) # 秒，检查 fetchlog 的间隔
+)
+
+# 内存快照模式，开启后读接口直接由内存中的学期数据回答，爬虫更新后自动重新加载
+SNAPSHOT_ENABLED = CONFIG.getboolean('Snapshot', 'enabled', fallback=False)
+SNAPSHOT_STORE = bckndSnapshot.SnapshotStore(CRAWL_VERSION)
+
+# 查询结果缓存，键中包含数据版本，爬取后旧结果不再命中
+CACHE_ENABLED = CONFIG.getboolean('Cache', 'enabled', fallback=True)
+
+if CONFIG.get('Cache', 'store', fallback='memory') == 'redis':
+    CACHE_STORE = bckndCache.RedisStore(CONFIG.get('Cache', 'redis_url', fallback='redis://localhost:6379/0'))
+else:
+    CACHE_STORE = bckndCache.MemoryStore(maxBytes=CONFIG.getint('Cache', 'max_bytes', fallback=128 * 1024 * 1024))
+
+RESPONSE_CACHE = bckndCache.ResponseCache(
+    CACHE_STORE,
+    version=CRAWL_VERSION.get,
+    ttl=CONFIG.getint('Cache', 'ttl', fallback=3600) # 秒
+)
+
+# 响应压缩，按 Accept-Encoding 选择 br / gzip，压缩结果按 ETag 和响应体摘要缓存，每次爬取后每个响应只压缩一次
+COMPRESS_ENABLED = CONFIG.getboolean('Compress', 'enabled', fallback=True)
+
+if CONFIG.get('Cache', 'store', fallback='memory') == 'redis':
+    COMPRESS_STORE = bckndCache.RedisStore(CONFIG.get('Cache', 'redis_url', fallback='redis://localhost:6379/0'), prefix="tjcs:z:", decode=False)
+else:
+    COMPRESS_STORE = bckndCache.MemoryStore(maxBytes=CONFIG.getint('Compress', 'max_bytes', fallback=32 * 1024 * 1024))
+
+RESPONSE_COMPRESSOR = bckndCompress.ResponseCompressor(
+    COMPRESS_STORE,
+    ttl=CONFIG.getint('Cache', 'ttl', fallback=3600), # 秒
+    level=CONFIG.getint('Compress', 'level', fallback=9), # gzip 1-9
+    brotliQuality=CONFIG.getint('Compress', 'brotli_quality', fallback=9), # brotli 0-11
+    minSize=CONFIG.getint('Compress', 'min_size', fallback=1024) # 字节，更小的响应不压缩
+)
+
+# 结果只由爬取数据决定的查询
+CACHED_METHODS = {
+    'getAllCalendar', 'getAllCampus', 'getAllFaculty', 'findGradeByCalendarId', 'findMajorByGrade',
+    'findCourseByMajor', 'findOptionalCourseType', 'findCourseByNatureId', 'findCourseDetailByCode',
+    'findCourseBySearch', 'findCourseByTime', 'getAllRooms', 'getCoursesByRoom',
+}
+
+# 选课人数在两次爬取之间也会变化（crawler/refreshEnrollment.py），总是读 MySQL，只短暂缓存
+ENROLLMENT_CACHE = bckndEnrollment.EnrollmentCache(
+    ttl=CONFIG.getfloat('Enrollment', 'ttl', fallback=10), # 秒
+    maxSize=CONFIG.getint('Enrollment', 'max_size', fallback=20000)
+)
+ENROLLMENT_MAX_CODES = CONFIG.getint('Enrollment', 'max_codes', fallback=200) # 一次最多查询的教学班数
+
+# 选课人数变化推送，所有订阅者共用一个读取 enrollmenthistory 的线程
+ENROLLMENT_FEED = bckndStream.EnrollmentFeed(
+    pollInterval=CONFIG.getfloat('Stream', 'poll_interval', fallback=2), # 秒
+    maxSubscribers=CONFIG.getint('Stream', 'max_subscribers', fallback=500)
+)
+STREAM_HEARTBEAT = CONFIG.getfloat('Stream', 'heartbeat', fallback=15) # 秒，没有变化时发送注释行保持连接
+
+# 不由爬取数据决定的接口，不加 ETag
+UNVERSIONED_ENDPOINTS = {'health', 'getPoolStats', 'getCacheStats', 'getCourseReviews', 'getEnrollmentByCodes', 'streamEnrollment'}
+
+def dataSource():
+    '''
+    The object answering read queries, used as `with dataSource() as sql:`.
+    It is the in-memory snapshot when enabled, a pooled MySQL connection otherwise,
+    behind the response cache when enabled.
+    '''
+    factory = SNAPSHOT_STORE.session if SNAPSHOT_ENABLED else bckndSql.bckndSql
+
+    if CACHE_ENABLED:
+        return bckndCache.CachedSession(RESPONSE_CACHE, CACHED_METHODS, factory)
+
+    return factory()
+
+def rawResponse(raw):
+    '''
+    Successful response around `raw`, the key-sorted JSON text of its data
+    (see bckndCache.rawResult), for endpoints that return query results unchanged
+    '''
+    return app.response_class(bckndJson.envelope(raw), mimetype=app.json.mimetype)
+
+def weekFormatOf(payload):
+    '''
+    The `weekFormat` of a payload, "list" when absent, None when invalid.
+    See bckndTools.applyWeekFormat
+    '''
+    weekFormat = payload.get('weekFormat', 'list')
+
+    return weekFormat if weekFormat in WEEK_FORMATS else None
+
+def requestETag():
+    '''
+    Strong ETag of the current request: crawl version + path + normalized payload
+    '''
+    if request.method == 'GET':
+        payload = sorted(request.args.items(multi=True))
+    else:
+        payload = request.get_json(silent=True)
+
+    key = json.dumps([str(CRAWL_VERSION.get()), request.path, payload], sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+@app.before_request
+def startWarmer():
+    '''
+    Start the cache warmer with the first request instead of at import,
+    so that importing the app (e.g. exportStatic.py, tests) starts no thread
+    '''
+    if WARMUP_ENABLED:
+        CACHE_WARMER.start()
+
+@app.before_request
+def checkETag():
+    '''
+    Answer 304 Not Modified before touching any query when If-None-Match matches
+    '''
+    if request.endpoint is None or request.endpoint in UNVERSIONED_ENDPOINTS:
+        return None
+
+    g.etag = requestETag()
+
+    # 压缩后的响应带有编码后缀，见 addETag
+    tags = [g.etag] + [f"{g.etag}-{encoding}" for encoding in RESPONSE_COMPRESSOR.encodings()]
+    matched = next((tag for tag in tags if tag in request.if_none_match), None)
+
+    if matched is not None:
+        response = app.response_class(status=304)
+        response.set_etag(matched)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    return None
+
+@app.after_request
+def addETag(response):
+    '''
+    Attach the ETag computed in checkETag to successful responses,
+    suffixed with the Content-Encoding of a compressed body
+    '''
+    if response.status_code == 200 and 'etag' in g:
+        encoding = response.headers.get('Content-Encoding')
+        response.set_etag(f"{g.etag}-{encoding}" if encoding else g.etag)
+        response.headers['Cache-Control'] = 'no-cache' # 允许缓存，但每次都要验证
+
+    return response
+
+# after_request 按注册的逆序执行，compressResponse 在 addETag 之前
+@app.after_request
+def compressResponse(response):
+    '''
+    Compress JSON responses with the best encoding the client accepts.
+    Versioned responses are compressed once per crawl, see bckndCompress
+    '''
+    if (
+        not COMPRESS_ENABLED
+        or response.status_code != 200
+        or response.is_streamed
+        or response.direct_passthrough
+        or 'Content-Encoding' in response.headers
+        or response.mimetype != 'application/json'
+    ):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = RESPONSE_COMPRESSOR.negotiate(request.accept_encodings)
+
+    if encoding is None:
+        return response
+
+    body = response.get_data()
+
+    if len(body) < RESPONSE_COMPRESSOR.minSize:
+        return response
+
+    response.set_data(RESPONSE_COMPRESSOR.compress(body, encoding, g.get('etag')))
+    response.headers['Content-Encoding'] = encoding
+
+    return response
+
 # 全局变量
 
 LABEL_LIST = [ "通识选修课", "人文经典与审美素养", "科学探索与生命关怀", "社会发展与国际视野", "工程能力与创新思维" ] # 选修课标签，写死
 INNER_LABEL_LIST = [811, 829, 830, 831, 832, 855, 940, 947, 955, 956, 957, 958]
 
+def optionalTimeGrid(sql, calendarId):
+    '''
+    The findOptionalCourseTimeGrid grid of a calendar, kept in the response cache
+    under the crawl version like every other query result
+    '''
+    load = lambda: optCourseTimeGrid(sql.findOptionalCourseArrangement(INNER_LABEL_LIST, calendarId))
+
+    if not CACHE_ENABLED:
+        return load()
+
+    return RESPONSE_CACHE.get('findOptionalCourseTimeGrid', [calendarId], load)
+
+# 缓存预热，启动时和每次爬取后在后台预先查询最新学期的热门接口
+WARMUP_ENABLED = CONFIG.getboolean('Warmup', 'enabled', fallback=CACHE_ENABLED)
+WARMUP_TOP_MAJORS = CONFIG.getint('Warmup', 'top_majors', fallback=50) # 预热 findCourseByMajor 的专业数
+
+def newestCalendar(sql):
+    '''
+    (calendarId, grades) of the newest calendar with courses, (None, []) when there is none
+    '''
+    for calendar in sql.getAllCalendar():
+        grades = sql.findGradeByCalendarId(calendar['calendarId'])
+
+        if grades:
+            return calendar['calendarId'], grades
+
+    return None, []
+
+def warmupPlan(sql):
+    '''
+    Plan a warm-up of the newest calendar, i.e. the newest one with courses.
+    The static lists, grades and majors are read (and cached) here, the returned tasks
+    run the heavy queries with the same arguments the frontend sends:
+    electives and their time grid, and findCourseByMajor of the most requested majors,
+    topped up with the majors of the newest grades
+    '''
+    sql.getAllCampus()
+    sql.getAllFaculty()
+
+    calendarId, grades = newestCalendar(sql)
+
+    if calendarId is None:
+        return None, []
+
+    majors = [(grade, major['code']) for grade in grades for major in sql.findMajorByGrade(grade)]
+    ids = [label['courseLabelId'] for label in sql.findOptionalCourseType(LABEL_LIST, calendarId)]
+
+    tasks = [
+        ("findCourseByNatureId", lambda sql: sql.findCourseByNatureId(ids, calendarId)),
+        ("findOptionalCourseTimeGrid", lambda sql: optionalTimeGrid(sql, calendarId)),
+    ]
+
+    # 先按请求次数，再按年级从新到旧补足
+    known = set(majors)
+    selected = [key for key in CACHE_WARMER.hottest(WARMUP_TOP_MAJORS) if key in known]
+
+    for key in majors:
+        if len(selected) >= WARMUP_TOP_MAJORS:
+            break
+
+        if key not in selected:
+            selected.append(key)
+
+    for grade, code in selected:
+        tasks.append((f"findCourseByMajor {grade} {code}", lambda sql, grade=grade, code=code: sql.findCourseByMajor(grade, code, calendarId)))
+
+    return calendarId, tasks
+
+CACHE_WARMER = bckndWarmup.CacheWarmer(
+    version=CRAWL_VERSION.get,
+    session=dataSource,
+    plan=warmupPlan,
+    checkInterval=CONFIG.getint('Warmup', 'check_interval', fallback=60) # 秒，检查是否有新的爬取
+)
+
 @app.route('/api/getAllCalendar', methods=['GET'])
 def getAllCalendar():
     '''
@@ -43,14 +303,10 @@ def getAllCalendar():
     ```
     '''
 
-    with bckndSql.bckndSql() as sql:
-        result = sql.getAllCalendar()
-    
-    return jsonify({
-        "code": 200,
-        "msg": "查询成功",
-        "data": result
-    }), 200
+    with dataSource() as sql:
+        result = bckndCache.rawResult(sql, 'getAllCalendar')
+
+    return rawResponse(result), 200
 
 @app.route('/api/getAllCampus', methods=['GET'])
 def getAllCampus():
@@ -76,14 +332,10 @@ def getAllCampus():
     ```
     '''
 
-    with bckndSql.bckndSql() as sql:
-        result = sql.getAllCampus()
+    with dataSource() as sql:
+        result = bckndCache.rawResult(sql, 'getAllCampus')
 
-    return jsonify({
-        "code": 200,
-        "msg": "查询成功",
-        "data": result
-    }), 200
+    return rawResponse(result), 200
 
 @app.route('/api/getAllFaculty', methods=['GET'])
 def getAllFaculty():
@@ -116,14 +368,10 @@ def getAllFaculty():
     ```
     '''
 
-    with bckndSql.bckndSql() as sql:
-        result = sql.getAllFaculty()
+    with dataSource() as sql:
+        result = bckndCache.rawResult(sql, 'getAllFaculty')
 
-    return jsonify({
-        "code": 200,
-        "msg": "查询成功",
-        "data": result
-    }), 200
+    return rawResponse(result), 200
 
 @app.route('/api/findGradeByCalendarId', methods=['POST'])
 def findGradeByCalendarId():
@@ -151,7 +399,7 @@ def findGradeByCalendarId():
 
     payload = request.json
 
-    with bckndSql.bckndSql() as sql:
+    with dataSource() as sql:
         result = sql.findGradeByCalendarId(payload['calendarId'])
 
     return jsonify({
@@ -198,14 +446,10 @@ def findMajorByGrade():
 
     payload = request.json
 
-    with bckndSql.bckndSql() as sql:
-        result = sql.findMajorByGrade(payload['grade'])
+    with dataSource() as sql:
+        result = bckndCache.rawResult(sql, 'findMajorByGrade', payload['grade'])
 
-    return jsonify({
-        "code": 200,
-        "msg": "查询成功",
-        "data": result
-    }), 200
+    return rawResponse(result), 200
 
 @app.route('/api/findCourseByMajor', methods=['POST'])
 def findCourseByMajor():
@@ -217,7 +461,8 @@ def findCourseByMajor():
     {
         "grade": 2023,
         "code": "10054",
-        "calendarId": 119
+        "calendarId": 119,
+        "weekFormat": "list" // 可选，"list" / "mask" / "both"，见 bckndTools.applyWeekFormat
     }
     ```
 
@@ -320,42 +565,27 @@ def findCourseByMajor():
     '''
 
     payload = request.json
+    weekFormat = weekFormatOf(payload)
 
-    with bckndSql.bckndSql() as sql:
+    if weekFormat is None:
+        return jsonify({
+            "code": 400,
+            "msg": "weekFormat 有误",
+            "data": []
+        }), 400
+
+    with dataSource() as sql:
         result = sql.findCourseByMajor(payload['grade'], payload['code'], payload['calendarId'])
 
+    CACHE_WARMER.record((payload['grade'], payload['code']))
+
     # 处理 result 中的 locations 字段
     # 由于 locations 字段是一个字符串，需要转换为数组
     # 形如：关佶红(05222) 星期一3-4节 [1-17] 南129\n关佶红(05222) 星期三3-4节 [1-17单] 北301\n
-
-    for res in result:
-        for course in res['courses']:
-            course['arrangementInfo'] = []
-
-            for location in splitEndline(course['locations']):
-                course['arrangementInfo'].append(arrangementTextToObj(location))
-
-            del course['locations']
-
     # 对于 code 相同的课程，合并 arrangementInfo
 
     for res in result:
-        res['courses'] = sorted(res['courses'], key=lambda x: x['code']) # 先排序
-
-        # 合并相同课号的课程
-        merged_courses = []
-        current_course = None
-
-        for course in res['courses']:
-            if not current_course or current_course['code'] != course['code']:
-                merged_courses.append(course)
-                current_course = course
-            else:
-                # 如果arrangementInfo不同，则合并
-                if current_course['arrangementInfo'] != course['arrangementInfo']:
-                    current_course['arrangementInfo'].extend(course['arrangementInfo'])
-
-        res['courses'] = merged_courses
+        res['courses'] = applyWeekFormat(mergeSameCode([attachArrangementInfo(course) for course in res['courses']]), weekFormat)
 
     return jsonify({
         "code": 200,
@@ -410,14 +640,10 @@ def findOptionalCourseType():
 
     payload = request.json
 
-    with bckndSql.bckndSql() as sql:
-        result = sql.findOptionalCourseType(LABEL_LIST, payload['calendarId'])
+    with dataSource() as sql:
+        result = bckndCache.rawResult(sql, 'findOptionalCourseType', LABEL_LIST, payload['calendarId'])
 
-    return jsonify({
-        "code": 200,
-        "msg": "查询成功",
-        "data": result
-    }), 200
+    return rawResponse(result), 200
 
 @app.route('/api/findCourseByNatureId', methods=['POST'])
 def findCourseByNatureId():
@@ -531,14 +757,10 @@ def findCourseByNatureId():
                 "msg": "目前只支持查询选修课标签",
             }), 400
 
-    with bckndSql.bckndSql() as sql:
-        result = sql.findCourseByNatureId(payload['ids'], payload['calendarId'])
+    with dataSource() as sql:
+        result = bckndCache.rawResult(sql, 'findCourseByNatureId', payload['ids'], payload['calendarId'])
 
-    return jsonify({
-        "code": 200,
-        "msg": "查询成功",
-        "data": result
-    }), 200
+    return rawResponse(result), 200
 
 @app.route('/api/findCourseDetailByCode', methods=['POST'])
 def findCourseDetailByCode():
@@ -550,7 +772,8 @@ def findCourseDetailByCode():
     ```json
     {
         "courseCode": "340012",
-        "calendarId": 119
+        "calendarId": 119,
+        "weekFormat": "list" // 可选，同 findCourseByMajor
     }
     ```
 
@@ -602,49 +825,177 @@ def findCourseDetailByCode():
     '''
 
     payload = request.json
+    weekFormat = weekFormatOf(payload)
+
+    if weekFormat is None:
+        return jsonify({
+            "code": 400,
+            "msg": "weekFormat 有误",
+            "data": []
+        }), 400
 
-    with bckndSql.bckndSql() as sql:
+    with dataSource() as sql:
         result = sql.findCourseDetailByCode(payload['courseCode'], payload['calendarId'])
 
     # 处理 result 中的 locations 字段
     # 由于 locations 字段是一个字符串，需要转换为数组
     # 形如：关佶红(05222) 星期一3-4节 [1-17] 南129\n关佶红(05222) 星期三3-4节 [1-17单] 北301\n
 
-    for course in result:
-        course['arrangementInfo'] = []
+    # 对于 code 相同的课程，合并 arrangementInfo
 
-        for location in splitEndline(course['locations']):
-            course['arrangementInfo'].append(arrangementTextToObj(location))
+    result = applyWeekFormat(mergeSameCode([attachArrangementInfo(course) for course in result]), weekFormat)
 
-        del course['locations']
+    return jsonify({
+        "code": 200,
+        "msg": "查询成功",
+        "data": result
+    }), 200
 
-    # 对于 code 相同的课程，合并 arrangementInfo
-    
-    result = sorted(result, key=lambda x: x['code']) # 先排序
 
-    # 合并相同课号的课程
-    merged_result = []
-    current_course = None
+@app.route('/api/getEnrollmentByCodes', methods=['POST'])
+def getEnrollmentByCodes():
+    '''
+    Get capacity (number) and enrolled count (elcNumber) of many teaching classes at once,
+    e.g. to refresh every staged course with one request. Counts are at most
+    [Enrollment] ttl seconds older than the database, codes not in the calendar are left out.
+
+    Payload：
+
+    ```json
+    {
+        "calendarId": 119,
+        "codes": ["34001201", "34001202"]
+    }
+    ```
+
+    Response：
 
-    for course in result:
-        if not current_course or current_course['code'] != course['code']:
-            merged_result.append(course)
-            current_course = course
-        else:
-            # 如果arrangementInfo不同，则合并
-            if current_course['arrangementInfo'] != course['arrangementInfo']:
-                current_course['arrangementInfo'].extend(course['arrangementInfo'])
+    ```json
+    {
+        "code": 200,
+        "msg": "查询成功",
+        "data": [
+            {
+                "code": "34001201",
+                "number": 120,
+                "elcNumber": 98
+            },
 
-    result = merged_result
+            // ...
 
+        ]
+    }
+    ```
+    '''
 
+    payload = request.get_json(silent=True) or {}
+    codes = payload.get('codes')
+    calendarId = payload.get('calendarId')
+
+    # calendarId 用作缓存键，不是整数（如数组、对象）时直接拒绝
+    if (
+        not isinstance(codes, list) or not all(isinstance(code, str) for code in codes)
+        or not isinstance(calendarId, int) or isinstance(calendarId, bool)
+    ):
+        return jsonify({
+            "code": 400,
+            "msg": "请指定 calendarId 和 codes",
+            "data": []
+        }), 400
+
+    if len(codes) > ENROLLMENT_MAX_CODES:
+        return jsonify({
+            "code": 400,
+            "msg": f"codes 最多 {ENROLLMENT_MAX_CODES} 个",
+            "data": []
+        }), 400
+
+    codes = list(dict.fromkeys(codes))
+
+    def load(calendarId, missing):
+        with bckndSql.bckndSql() as sql:
+            return sql.getEnrollmentByCodes(missing, calendarId)
+
+    counts = ENROLLMENT_CACHE.get(calendarId, codes, load) if codes else {}
 
     return jsonify({
         "code": 200,
         "msg": "查询成功",
-        "data": result
+        "data": [
+            {"code": code, "number": counts[code][0], "elcNumber": counts[code][1]}
+            for code in codes if code in counts
+        ]
     }), 200
 
+@app.route('/api/streamEnrollment', methods=['GET'])
+def streamEnrollment():
+    '''
+    Server-Sent Events stream of enrollment changes of some teaching classes.
+    Only changed counts are pushed, so subscribe first and then read the current
+    counts with getEnrollmentByCodes.
+
+    Query: `?calendarId=119&codes=34001201,34001202`
+
+    Events:
+
+    ```
+    event: enrollment
+    data: [{"code": "34001201", "number": 120, "elcNumber": 99}]
+    ```
+
+    A comment line is sent every [Stream] heartbeat seconds without changes.
+    '''
+
+    calendarId = request.args.get('calendarId', type=int)
+    codes = [code for code in request.args.get('codes', '').split(',') if code]
+
+    if calendarId is None or not codes:
+        return jsonify({
+            "code": 400,
+            "msg": "请指定 calendarId 和 codes",
+            "data": []
+        }), 400
+
+    if len(codes) > ENROLLMENT_MAX_CODES:
+        return jsonify({
+            "code": 400,
+            "msg": f"codes 最多 {ENROLLMENT_MAX_CODES} 个",
+            "data": []
+        }), 400
+
+    subscription = ENROLLMENT_FEED.subscribe(calendarId, codes)
+
+    if subscription is None:
+        return jsonify({
+            "code": 503,
+            "msg": "订阅人数已满，请稍后再试",
+            "data": []
+        }), 503
+
+    def events():
+        try:
+            yield "retry: 5000\n\n"
+
+            while True:
+                changes = subscription.take(STREAM_HEARTBEAT)
+
+                if changes:
+                    data = json.dumps([
+                        {"code": code, "number": number, "elcNumber": elcNumber}
+                        for code, (number, elcNumber) in changes.items()
+                    ], ensure_ascii=False, separators=(',', ':'))
+
+                    yield f"event: enrollment\ndata: {data}\n\n"
+                else:
+                    yield ": keepalive\n\n"
+        finally:
+            # 客户端断开时写入失败，生成器被关闭
+            ENROLLMENT_FEED.unsubscribe(subscription)
+
+    return Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no', # 不让 nginx 缓冲
+    })
 
 @app.route('/api/findCourseBySearch', methods=['POST'])
 def findCourseBySearch():
@@ -725,7 +1076,7 @@ def findCourseBySearch():
 
     sizeLimit = 100
 
-    with bckndSql.bckndSql() as sql:
+    with dataSource() as sql:
         result = sql.findCourseBySearch(payload, sizeLimit)
 
     return jsonify({
@@ -748,7 +1099,8 @@ def findCourseByTime():
     {
         "calendarId": 119,
         "day": 1, // 1-7
-        "time": 1 // 1-12
+        "section": 1, // 1-6，见 bckndTools.optCourseSectionRange
+        "week": 3 // 可选，1-31，只返回第 3 周有课的课程
     }
     ```
 
@@ -777,28 +1129,103 @@ def findCourseByTime():
         message: "查询成功"
     }
     ```
-    接口太慢了，一天 100 门课的数据量，需要 40s 左右，需要优化
+    节次范围查询走 arrangement 表的索引，旧数据需要先运行 crawler/rebuildArrangement.py，
+    周次按 arrangement.weekMask 的位过滤
     '''
 
     payload = request.json
 
-    queryStr = optCourseQueryListGenerator(payload['day'], payload['section'])
+    sectionRange = optCourseSectionRange(payload['section'])
+    week = payload.get('week')
 
-    if queryStr == None:
+    if sectionRange == None or payload['day'] not in range(1, 8) or (week is not None and week not in range(1, MAX_WEEK + 1)):
         return jsonify({
             "code": 400,
             "msg": "输入参数有误",
             "data": []
         }), 400
 
-    with bckndSql.bckndSql() as sql:
-        result = sql.findCourseByTime(queryStr, INNER_LABEL_LIST, payload['calendarId']) # 返回的是这一天的所有课程，需要再过滤一
-        print(len(result))
+    with dataSource() as sql:
+        result = bckndCache.rawResult(sql, 'findCourseByTime', payload['day'], sectionRange, INNER_LABEL_LIST, payload['calendarId'], week)
+
+    return rawResponse(result), 200
+
+@app.route('/api/findOptionalCourseTimeGrid', methods=['POST'])
+def findOptionalCourseTimeGrid():
+    '''
+    Find optional courses of every (day, section) cell at once.
+
+    Payload：
+
+    ```json
+    {
+        "calendarId": 119
+    }
+    ```
+
+    Response:
+
+    ```json
+    {
+        "code": 200,
+        "msg": "查询成功",
+        "data": {
+            "sectionCount": 6,
+            "grid": [
+                // 星期一
+                [
+                    // 第 1 组节次，与 findCourseByTime 中 day = 1, section = 1 的结果相同
+                    [
+                        {
+                            "campus": [
+                                "嘉定校区"
+                            ],
+                            "courseCode": "122117",
+                            "courseName": "数学建模",
+                            "courseNature": [
+                                "科学探索与生命关怀"
+                            ],
+                            "credit": 2.0,
+                            "faculty": "数学科学学院"
+                        },
+
+                        // ...
+                    ],
+
+                    // ...
+                ],
+
+                // ... 共 7 天
+            ]
+        }
+    }
+    ```
+    一次扫描整个学期的排课，结果缓存到下一次爬取
+    '''
+
+    payload = request.get_json(silent=True) or {}
+    calendarId = payload.get('calendarId')
+
+    # calendarId 是缓存键的一部分，数字字符串转为整数，其他类型直接拒绝
+    if isinstance(calendarId, str) and calendarId.isdigit():
+        calendarId = int(calendarId)
+
+    if not isinstance(calendarId, int) or isinstance(calendarId, bool) or calendarId <= 0:
+        return jsonify({
+            "code": 400,
+            "msg": "请指定 calendarId",
+        }), 400
+
+    with dataSource() as sql:
+        grid = optionalTimeGrid(sql, calendarId)
 
     return jsonify({
         "code": 200,
         "msg": "查询成功",
-        "data": result
+        "data": {
+            "sectionCount": len(grid[0]),
+            "grid": grid
+        }
     }), 200
 
 @app.route('/api/getLatestUpdateTime', methods=['GET'])
@@ -817,7 +1244,7 @@ def getLatestUpdateTime():
     ```
     '''
 
-    with bckndSql.bckndSql() as sql:
+    with dataSource() as sql:
         result = sql.getLatestUpdateTime()
 
     return jsonify({
@@ -826,6 +1253,154 @@ def getLatestUpdateTime():
         "data": datetime.strftime(result, "%Y-%m-%d")
     }), 200
 
+@app.route('/api/health', methods=['GET'])
+def health():
+    '''
+    Get backend health and warm-up progress.
+    With `?ready=1` the status code is 503 until the first warm-up finished,
+    for readiness probes of a load balancer. After a crawl the backend stays ready
+    while the new data version is warmed, `stale` is true until that warm-up finishes.
+
+    Response:
+
+    ```json
+    {
+        "code": 200,
+        "msg": "ok", // 首次预热前为 warming up，重新预热时为 stale, re-warming
+        "data": {
+            "ready": true,
+            "stale": false, // 当前数据版本还没有预热完成，缓存是旧版本的
+            "version": "2025-02-25 03:00:00", // 数据版本，数据库不可用时为 null
+            "database": "ok",
+            "warmup": {
+                "state": "done", // pending / running / done / failed
+                "version": "2025-02-25 03:00:00",
+                "calendarId": 120,
+                "done": 52,
+                "total": 52,
+                "errors": 0,
+                "startedAt": "2025-02-25T03:01:00",
+                "finishedAt": "2025-02-25T03:01:09",
+                "seconds": 8.7,
+                "lastError": null
+            },
+            "cache": {}, // 同 getCacheStats
+            "compress": {
+                "hits": 310,
+                "misses": 52,
+                "errors": 0,
+                "bytesIn": 48234112,
+                "bytesOut": 5310021,
+                "ratio": 0.11,
+                "encodings": ["br", "gzip"],
+                "entries": 104,
+                "bytes": 1203311
+            },
+            "pool": {} // 同 getPoolStats
+        }
+    }
+    ```
+    '''
+
+    try:
+        version = CRAWL_VERSION.get()
+        database = "ok"
+    except Exception as e:
+        version = None
+        database = str(e)
+
+    # 只有首次预热决定是否就绪，之后新版本的预热只在返回内容中体现
+    ready = CACHE_WARMER.isReady() if WARMUP_ENABLED else database == "ok"
+    stale = WARMUP_ENABLED and CACHE_WARMER.isStale(version)
+    status = 503 if request.args.get('ready') == '1' and not ready else 200
+
+    if not ready:
+        msg = "warming up"
+    elif stale:
+        msg = "stale, re-warming"
+    else:
+        msg = "ok"
+
+    return jsonify({
+        "code": status,
+        "msg": msg,
+        "data": {
+            "ready": ready,
+            "stale": stale,
+            "version": str(version) if version is not None else None,
+            "database": database,
+            "warmup": CACHE_WARMER.status(),
+            "cache": RESPONSE_CACHE.stats(),
+            "compress": RESPONSE_COMPRESSOR.stats(),
+            "pool": bckndSql.POOL.stats()
+        }
+    }), status
+
+@app.route('/api/getPoolStats', methods=['GET'])
+def getPoolStats():
+    '''
+    Get database connection pool usage and wait metrics.
+
+    Response:
+
+    ```json
+    {
+        "code": 200,
+        "msg": "查询成功",
+        "data": {
+            "size": 8,
+            "open": 3,
+            "idle": 2,
+            "inUse": 1,
+            "acquired": 1024,
+            "waited": 5,
+            "waitTimeAvg": 0.0004,
+            "waitTimeMax": 0.12,
+            "waitTimeTotal": 0.41,
+            "timeouts": 0,
+            "created": 4,
+            "recycled": 1,
+            "pingFailed": 0
+        }
+    }
+    ```
+    '''
+
+    return jsonify({
+        "code": 200,
+        "msg": "查询成功",
+        "data": bckndSql.POOL.stats()
+    }), 200
+
+@app.route('/api/getCacheStats', methods=['GET'])
+def getCacheStats():
+    '''
+    Get response cache metrics.
+
+    Response:
+
+    ```json
+    {
+        "code": 200,
+        "msg": "查询成功",
+        "data": {
+            "hits": 5120,
+            "misses": 230,
+            "coalesced": 12,
+            "errors": 0,
+            "entries": 230,
+            "bytes": 41943040
+        }
+    }
+    ```
+    '''
+
+    return jsonify({
+        "code": 200,
+        "msg": "查询成功",
+        "data": RESPONSE_CACHE.stats()
+    }), 200
+
 @app.route('/api/getAllRooms', methods=['POST'])
 def getAllRooms():
     '''
@@ -857,14 +1432,10 @@ def getAllRooms():
             "msg": "请指定 calendarId",
         }), 400
 
-    with bckndSql.bckndSql() as sql:
-        result = sql.getAllRooms(payload['calendarId'])
+    with dataSource() as sql:
+        result = bckndCache.rawResult(sql, 'getAllRooms', payload['calendarId'])
 
-    return jsonify({
-        "code": 200,
-        "msg": "查询成功",
-        "data": result
-    }), 200
+    return rawResponse(result), 200
 
 @app.route('/api/getCoursesByRoom', methods=['POST'])
 def getCoursesByRoom():
@@ -875,7 +1446,8 @@ def getCoursesByRoom():
     ```json
     {
         "room": "北214",
-        "calendarId": 119
+        "calendarId": 119,
+        "weekFormat": "list" // 可选，同 findCourseByMajor
     }
     ```
 
@@ -923,8 +1495,16 @@ def getCoursesByRoom():
             "msg": "请指定 calendarId 和 room",
         }), 400
 
-    with bckndSql.bckndSql() as sql:
-        result = sql.getCoursesByRoom(payload['room'], payload['calendarId'])
+    weekFormat = weekFormatOf(payload)
+
+    if weekFormat is None:
+        return jsonify({
+            "code": 400,
+            "msg": "weekFormat 有误",
+        }), 400
+
+    with dataSource() as sql:
+        result = applyWeekFormat(sql.getCoursesByRoom(payload['room'], payload['calendarId']), weekFormat)
 
     return jsonify({
         "code": 200,
@@ -975,7 +1555,7 @@ def getCourseReviews():
 
     print(f"DEBUG: 查询课程评价，courseCode: {payload['courseCode']}")
 
-    with bckndSql.bckndSql() as sql:
+    with dataSource() as sql:
         result = sql.getCourseReviews(payload['courseCode'])
 
     print(f"DEBUG: 查询结果数量: {len(result) if result else 0}")
@@ -0,0 +1,150 @@
+'''
+Microbenchmark of arrangement text parsing.
+
+Usage (from ./backend):
+
+    python benchArrangement.py                  # synthetic corpus of one semester
+    python benchArrangement.py lines.txt        # one arrangement line per row, e.g. exported teacher.arrangeInfoText
+
+It reports lines/second of the old split-based parser and of the current
+bckndTools.arrangementTextToObj, cold (every line new to the cache) and warm
+(the same lines requested again, as on a busy day).
+'''
+
+from utils import bckndTools
+from utils.bckndTools import arrangementTextToObj, dayTextToNum
+from common.arrangement import parseArrangement
+import random
+import sys
+import time
+
+DAYS = ["星期一", "星期二", "星期三", "星期四", "星期五", "星期六", "星期日"]
+SECTIONS = ["1-2", "3-4", "5-6", "7-8", "9-10", "10-11", "9-11", "10-12", "1-4", "5-8"]
+WEEKS = ["1-17", "1-17单", "2-16双", "1-8", "9-16", "2-4双 5-6 10-12 14 17", "1-3单 7-9 13-15单 16", "6-7", "1"]
+BUILDINGS = ["北", "南", "安楼A", "博楼B", "济事楼", "复楼", "广楼G", "教1-"]
+
+def timeTextToArray(text):
+    '''
+    输入："2-4节"
+    输出：[2, 3, 4]
+    旧解析器的节次部分
+    '''
+    start, end = text[:-1].split("-")
+
+    return list(range(int(start), int(end) + 1))
+
+def weekTextToArray(text):
+    '''
+    输入："2-4双 5-6 10-12 14 17"
+    输出：[2, 4, 5, 6, 10, 11, 12, 14, 17]
+    旧解析器的周次部分
+    '''
+    result = []
+
+    for week in text.split(" "):
+        if "-" not in week:
+            result.append(int(week))
+        elif "单" in week or "双" in week:
+            start, end = week[:-1].split("-")
+            result.extend(range(int(start), int(end) + 1, 2))
+        else:
+            start, end = week.split("-")
+            result.extend(range(int(start), int(end) + 1))
+
+    return result
+
+def legacyArrangementTextToObj(text):
+    '''
+    The parser before the precompiled pattern, kept here as the baseline
+    '''
+    result = {
+        "arrangementText": "星期" + text.split(" 星期", 1)[1],
+        "occupyDay": None,
+        "occupyTime": None,
+        "occupyWeek": None,
+        "occupyRoom": None,
+        "teacherAndCode": text.split(" 星期", 1)[0].strip()
+    }
+
+    result["occupyDay"] = dayTextToNum("星期" + text.split(" 星期")[1][0])
+    result["occupyTime"] = timeTextToArray(text.split(" 星期")[1][1:].split(" [")[0])
+    result["occupyWeek"] = weekTextToArray(text.split("[")[1].split("]")[0])
+
+    try:
+        result["occupyRoom"] = text.split("] ")[1].strip()
+    except:
+        result["occupyRoom"] = None
+
+    return result
+
+def syntheticCorpus(distinct=12000, total=60000, seed=0):
+    '''
+    About one semester of distinct lines, each requested several times.
+    Returns (distinct lines, requested lines)
+    '''
+    rng = random.Random(seed)
+    lines = []
+
+    for i in range(distinct):
+        teacher = f"教师{rng.randint(0, 3000):04d}({rng.randint(0, 99999):05d}) "
+        room = rng.choice(BUILDINGS) + str(rng.randint(101, 520))
+
+        # 约 1% 的行在教师后面被换行截断，只剩下时间部分
+        if rng.random() < 0.01:
+            teacher = ""
+
+        lines.append(f"{teacher}{rng.choice(DAYS)}{rng.choice(SECTIONS)}节 [{rng.choice(WEEKS)}] {room}")
+
+    requests = lines + [rng.choice(lines) for _ in range(total - distinct)]
+    rng.shuffle(requests)
+
+    return lines, requests
+
+def measure(parse, lines, setup=None, repeat=5):
+    '''
+    Best of `repeat` runs, `setup` is called before each run
+    '''
+    best = None
+    failed = 0
+
+    for _ in range(repeat):
+        if setup:
+            setup()
+
+        failed = 0
+        start = time.perf_counter()
+
+        for line in lines:
+            try:
+                parse(line)
+            except Exception:
+                failed += 1
+
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return len(lines) / best, failed
+
+def report(name, linesPerSecond, failed, baseline=None):
+    speedup = f"  x{linesPerSecond / baseline:.1f}" if baseline else ""
+    print(f"{name:<28}{linesPerSecond:>14,.0f} lines/s  failed: {failed}{speedup}")
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], encoding="utf-8") as f:
+            requests = [line.rstrip("\n") for line in f if line.strip()]
+    else:
+        _, requests = syntheticCorpus()
+
+    print(f"corpus: {len(requests)} lines, {len(set(requests))} distinct")
+
+    legacy, legacyFailed = measure(legacyArrangementTextToObj, requests)
+    report("legacy split parser", legacy, legacyFailed)
+
+    cold, coldFailed = measure(arrangementTextToObj, list(dict.fromkeys(requests)), setup=parseArrangement.cache_clear)
+    report("compiled, cold cache", cold, coldFailed, legacy)
+
+    warm, warmFailed = measure(arrangementTextToObj, requests)
+    report("compiled, warm cache", warm, warmFailed, legacy)
+
+    print(bckndTools.arrangementCacheInfo())
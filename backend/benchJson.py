@@ -0,0 +1,140 @@
+'''
+Per-endpoint benchmark of response serialization.
+
+Usage (from ./backend):
+
+    python benchJson.py             # synthetic results of one semester
+    python benchJson.py 200         # scale the course counts by 200%
+
+For every endpoint it reports microseconds per request of
+
+    rows      decoding the JSON_OBJECT rows of a query (a cache miss),
+              standard json vs bckndJson.loads
+    response  a cache hit turned into the response body,
+              before: decode the cached text, then jsonify with Flask's default provider,
+              after:  bckndCache.rawResult + bckndJson.envelope for endpoints that return
+                      query results unchanged, bckndJson.loads + bckndJson.JSONProvider otherwise
+
+The post-processing of findCourseByMajor and findCourseDetailByCode
+(attachArrangementInfo, mergeSameCode) is the same on both paths and left out.
+Results depend on whether orjson is installed, which is printed first.
+'''
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from utils import bckndJson
+import json
+import random
+import sys
+import time
+
+CAMPUSES = ["四平路校区", "嘉定校区", "沪西校区", "沪北校区"]
+FACULTIES = ["电子与信息工程学院", "数学科学学院", "土木工程学院", "经济与管理学院", "外国语学院", "建筑与城市规划学院"]
+LABELS = ["通识选修课", "人文经典与审美素养", "科学探索与生命关怀", "社会发展与国际视野", "工程能力与创新思维"]
+
+def teachingClass(rng, code):
+    teachers = [{"teacherCode": f"{rng.randint(0, 99999):05d}", "teacherName": f"教师{rng.randint(0, 3000)}"} for _ in range(rng.randint(1, 3))]
+    weeks = list(range(1, 18, rng.choice([1, 2])))
+
+    return {
+        "code": code,
+        "campus": rng.choice(CAMPUSES),
+        "teachers": teachers,
+        "locations": f"{teachers[0]['teacherName']}({teachers[0]['teacherCode']}) 星期{rng.choice('一二三四五')}3-4节 [1-17] 北{rng.randint(101, 520)}\n",
+        "arrangements": [{"occupyDay": rng.randint(1, 5), "occupyTime": [3, 4], "occupyWeek": weeks, "occupyRoom": f"北{rng.randint(101, 520)}", "teacherCode": teachers[0]['teacherCode']}],
+        "teachingLanguage": "中文",
+        "isExclusive": rng.randint(0, 1)
+    }
+
+def course(rng, i, classes):
+    return {
+        "courseCode": f"{100000 + i}",
+        "courseName": f"课程{i}",
+        "faculty": rng.choice(FACULTIES),
+        "credit": rng.choice([1.0, 2.0, 3.0, 4.0]),
+        "grade": 2024,
+        "courseNature": [rng.choice(LABELS)],
+        "courses": [teachingClass(rng, f"{100000 + i}{j:02d}") for j in range(classes)]
+    }
+
+def optionalCourse(rng, i):
+    return {"courseCode": f"{200000 + i}", "courseName": f"选修课{i}", "faculty": rng.choice(FACULTIES), "credit": 2.0, "campus": rng.sample(CAMPUSES, rng.randint(1, 2))}
+
+def syntheticResults(scale=1.0, seed=0):
+    '''
+    {endpoint: (rows as the database returns them, passed through unchanged)}
+    '''
+    rng = random.Random(seed)
+    n = lambda count: max(1, int(count * scale))
+
+    results = {
+        "getAllCalendar": [{"calendarId": 120 - i, "calendarName": f"{2025 - i // 2}-{2026 - i // 2}学年第{i % 2 + 1}学期"} for i in range(40)],
+        "getAllFaculty": [{"facultyId": f"{i:06d}", "facultyName": f"学院{i}"} for i in range(80)],
+        "findMajorByGrade": [{"code": f"{10000 + i}", "name": f"专业{i}"} for i in range(n(120))],
+        "findCourseByNatureId": [
+            {"courseLabelId": 811 + i, "courseLabelName": label, "courses": [optionalCourse(rng, i * 1000 + j) for j in range(n(300))]}
+            for i, label in enumerate(LABELS)
+        ],
+        "findCourseByTime": [optionalCourse(rng, j) for j in range(n(150))],
+        "findCourseByMajor": [course(rng, i, rng.randint(1, 4)) for i in range(n(60))],
+        "findCourseDetailByCode": course(rng, 0, n(30))['courses'],
+    }
+
+    passthrough = {"getAllCalendar", "getAllFaculty", "findMajorByGrade", "findCourseByNatureId", "findCourseByTime"}
+
+    return {
+        endpoint: ([json.dumps(row, ensure_ascii=False) for row in rows], endpoint in passthrough)
+        for endpoint, rows in results.items()
+    }
+
+def perCall(function, minTime=0.5):
+    '''
+    Best microseconds per call over rounds of at least minTime / 5 seconds
+    '''
+    best = None
+
+    for _ in range(5):
+        calls = 0
+        start = time.perf_counter()
+
+        while True:
+            function()
+            calls += 1
+            elapsed = time.perf_counter() - start
+
+            if elapsed >= minTime / 5:
+                break
+
+        best = elapsed / calls if best is None else min(best, elapsed / calls)
+
+    return best * 1e6
+
+if __name__ == "__main__":
+    scale = int(sys.argv[1]) / 100 if len(sys.argv) > 1 else 1.0
+
+    app = Flask(__name__)
+    before = DefaultJSONProvider(app)
+    after = bckndJson.JSONProvider(app)
+
+    print(f"orjson: {'yes' if bckndJson.orjson is not None else 'no'}, scale: {scale:.0%}")
+    print(f"{'endpoint':<24}{'KiB':>8}{'rows before':>14}{'rows after':>12}{'resp before':>14}{'resp after':>12}{'speedup':>9}")
+
+    for endpoint, (rows, passthrough) in syntheticResults(scale).items():
+        data = [json.loads(row) for row in rows]
+        cached = bckndJson.dumps(data, sortKeys=True) # 响应缓存中的文本
+
+        rowsBefore = perCall(lambda: [json.loads(row) for row in rows])
+        rowsAfter = perCall(lambda: [bckndJson.loads(row) for row in rows])
+
+        respBefore = perCall(lambda: before.dumps({"code": 200, "msg": "查询成功", "data": json.loads(cached)}, separators=(",", ":")))
+
+        if passthrough:
+            respAfter = perCall(lambda: bckndJson.envelope(cached))
+        else:
+            respAfter = perCall(lambda: after.dumps({"code": 200, "msg": "查询成功", "data": bckndJson.loads(cached)}, separators=(",", ":")))
+
+        size = len(before.dumps({"code": 200, "msg": "查询成功", "data": data}, separators=(",", ":")).encode('utf-8')) / 1024
+
+        print(f"{endpoint + (' *' if passthrough else ''):<24}{size:>8.1f}{rowsBefore:>14.1f}{rowsAfter:>12.1f}{respBefore:>14.1f}{respAfter:>12.1f}{respBefore / respAfter:>8.1f}x")
+
+    print("* passed through without decoding, microseconds per request")
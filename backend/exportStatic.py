@@ -0,0 +1,220 @@
+'''
+Render the crawl-determined responses of whole calendars into static JSON files.
+
+Usage (from ./backend):
+
+    python exportStatic.py                      # newest calendar with courses, into ./static
+    python exportStatic.py 119 120 -o /srv/tjcs # several calendars, another directory
+
+Every response is rendered by the app itself, so the files are byte for byte
+what the API would answer for the same payload. Each file is written next to
+a `.gz` copy, and a `.br` copy when the `brotli` package is installed, for
+nginx `gzip_static` / `brotli_static`. manifest.json maps every file to its
+endpoint and payload. The output path is a symlink to the directory of the
+latest export, switched to a new export with one os.replace, so a server
+never sees a mix of two crawls nor a missing directory.
+
+    api/getAllCalendar.json, api/getAllCampus.json, api/getAllFaculty.json
+    api/findGradeByCalendarId/<calendarId>.json
+    api/findMajorByGrade/<grade>.json
+    api/findOptionalCourseType/<calendarId>.json
+    api/findCourseByNatureId/<calendarId>.json          # every elective type, as the frontend asks
+    api/findCourseByMajor/<calendarId>/<grade>/<code>.json
+'''
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import quote
+import app as backend
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+try:
+    import brotli # 可选依赖，没有时只生成 .gz
+except ImportError:
+    brotli = None
+
+def render(client, endpoint, payload=None):
+    '''
+    Body of an API response, as bytes
+    '''
+    if payload is None:
+        response = client.get(f'/api/{endpoint}')
+    else:
+        response = client.post(f'/api/{endpoint}', json=payload)
+
+    if response.status_code != 200:
+        raise RuntimeError(f"{endpoint} {payload}: HTTP {response.status_code}")
+
+    return response.get_data()
+
+def writeFile(root, path, body):
+    '''
+    Write body and its compressed copies under root, returns the manifest entry sizes
+    '''
+    target = os.path.join(root, path)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+
+    with open(target, 'wb') as f:
+        f.write(body)
+
+    # mtime 固定为 0，gzip 文件内容可复现
+    compressed = {"gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+
+    if brotli is not None:
+        compressed["br"] = brotli.compress(body, quality=11)
+
+    for encoding, data in compressed.items():
+        with open(target + ('.gz' if encoding == "gzip" else '.br'), 'wb') as f:
+            f.write(data)
+
+    return {
+        "bytes": len(body),
+        **{encoding: len(data) for encoding, data in compressed.items()},
+        "etag": hashlib.sha1(body).hexdigest()
+    }
+
+def publish(out, target):
+    '''
+    Point the symlink out at the export directory target and remove the export it pointed at before.
+    A plain directory written by an older version is moved away first, the only case
+    in which out is missing for a moment
+    '''
+    previous = None
+
+    if os.path.islink(out):
+        previous = os.path.realpath(out)
+    elif os.path.isdir(out):
+        previous = f"{out}.old-{os.getpid()}"
+        os.rename(out, previous)
+
+    # 相对路径的链接，整个上级目录移动后仍然有效
+    link = f"{out}.link-{os.getpid()}"
+    os.symlink(os.path.basename(target), link)
+    os.replace(link, out)
+
+    if previous is not None and previous != target:
+        shutil.rmtree(previous, ignore_errors=True)
+
+def calendarJobs(client, calendarId):
+    '''
+    (path, endpoint, payload) of every file of a calendar, except the shared findMajorByGrade,
+    and the grades of the calendar
+    '''
+    grades = json.loads(render(client, 'findGradeByCalendarId', {"calendarId": calendarId}))['data']['gradeList']
+    types = json.loads(render(client, 'findOptionalCourseType', {"calendarId": calendarId}))['data']
+
+    jobs = [
+        (f"api/findGradeByCalendarId/{calendarId}.json", 'findGradeByCalendarId', {"calendarId": calendarId}),
+        (f"api/findOptionalCourseType/{calendarId}.json", 'findOptionalCourseType', {"calendarId": calendarId}),
+        (f"api/findCourseByNatureId/{calendarId}.json", 'findCourseByNatureId', {"ids": [t['courseLabelId'] for t in types], "calendarId": calendarId}),
+    ]
+
+    for grade in grades:
+        majors = json.loads(render(client, 'findMajorByGrade', {"grade": grade}))['data']
+
+        for major in majors:
+            jobs.append((
+                f"api/findCourseByMajor/{calendarId}/{grade}/{quote(major['code'], safe='')}.json",
+                'findCourseByMajor', {"grade": grade, "code": major['code'], "calendarId": calendarId}
+            ))
+
+    return jobs, grades
+
+def exportStatic(calendarIds, out, workers=4):
+    '''
+    Export the given calendars, the newest one with courses when empty, into directory out
+    '''
+    # 导出进程不需要预热缓存
+    backend.WARMUP_ENABLED = False
+    client = backend.app.test_client()
+
+    if not calendarIds:
+        with backend.dataSource() as sql:
+            calendarId, _ = backend.newestCalendar(sql)
+
+        if calendarId is None:
+            raise RuntimeError("没有可导出的学期")
+
+        calendarIds = [calendarId]
+
+    version = backend.CRAWL_VERSION.get()
+
+    jobs = [
+        ("api/getAllCalendar.json", 'getAllCalendar', None),
+        ("api/getAllCampus.json", 'getAllCampus', None),
+        ("api/getAllFaculty.json", 'getAllFaculty', None),
+    ]
+    grades = set()
+
+    for calendarId in calendarIds:
+        calendarJobList, calendarGrades = calendarJobs(client, calendarId)
+        jobs += calendarJobList
+        grades.update(calendarGrades)
+
+    jobs += [(f"api/findMajorByGrade/{grade}.json", 'findMajorByGrade', {"grade": grade}) for grade in sorted(grades)]
+
+    # 先写到新的目录，完成后把 out 指向它
+    out = os.path.abspath(out)
+    staging = tempfile.mkdtemp(prefix=f"{os.path.basename(out)}.{datetime.now():%Y%m%d%H%M%S}-", dir=os.path.dirname(out))
+    os.chmod(staging, 0o755) # mkdtemp 只允许自己读取，web 服务器需要读取
+
+    def export(job):
+        path, endpoint, payload = job
+        entry = writeFile(staging, path, render(client, endpoint, payload))
+
+        return {"path": path, "endpoint": endpoint, "payload": payload, **entry}
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            files = []
+
+            for i, entry in enumerate(executor.map(export, jobs), 1):
+                files.append(entry)
+
+                if i % 100 == 0 or i == len(jobs):
+                    print(f"已导出 {i} / {len(jobs)} 个文件")
+
+        manifest = {
+            "version": str(version),
+            "calendarIds": calendarIds,
+            "generatedAt": datetime.now().isoformat(timespec='seconds'),
+            "encodings": ["gzip", "br"] if brotli is not None else ["gzip"],
+            "files": files
+        }
+
+        with open(os.path.join(staging, "manifest.json"), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1)
+
+        publish(out, staging)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    total = sum(entry['bytes'] for entry in files)
+    gzipped = sum(entry['gzip'] for entry in files)
+    print(f"导出完成：学期 {', '.join(map(str, calendarIds))}，{len(files)} 个文件，{total / 1048576:.1f} MiB，gzip 后 {gzipped / 1048576:.1f} MiB")
+
+    if brotli is None:
+        print("未安装 brotli，只生成了 .gz 文件")
+
+    return manifest
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the static API responses of calendars into precompressed JSON files")
+    parser.add_argument("calendars", nargs="*", type=int, help="calendar ids, the newest calendar with courses when omitted")
+    parser.add_argument("-o", "--out", default="static", help="output path, a symlink switched to each new export")
+    parser.add_argument("--workers", type=int, default=4, help="responses rendered in parallel")
+    args = parser.parse_args()
+
+    try:
+        exportStatic(args.calendars, args.out, args.workers)
+    except Exception as e:
+        print("导出失败：", e)
+        sys.exit(1)
@@ -0,0 +1,51 @@
+# 模块在导入时读取当前目录下的 config.ini，测试在临时目录中提供一份不连接任何服务的配置
+
+import os
+import sys
+import tempfile
+from urllib.parse import unquote, urlsplit
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROOT_DIR = os.path.dirname(BACKEND_DIR) # common 包所在的目录
+
+# 形如 user:password@127.0.0.1:3306/tjcs_test 的空数据库，设置后才运行与 MySQL 对比的测试。
+# 测试会在其中重建所有表，不要指向有数据的库
+MYSQL_URL = os.environ.get("TJCS_TEST_MYSQL")
+
+SQL = {"host": "127.0.0.1", "port": 3306, "database": "tjcs", "user": "test", "password": "test"}
+
+if MYSQL_URL:
+    url = urlsplit("mysql://" + MYSQL_URL)
+    SQL = {
+        "host": url.hostname,
+        "port": url.port or 3306,
+        "database": url.path.lstrip("/"),
+        "user": unquote(url.username or ""),
+        "password": unquote(url.password or ""),
+    }
+
+CONFIG = f'''[Switch]
+debug = 0
+
+[Sql]
+host = {SQL["host"]}
+port = {SQL["port"]}
+database = {SQL["database"]}
+charset = utf8mb4
+r_user = {SQL["user"]}
+r_password = {SQL["password"].replace("%", "%%")}
+
+[Cache]
+enabled = false
+
+[Warmup]
+enabled = false
+'''
+
+CONFIG_DIR = tempfile.mkdtemp(prefix="tjcs-backend-")
+
+with open(os.path.join(CONFIG_DIR, 'config.ini'), 'w', encoding='utf-8') as f:
+    f.write(CONFIG)
+
+os.chdir(CONFIG_DIR)
+sys.path[:0] = [BACKEND_DIR, ROOT_DIR]
@@ -0,0 +1,57 @@
+import pytest
+import app as backend
+from utils import bckndStream
+
+class FakeSql:
+    '''
+    enrollmenthistory of (id, calendarId, code, number, elcNumber)
+    '''
+    rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def getLatestEnrollmentChangeId(self):
+        return max((row[0] for row in self.rows), default=0)
+
+    def getEnrollmentChanges(self, afterId):
+        return [row for row in self.rows if row[0] > afterId]
+
+@pytest.fixture
+def history(monkeypatch):
+    FakeSql.rows = [(1, 120, "34001201", 100, 90)]
+    monkeypatch.setattr(bckndStream.bckndSql, "bckndSql", FakeSql)
+
+    return FakeSql.rows
+
+def test_feedStartsAtSubscription(history, monkeypatch):
+    feed = bckndStream.EnrollmentFeed(pollInterval=60, maxSubscribers=10)
+    monkeypatch.setattr(feed, "_run", lambda: None) # 由测试调用 _poll
+
+    subscription = feed.subscribe(120, ["34001201"])
+
+    # 订阅之后、第一次轮询之前的变化也要推送
+    history.append((2, 120, "34001201", 100, 91))
+    feed._poll()
+
+    assert subscription.take(0) == {"34001201": (100, 91)}
+    assert feed.stats()["lastId"] == 2
+
+    feed.unsubscribe(subscription)
+
+    assert feed.stats()["lastId"] is None
+
+@pytest.mark.parametrize("calendarId", [None, "120", [120], {"id": 120}, True])
+def test_getEnrollmentByCodesRejectsCalendarId(calendarId):
+    payload = {"codes": ["34001201"]}
+
+    if calendarId is not None:
+        payload["calendarId"] = calendarId
+
+    response = backend.app.test_client().post('/api/getEnrollmentByCodes', json=payload)
+
+    assert response.status_code == 400
+    assert response.get_json()["code"] == 400
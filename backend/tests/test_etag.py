@@ -0,0 +1,98 @@
+import gzip
+import json
+import pytest
+import app as backend
+
+CALENDARS = [{"calendarId": 120 - i, "calendarName": f"{2025 - i // 2}-{2026 - i // 2}学年第{i % 2 + 1}学期"} for i in range(40)]
+
+class FakeSql:
+    '''
+    Data source counting the queries it answers
+    '''
+    def __init__(self):
+        self.queries = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def getAllCalendar(self):
+        self.queries += 1
+        return CALENDARS
+
+    def findGradeByCalendarId(self, calendarId):
+        self.queries += 1
+        return [2022, 2023, 2024]
+
+@pytest.fixture
+def sql(monkeypatch):
+    sql = FakeSql()
+    monkeypatch.setattr(backend, "dataSource", lambda: sql)
+    monkeypatch.setattr(backend.CRAWL_VERSION, "get", lambda: "2025-01-01 00:00:00")
+
+    return sql
+
+@pytest.fixture
+def client():
+    return backend.app.test_client()
+
+def test_notModified(sql, client):
+    response = client.get('/api/getAllCalendar', headers={"Accept-Encoding": "identity"})
+    etag = response.headers["ETag"]
+
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"] == "no-cache"
+    assert json.loads(response.get_data())["data"] == CALENDARS
+
+    response = client.get('/api/getAllCalendar', headers={"If-None-Match": etag})
+
+    # 304 在查询之前返回
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert response.get_data() == b""
+    assert sql.queries == 1
+
+def test_compressedNotModified(sql, client):
+    response = client.get('/api/getAllCalendar', headers={"Accept-Encoding": "gzip"})
+    etag = response.headers["ETag"]
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert etag.endswith('-gzip"')
+    assert json.loads(gzip.decompress(response.get_data()))["data"] == CALENDARS
+
+    response = client.get('/api/getAllCalendar', headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert sql.queries == 1
+
+def test_newCrawlChangesETag(sql, client, monkeypatch):
+    etag = client.get('/api/getAllCalendar').headers["ETag"]
+
+    monkeypatch.setattr(backend.CRAWL_VERSION, "get", lambda: "2025-01-02 00:00:00")
+    response = client.get('/api/getAllCalendar', headers={"If-None-Match": etag})
+
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert sql.queries == 2
+
+def test_payloadChangesETag(sql, client):
+    first = client.post('/api/findGradeByCalendarId', json={"calendarId": 119})
+    second = client.post('/api/findGradeByCalendarId', json={"calendarId": 120})
+
+    assert first.status_code == second.status_code == 200
+    assert first.headers["ETag"] != second.headers["ETag"]
+
+def test_compressedBodyMatchesItsKey():
+    compressor = backend.bckndCompress.ResponseCompressor(backend.bckndCache.MemoryStore(maxBytes=1 << 20), ttl=60, level=6, brotliQuality=5, minSize=0)
+
+    first = compressor.compress(b'{"data":1}', "gzip", "etag")
+    second = compressor.compress(b'{"data":2}', "gzip", "etag")
+
+    # 同一个 ETag 下不同的响应体不会共用压缩结果
+    assert gzip.decompress(first) == b'{"data":1}'
+    assert gzip.decompress(second) == b'{"data":2}'
+    assert compressor.compress(b'{"data":1}', "gzip", "etag") == first
+    assert compressor.stats()["hits"] == 1
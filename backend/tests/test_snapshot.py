@@ -0,0 +1,270 @@
+import json
+import os
+import mysql.connector
+import pytest
+from common.arrangement import parseArrangeLine, splitArrangeInfo
+from utils import bckndSnapshot, bckndSql
+from utils.bckndTools import attachArrangementInfo, mergeSameCode
+
+# 一个学期的小数据集，同时用于假连接和真实 MySQL
+CALENDARS = [(120, "2024-2025学年第2学期"), (119, "2024-2025学年第1学期")]
+NATURES = [(100, "专业必修课"), (811, "通识选修课")]
+CAMPUSES = [("1", "四平路校区"), ("3", "嘉定校区")]
+FACULTIES = [("00001", "数学科学学院")]
+LANGUAGES = [("1", "中文")]
+MAJORS = [(1, "10054", 2023, "2023(10054 计算机科学与技术)"), (2, "10054", 2024, "2024(10054 计算机科学与技术)")]
+
+# id, code, courseLabelId, campus, number, elcNumber, courseCode, courseName, credit, teachingLanguage, faculty, calendarId
+COURSES = [
+    (1, "1000101", 100, "3", 120, 80, "10001", "高等数学", 5.0, "1", "00001", 120),
+    (2, "1000102", 100, "1", 100, 100, "10001", "高等数学", 5.0, "1", "00001", 120),
+    (3, "2000101", 811, "3", 60, 30, "20001", "数学建模", 2.0, "1", "00001", 120),
+]
+
+# id, teachingClassId, teacherCode, teacherName, arrangeInfoText
+TEACHERS = [
+    (11, 1, "13060", "李华", "李华(13060) 星期一1-2节 [1-17] 北214\n李华(13060) 星期三3-4节 [1-8] 南129"),
+    (12, 1, "13061", "王明", "王明(13061) 星期一1-2节 [1-17] 北214\n王明(13061) 星期三3-4节 [1-8] 南129"),
+    (21, 2, "13062", "张三", "张三(13062) 星期二5-6节 [2-16双] 北214"),
+    (31, 3, "13063", "赵四", "赵四(13063) 星期一1-2节 [1-17单] 博楼B202"),
+]
+
+PARSED_TEACHERS = {11, 12, 31} # 教师 21 模拟没有 arrangement 行的旧数据
+
+# majorId, courseId
+MAJOR_COURSES = [(1, 1), (2, 1), (1, 3)]
+
+def arrangementRows():
+    '''
+    (id, teachingClassId, teacherId, teacherCode, calendarId, day, start, end, weekMask, room, teacherAndCode, text)
+    '''
+    rows = []
+
+    for teacherId, classId, teacherCode, _, text in TEACHERS:
+        if teacherId not in PARSED_TEACHERS:
+            continue
+
+        for line in splitArrangeInfo(text):
+            row = parseArrangeLine(line)
+            rows.append((
+                len(rows) + 1, classId, teacherId, teacherCode, 120, row["occupyDay"], row["startSection"],
+                row["endSection"], row["weekMask"], row["occupyRoom"], row["teacherAndCode"], row["arrangementText"]
+            ))
+
+    return rows
+
+class FakeCursor:
+    '''
+    Answers the queries of GlobalSnapshot and SemesterSnapshot from the data set above
+    '''
+    def execute(self, query, params=None):
+        natures, campuses, faculties, languages = map(dict, (NATURES, CAMPUSES, FACULTIES, LANGUAGES))
+        classIds = {course[0] for course in COURSES if params is None or course[11] == params[0]}
+
+        if "FROM major ORDER BY" in query:
+            self.rows = sorted([(grade, code, name) for _, code, grade, name in MAJORS], key=lambda row: row[1])
+        elif "LEFT JOIN coursenature" in query:
+            self.rows = sorted([
+                (id, code, courseCode, courseName, credit,
+                 label, natures.get(label), faculty if faculty in faculties else None, faculties.get(faculty),
+                 campus if campus in campuses else None, campuses.get(campus),
+                 language if language in languages else None, languages.get(language),
+                 number, elcNumber)
+                for id, code, label, campus, number, elcNumber, courseCode, courseName, credit, language, faculty, _ in COURSES
+                if id in classIds
+            ], key=lambda row: (row[2], row[1]))
+        elif "FROM teacher AS t" in query:
+            self.rows = [(classId, id, code, name, text) for id, classId, code, name, text in sorted(TEACHERS) if classId in classIds]
+        elif "FROM arrangement AS a" in query:
+            self.rows = [(row[2], row[0], row[11], row[5], row[6], row[7], row[8], row[9], row[10]) for row in arrangementRows()]
+        elif "FROM majorandcourse AS mac" in query:
+            majors = {id: (code, grade) for id, code, grade, _ in MAJORS}
+            self.rows = [(courseId, majorId, *majors[majorId]) for majorId, courseId in MAJOR_COURSES if courseId in classIds]
+        else:
+            raise AssertionError(f"unexpected query: {query}")
+
+    def fetchall(self):
+        return self.rows
+
+class FakeSql:
+    '''
+    Stands in for bckndSql while snapshots are built, and for the MySQL fallback
+    '''
+    fallbacks = []
+
+    def __init__(self):
+        self.cursor = FakeCursor()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def getAllCalendar(self):
+        return [{"calendarId": id, "calendarName": name} for id, name in CALENDARS]
+
+    def getAllCampus(self):
+        return [{"campusId": id, "campusName": name} for id, name in CAMPUSES]
+
+    def getAllFaculty(self):
+        return [{"facultyId": id, "facultyName": name} for id, name in FACULTIES]
+
+    def findGradeByCalendarId(self, calendarId):
+        self.fallbacks.append(calendarId)
+        return []
+
+class Version:
+    def get(self):
+        return "2025-01-01 00:00:00"
+
+@pytest.fixture
+def session(monkeypatch):
+    monkeypatch.setattr(bckndSnapshot.bckndSql, "bckndSql", FakeSql)
+    FakeSql.fallbacks = []
+    store = bckndSnapshot.SnapshotStore(Version())
+
+    with store.session() as sql:
+        yield sql
+
+def test_resultsAreCopies(session):
+    calendars = session.getAllCalendar()
+    calendars[0]["calendarName"] = "changed"
+    calendars.clear()
+
+    majors = session.findMajorByGrade(2023)
+    majors[0]["code"] = "changed"
+
+    courses = session.findCourseDetailByCode("10001", 120)
+    before = json.dumps(courses, ensure_ascii=False)
+    courses[0]["arrangementInfo"][0]["occupyWeek"].append(99)
+    courses[0]["arrangementInfo"][0]["occupyRoom"] = "changed"
+
+    # 修改返回值不影响之后的请求
+    assert session.getAllCalendar()[0]["calendarName"] == CALENDARS[0][1]
+    assert session.findMajorByGrade(2023)[0]["code"] == "10054"
+    assert json.dumps(session.findCourseDetailByCode("10001", 120), ensure_ascii=False) == before
+
+def test_unknownCalendarIsNotSnapshotted(session):
+    assert session.findGradeByCalendarId(999) == []
+    assert FakeSql.fallbacks == [999]
+    assert 999 not in session.store._calendars
+
+    assert session.findGradeByCalendarId(120) == [2024, 2023]
+    assert 120 in session.store._calendars
+
+def test_roomsFollowSql(session):
+    # 与 SQL 相同，每条教师记录只取最后一行排课的教室
+    assert session.getAllRooms(120) == sorted({"南129", "北214", "博楼B202"})
+
+# 与真实 MySQL 的对比，需要 TJCS_TEST_MYSQL，见 conftest.py
+
+SCHEMA = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "sqls", "init-schema.sql")
+
+def loadDatabase():
+    '''
+    Recreate every table of init-schema.sql in the test database and insert the data set
+    '''
+    db = mysql.connector.connect(
+        host=bckndSql.DB_HOST, port=bckndSql.DB_PORT, user=bckndSql.DB_USER,
+        password=bckndSql.DB_PASSWORD, database=bckndSql.DB_DATABASE, charset=bckndSql.DB_CHARSET
+    )
+    cursor = db.cursor()
+
+    with open(SCHEMA, encoding='utf-8') as f:
+        # 只执行 CREATE TABLE，跳过开头的 CREATE DATABASE / USE，表建在测试库中
+        statements = [statement.strip() for statement in f.read().split(";") if "CREATE TABLE" in statement]
+
+    tables = [statement.split("CREATE TABLE")[1].split("`")[1] for statement in statements]
+
+    cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+
+    for table in tables:
+        cursor.execute(f"DROP TABLE IF EXISTS `{table}`")
+
+    for statement in statements:
+        cursor.execute(statement)
+
+    cursor.executemany("INSERT INTO calendar VALUES (%s, %s)", CALENDARS)
+    cursor.executemany("INSERT INTO coursenature VALUES (%s, %s)", NATURES)
+    cursor.executemany("INSERT INTO campus VALUES (%s, %s)", CAMPUSES)
+    cursor.executemany("INSERT INTO faculty VALUES (%s, %s)", FACULTIES)
+    cursor.executemany("INSERT INTO language VALUES (%s, %s)", LANGUAGES)
+    cursor.executemany("INSERT INTO major (id, code, grade, name) VALUES (%s, %s, %s, %s)", MAJORS)
+    cursor.executemany(
+        "INSERT INTO coursedetail (id, code, courseLabelId, campus, number, elcNumber, courseCode, courseName, credit, teachingLanguage, faculty, calendarId)"
+        " VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
+        COURSES
+    )
+    cursor.executemany("INSERT INTO teacher VALUES (%s, %s, %s, %s, %s)", TEACHERS)
+    cursor.executemany(
+        "INSERT INTO arrangement (id, teachingClassId, teacherId, teacherCode, calendarId, occupyDay, startSection, endSection, weekMask, room, teacherAndCode, arrangementText)"
+        " VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
+        arrangementRows()
+    )
+    cursor.executemany("INSERT INTO majorandcourse (majorId, courseId) VALUES (%s, %s)", MAJOR_COURSES)
+    cursor.execute("INSERT INTO fetchlog (fetchTime, msg, calendarId) VALUES (NOW(), 'full', 120)")
+    cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+
+    db.commit()
+    db.close()
+
+def canonical(value):
+    '''
+    Order-insensitive form of a result: lists sorted, booleans as 0 / 1 as the snapshot returns them
+    '''
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, dict):
+        return {key: canonical(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return sorted((canonical(item) for item in value), key=lambda item: json.dumps(item, sort_keys=True, ensure_ascii=False))
+    return value
+
+def courses(result):
+    '''
+    The processing the routes apply to locations / arrangements before responding
+    '''
+    return mergeSameCode([attachArrangementInfo(course) for course in result])
+
+def byMajor(result):
+    for group in result:
+        group["courses"] = courses(group["courses"])
+    return result
+
+LABELS = ["专业必修课", "通识选修课"]
+
+PARITY = [
+    ("getAllCalendar", (), None),
+    ("getAllCampus", (), None),
+    ("getAllFaculty", (), None),
+    ("findMajorByGrade", (2023, ), None),
+    ("findGradeByCalendarId", (120, ), None),
+    ("findCourseByMajor", (2024, "10054", 120), byMajor),
+    ("findOptionalCourseType", (LABELS, 120), None),
+    ("findCourseByNatureId", ([100, 811], 120), None),
+    ("findCourseDetailByCode", ("10001", 120), courses),
+    ("findCourseByTime", (1, (1, 2), [811], 120), None),
+    ("findCourseByTime", (1, (1, 2), [811], 120, 2), None),
+    ("findOptionalCourseArrangement", ([811], 120), None),
+    ("getAllRooms", (120, ), None),
+    ("getCoursesByRoom", ("北214", 120), courses),
+]
+
+@pytest.mark.skipif(not os.environ.get("TJCS_TEST_MYSQL"), reason="TJCS_TEST_MYSQL is not set")
+@pytest.mark.parametrize("name, args, normalize", PARITY)
+def test_snapshotMatchesSql(name, args, normalize):
+    if not getattr(test_snapshotMatchesSql, "loaded", False):
+        loadDatabase()
+        test_snapshotMatchesSql.loaded = True
+
+    store = bckndSnapshot.SnapshotStore(Version())
+
+    with bckndSql.bckndSql() as sql, store.session() as snapshot:
+        expected = getattr(sql, name)(*args)
+        actual = getattr(snapshot, name)(*args)
+
+    if normalize is not None:
+        expected = normalize(expected)
+
+    assert canonical(actual) == canonical(expected)
@@ -0,0 +1,53 @@
+import pytest
+import app as backend
+
+class FakeSql:
+    '''
+    One elective on Monday, sections 1-2; any other query is an error
+    '''
+    def __init__(self):
+        self.scans = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def findOptionalCourseArrangement(self, labels, calendarId):
+        self.scans += 1
+        return [("122117", "数学建模", "数学科学学院", 2.0, "科学探索与生命关怀", "嘉定校区", 1, 1, 2, 0b1)]
+
+@pytest.fixture
+def sql(monkeypatch):
+    sql = FakeSql()
+    monkeypatch.setattr(backend, "dataSource", lambda: sql)
+    monkeypatch.setattr(backend, "CACHE_ENABLED", True)
+    monkeypatch.setattr(backend.CRAWL_VERSION, "get", lambda: "2025-01-01 00:00:00")
+    monkeypatch.setattr(backend.RESPONSE_CACHE, "version", lambda: "2025-01-01 00:00:00")
+    monkeypatch.setattr(backend.RESPONSE_CACHE, "store", backend.bckndCache.MemoryStore(maxBytes=1 << 20))
+
+    return sql
+
+def test_gridIsScannedOncePerCrawl(sql, monkeypatch):
+    client = backend.app.test_client()
+
+    first = client.post('/api/findOptionalCourseTimeGrid', json={"calendarId": 120})
+    second = client.post('/api/findOptionalCourseTimeGrid', json={"calendarId": "120"})
+
+    assert first.status_code == second.status_code == 200
+    assert first.get_json()["data"] == second.get_json()["data"]
+    assert first.get_json()["data"]["grid"][0][0][0]["courseCode"] == "122117"
+    assert sql.scans == 1
+
+    monkeypatch.setattr(backend.RESPONSE_CACHE, "version", lambda: "2025-01-02 00:00:00")
+    client.post('/api/findOptionalCourseTimeGrid', json={"calendarId": 120})
+
+    assert sql.scans == 2
+
+@pytest.mark.parametrize("calendarId", [None, [120], {"id": 120}, "abc", True, 0])
+def test_gridRejectsCalendarId(sql, calendarId):
+    response = backend.app.test_client().post('/api/findOptionalCourseTimeGrid', json={"calendarId": calendarId})
+
+    assert response.status_code == 400
+    assert sql.scans == 0
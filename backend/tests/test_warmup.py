@@ -0,0 +1,83 @@
+import pytest
+import app as backend
+from utils import bckndWarmup
+
+class FakeSession:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+def warmer(version):
+    return bckndWarmup.CacheWarmer(
+        version=lambda: version[0],
+        session=FakeSession,
+        plan=lambda sql: (120, [("task", lambda sql: None)]),
+        checkInterval=60,
+    )
+
+@pytest.fixture
+def state(monkeypatch):
+    '''
+    The current data version in state[0], and a warmer that only warms when told to
+    '''
+    state = ["2025-01-01 00:00:00"]
+    cacheWarmer = warmer(state)
+
+    monkeypatch.setattr(cacheWarmer, "start", lambda: None)
+    monkeypatch.setattr(backend, "CACHE_WARMER", cacheWarmer)
+    monkeypatch.setattr(backend, "WARMUP_ENABLED", True)
+    monkeypatch.setattr(backend.CRAWL_VERSION, "get", lambda: state[0])
+
+    return state
+
+def health(query=""):
+    response = backend.app.test_client().get('/api/health' + query)
+
+    return response.status_code, response.get_json()
+
+def test_notReadyBeforeFirstWarmup(state):
+    status, body = health("?ready=1")
+
+    assert status == 503
+    assert (body["msg"], body["data"]["ready"], body["data"]["stale"]) == ("warming up", False, False)
+
+def test_readyAfterFirstWarmup(state):
+    backend.CACHE_WARMER.warm(state[0])
+
+    status, body = health("?ready=1")
+
+    assert status == 200
+    assert (body["msg"], body["data"]["ready"], body["data"]["stale"]) == ("ok", True, False)
+
+def test_newVersionStaysReadyButStale(state):
+    backend.CACHE_WARMER.warm(state[0])
+    state[0] = "2025-01-02 00:00:00" # 新的一次爬取
+
+    # 新版本预热完成前仍然就绪，只在返回内容中标记
+    status, body = health("?ready=1")
+
+    assert status == 200
+    assert (body["msg"], body["data"]["ready"], body["data"]["stale"]) == ("stale, re-warming", True, True)
+
+    backend.CACHE_WARMER.warm(state[0])
+
+    status, body = health("?ready=1")
+
+    assert status == 200
+    assert (body["msg"], body["data"]["stale"]) == ("ok", False)
+
+def test_isStale():
+    cacheWarmer = warmer(["v1"])
+
+    # 还没有预热过，算作未就绪而不是过期
+    assert not cacheWarmer.isReady()
+    assert not cacheWarmer.isStale("v1")
+
+    cacheWarmer.warm("v1")
+
+    assert cacheWarmer.isReady()
+    assert not cacheWarmer.isStale("v1")
+    assert cacheWarmer.isStale("v2")
+    assert not cacheWarmer.isStale(None)
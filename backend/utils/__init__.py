@@ -0,0 +1,8 @@
+import os
+import sys
+
+# 仓库根目录，backend 和 crawler 共用的 common 包在这里
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
@@ -0,0 +1,258 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from . import bckndJson
+
+class MemoryStore:
+    '''
+    In-process LRU store of JSON strings, or of bytes such as compressed bodies.
+
+    Entries expire after their ttl, and the least recently used ones are
+    dropped once the stored values exceed `maxBytes` characters (or bytes) in total.
+    '''
+    def __init__(self, maxBytes):
+        self.maxBytes = maxBytes
+
+        self._entries = OrderedDict() # key -> (expiresAt, value)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        '''
+        The value of key, None when absent or expired
+        '''
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                return None
+
+            if entry[0] <= time.monotonic():
+                self._drop(key)
+                return None
+
+            self._entries.move_to_end(key)
+
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+
+            # 单个超过上限的值不缓存
+            if len(value) > self.maxBytes:
+                return
+
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._bytes += len(value)
+
+            while self._bytes > self.maxBytes:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, key):
+        _, value = self._entries.pop(key)
+        self._bytes -= len(value)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes}
+
+class RedisStore:
+    '''
+    Store shared by every backend process, needs the `redis` package.
+    Expiry is left to Redis, size limits to its maxmemory policy.
+    Values are read back as strings, or as bytes when `decode` is false
+    '''
+    def __init__(self, url, prefix="tjcs:", decode=True):
+        import redis # 可选依赖，只有配置了 redis 时才需要
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.decode = decode
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+
+        if value is None or not self.decode:
+            return value
+
+        return value.decode('utf-8')
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, value, ex=max(1, int(ttl)))
+
+    def stats(self):
+        return {}
+
+class _Flight:
+    '''
+    One load in progress, waited on by concurrent misses of the same key
+    '''
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+class ResponseCache:
+    '''
+    Cache of data source results, keyed by method, crawl version and arguments.
+
+    Values are kept as JSON strings, so every hit decodes a fresh object that
+    the caller may modify, as it would a fresh query result, and any store
+    holding strings can be plugged in (see MemoryStore, RedisStore).
+    A new crawl changes the version, so stale entries are never read again and
+    age out of the store. Concurrent misses of one key are coalesced: the
+    first caller runs the query, the others wait for its result.
+    '''
+    def __init__(self, store, version, ttl):
+        self.store = store
+        self.version = version # 返回当前数据版本的函数
+        self.ttl = ttl
+
+        self._flights = {} # key -> _Flight
+        self._lock = threading.Lock()
+
+        self._metrics = {"hits": 0, "misses": 0, "coalesced": 0, "errors": 0}
+
+    def key(self, name, args):
+        digest = hashlib.sha1(json.dumps(args, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8')).hexdigest()
+
+        return f"{name}:{self.version()}:{digest}"
+
+    def _count(self, metric):
+        with self._lock:
+            self._metrics[metric] += 1
+
+    def _lookup(self, name, args, load):
+        '''
+        (JSON text, result) of method `name` called with args, load() runs the query on a miss.
+        result is the loaded object for the caller that ran the query, None otherwise
+        '''
+        key = self.key(name, args)
+
+        try:
+            value = self.store.get(key)
+        except Exception as e:
+            # 外部存储不可用时直接查询
+            print(f"读取缓存失败：{e}")
+            self._count("errors")
+            value = None
+
+        if value is not None:
+            self._count("hits")
+            return value, None
+
+        with self._lock:
+            flight = self._flights.get(key)
+            isLeader = flight is None
+
+            if isLeader:
+                flight = self._flights[key] = _Flight()
+                self._metrics["misses"] += 1
+            else:
+                self._metrics["coalesced"] += 1
+
+        if not isLeader:
+            flight.done.wait()
+
+            if flight.error is not None:
+                raise flight.error
+
+            return flight.value, None
+
+        try:
+            result = load()
+            # 键排序后的文本可直接作为响应的一部分，见 bckndJson.envelope
+            flight.value = bckndJson.dumps(result, sortKeys=True)
+
+            try:
+                self.store.set(key, flight.value, self.ttl)
+            except Exception as e:
+                print(f"写入缓存失败：{e}")
+                self._count("errors")
+
+            return flight.value, result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+
+            flight.done.set()
+
+    def get(self, name, args, load):
+        '''
+        Result of method `name` called with args, load() runs the query on a miss
+        '''
+        value, result = self._lookup(name, args, load)
+
+        return result if result is not None else bckndJson.loads(value)
+
+    def getRaw(self, name, args, load):
+        '''
+        Key-sorted JSON text of the result, for responses that pass it through unchanged
+        '''
+        return self._lookup(name, args, load)[0]
+
+    def stats(self):
+        with self._lock:
+            metrics = dict(self._metrics)
+
+        return {**metrics, **self.store.stats()}
+
+class CachedSession:
+    '''
+    Wrap a data source factory, e.g. bckndSql.bckndSql, for `with ... as sql:`.
+    Methods in `methods` are answered from the cache, and the real source is
+    only opened (a pooled connection borrowed) when something misses.
+    '''
+    def __init__(self, cache, methods, factory):
+        self._cache = cache
+        self._methods = methods
+        self._factory = factory
+        self._source = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._source is not None:
+            self._source.__exit__(exc_type, exc_value, traceback)
+
+    def _open(self):
+        if self._source is None:
+            self._source = self._factory().__enter__()
+
+        return self._source
+
+    def __getattr__(self, name):
+        if name not in self._methods:
+            return getattr(self._open(), name)
+
+        def cached(*args, **kwargs):
+            return self._cache.get(name, [args, kwargs], lambda: getattr(self._open(), name)(*args, **kwargs))
+
+        return cached
+
+    def raw(self, name, *args, **kwargs):
+        '''
+        Key-sorted JSON text of sql.name(*args, **kwargs), straight from the cache
+        '''
+        if name not in self._methods:
+            return bckndJson.dumps(getattr(self._open(), name)(*args, **kwargs), sortKeys=True)
+
+        return self._cache.getRaw(name, [args, kwargs], lambda: getattr(self._open(), name)(*args, **kwargs))
+
+def rawResult(sql, name, *args, **kwargs):
+    '''
+    Key-sorted JSON text of sql.name(*args, **kwargs) for any data source,
+    without a decode and encode round trip when it is a CachedSession
+    '''
+    if isinstance(sql, CachedSession):
+        return sql.raw(name, *args, **kwargs)
+
+    return bckndJson.dumps(getattr(sql, name)(*args, **kwargs), sortKeys=True)
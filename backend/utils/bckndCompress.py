@@ -0,0 +1,95 @@
+import gzip
+import hashlib
+import threading
+
+try:
+    import brotli # 可选依赖，没有时只用 gzip
+except ImportError:
+    brotli = None
+
+class ResponseCompressor:
+    '''
+    Content-Encoding negotiation and compression of response bodies.
+
+    Compressed bodies of versioned responses are kept in `store` under their
+    ETag and a digest of the body, so every response is compressed once per
+    crawl instead of once per request, and a cached body is only reused for
+    exactly the body it was compressed from, whatever the ETag covers.
+    Bodies shorter than `minSize` bytes are sent as they are.
+    '''
+    def __init__(self, store, ttl, level, brotliQuality, minSize):
+        self.store = store
+        self.ttl = ttl
+        self.level = level # gzip 1-9
+        self.brotliQuality = brotliQuality # brotli 0-11
+        self.minSize = minSize
+
+        self._lock = threading.Lock()
+        self._metrics = {"hits": 0, "misses": 0, "errors": 0, "bytesIn": 0, "bytesOut": 0}
+
+    def encodings(self):
+        '''
+        Supported encodings, the preferred one first
+        '''
+        return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+    def negotiate(self, acceptEncodings):
+        '''
+        The encoding to use for a request's Accept-Encoding (werkzeug Accept), None for none
+        '''
+        return acceptEncodings.best_match(self.encodings())
+
+    def _compress(self, body, encoding):
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotliQuality)
+
+        # mtime 固定为 0，同一内容的压缩结果相同
+        return gzip.compress(body, compresslevel=self.level, mtime=0)
+
+    def _count(self, **counts):
+        with self._lock:
+            for metric, count in counts.items():
+                self._metrics[metric] += count
+
+    def compress(self, body, encoding, key=None):
+        '''
+        body compressed with encoding, read from and kept in the store under key
+        (the response's ETag) and the body's digest when key is given
+        '''
+        if key is None:
+            data = self._compress(body, encoding)
+            self._count(bytesIn=len(body), bytesOut=len(data))
+            return data
+
+        # sha1 比压缩本身快得多；同一 ETag 的响应体不同（如参数不在 ETag 中）时不会拿到别的响应
+        key = f"{encoding}:{key}:{hashlib.sha1(body).hexdigest()}"
+
+        try:
+            data = self.store.get(key)
+        except Exception as e:
+            print(f"读取压缩缓存失败：{e}")
+            self._count(errors=1)
+            data = None
+
+        if data is not None:
+            self._count(hits=1, bytesIn=len(body), bytesOut=len(data))
+            return data
+
+        data = self._compress(body, encoding)
+        self._count(misses=1, bytesIn=len(body), bytesOut=len(data))
+
+        try:
+            self.store.set(key, data, self.ttl)
+        except Exception as e:
+            print(f"写入压缩缓存失败：{e}")
+            self._count(errors=1)
+
+        return data
+
+    def stats(self):
+        with self._lock:
+            metrics = dict(self._metrics)
+
+        metrics["ratio"] = round(metrics["bytesOut"] / metrics["bytesIn"], 3) if metrics["bytesIn"] else None
+
+        return {**metrics, "encodings": self.encodings(), **self.store.stats()}
@@ -0,0 +1,65 @@
+import threading
+import time
+from collections import OrderedDict
+
+class EnrollmentCache:
+    '''
+    Short-lived cache of (number, elcNumber) per teaching class, keyed by (calendarId, code).
+
+    Counts change between crawls (see crawler/refreshEnrollment.py), so entries
+    expire after `ttl` seconds instead of following the crawl version.
+    Each code is cached on its own, so timetables that share classes share
+    entries and a request only queries the codes that are missing or expired.
+    At most `maxSize` entries are kept, the least recently used go first.
+    '''
+    def __init__(self, ttl, maxSize):
+        self.ttl = ttl
+        self.maxSize = maxSize
+
+        self._entries = OrderedDict() # (calendarId, code) -> (expiresAt, (number, elcNumber) or None)
+        self._lock = threading.Lock()
+
+        self._metrics = {"hits": 0, "misses": 0}
+
+    def get(self, calendarId, codes, load):
+        '''
+        Counts of the given codes as {code: (number, elcNumber)}, codes not in the
+        calendar are left out. load(calendarId, missingCodes) is called once for
+        the missing or expired codes and returns {code: (number, elcNumber)}
+        '''
+        now = time.monotonic()
+        found = {}
+        missing = []
+
+        with self._lock:
+            for code in codes:
+                entry = self._entries.get((calendarId, code))
+
+                if entry is not None and entry[0] > now:
+                    self._entries.move_to_end((calendarId, code))
+                    found[code] = entry[1]
+                else:
+                    missing.append(code)
+
+            self._metrics["hits"] += len(codes) - len(missing)
+            self._metrics["misses"] += len(missing)
+
+        if missing:
+            loaded = load(calendarId, missing)
+            expiresAt = time.monotonic() + self.ttl
+
+            with self._lock:
+                # 不存在的代码也缓存，避免反复查询
+                for code in missing:
+                    found[code] = loaded.get(code)
+                    self._entries[(calendarId, code)] = (expiresAt, found[code])
+                    self._entries.move_to_end((calendarId, code))
+
+                while len(self._entries) > self.maxSize:
+                    self._entries.popitem(last=False)
+
+        return {code: counts for code, counts in found.items() if counts is not None}
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._entries), **self._metrics}
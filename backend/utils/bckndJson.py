@@ -0,0 +1,61 @@
+import json
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson # 可选依赖，没有时使用标准库 json
+except ImportError:
+    orjson = None
+
+def loads(text):
+    '''
+    Decode JSON text or UTF-8 bytes
+    '''
+    if orjson is not None:
+        return orjson.loads(text)
+
+    return json.loads(text)
+
+def dumps(obj, sortKeys=False):
+    '''
+    Compact JSON text of obj, non-ASCII characters are kept as is.
+    With sortKeys it is the text JSONProvider writes in a response
+    '''
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS | (orjson.OPT_SORT_KEYS if sortKeys else 0)).decode('utf-8')
+
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'), sort_keys=sortKeys)
+
+class JSONProvider(DefaultJSONProvider):
+    '''
+    Flask JSON provider backed by orjson when installed.
+
+    The output keeps the default provider's sorted keys and its handling of
+    dates, Decimal and other types (through `default`), but leaves non-ASCII
+    characters unescaped, which is also what the standard library fallback
+    does.
+    '''
+    ensure_ascii = False
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or not set(kwargs) <= {'indent', 'separators'}:
+            return super().dumps(obj, **kwargs)
+
+        option = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+
+        return orjson.dumps(obj, default=self.default, option=option).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+
+        return orjson.loads(s)
+
+def envelope(raw, msg="查询成功", code=200):
+    '''
+    Response body {"code", "data", "msg"} around `raw`, the key-sorted JSON text of data,
+    the same text jsonify would produce for the decoded data, without decoding it
+    '''
+    return f'{{"code":{code},"data":{raw},"msg":{dumps(msg)}}}\n'
@@ -0,0 +1,182 @@
+import mysql.connector
+import threading
+import time
+
+class PoolTimeoutError(Exception):
+    '''
+    Raised when no connection becomes available within the wait timeout
+    '''
+    pass
+
+class ConnectionPool:
+    '''
+    A process-wide pool of MySQL connections, shared by every bckndSql object.
+
+    Connections are created lazily up to `size`. On checkout, a connection
+    older than `recycle` seconds is closed and replaced, and a connection that
+    has been idle for more than `pingInterval` seconds is pinged first, so a
+    connection dropped by the server (wait_timeout) is never handed out.
+    '''
+    def __init__(self, size, recycle, pingInterval, timeout, **connectArgs):
+        self.size = size
+        self.recycle = recycle
+        self.pingInterval = pingInterval
+        self.timeout = timeout
+        self.connectArgs = connectArgs
+
+        self._cond = threading.Condition()
+        self._idle = [] # [(conn, createdAt, lastUsed)]
+        self._createdAt = {} # id(conn) -> createdAt
+        self._total = 0 # 已建立 + 正在建立的连接数
+        self._inUse = 0
+
+        # 统计信息
+        self._metrics = {
+            "acquired": 0,
+            "waited": 0,
+            "waitTimeTotal": 0.0,
+            "waitTimeMax": 0.0,
+            "timeouts": 0,
+            "created": 0,
+            "recycled": 0,
+            "pingFailed": 0,
+        }
+
+    def _connect(self):
+        '''
+        Open a new connection.
+        autocommit is on so that a reused connection never keeps an old
+        REPEATABLE READ snapshot and always sees the latest crawl.
+        '''
+        return mysql.connector.connect(autocommit=True, **self.connectArgs)
+
+    def _close(self, conn):
+        self._createdAt.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def acquire(self):
+        '''
+        Check out a healthy connection, waiting at most `timeout` seconds
+        '''
+        start = time.monotonic()
+        deadline = start + self.timeout
+        hasWaited = False
+
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn, createdAt, lastUsed = self._idle.pop()
+                    break
+
+                if self._total < self.size:
+                    conn, createdAt, lastUsed = None, None, None
+                    self._total += 1 # 先占位，防止并发创建超过 size
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._metrics["timeouts"] += 1
+                    raise PoolTimeoutError(f"No database connection available within {self.timeout}s")
+
+                hasWaited = True
+                self._cond.wait(remaining)
+
+            self._inUse += 1
+
+        # 健康检查和建立连接都在锁外进行
+        try:
+            conn = self._checkout(conn, createdAt, lastUsed)
+        except Exception:
+            with self._cond:
+                self._total -= 1
+                self._inUse -= 1
+                self._cond.notify()
+            raise
+
+        waitTime = time.monotonic() - start
+
+        with self._cond:
+            self._metrics["acquired"] += 1
+            if hasWaited:
+                self._metrics["waited"] += 1
+            self._metrics["waitTimeTotal"] += waitTime
+            self._metrics["waitTimeMax"] = max(self._metrics["waitTimeMax"], waitTime)
+
+        return conn
+
+    def _checkout(self, conn, createdAt, lastUsed):
+        '''
+        Validate an idle connection, or open a new one in its slot
+        '''
+        now = time.monotonic()
+
+        if conn is not None and now - createdAt > self.recycle:
+            # 连接太老了，换一个
+            self._close(conn)
+            conn = None
+            with self._cond:
+                self._metrics["recycled"] += 1
+
+        elif conn is not None and now - lastUsed > self.pingInterval:
+            try:
+                conn.ping(reconnect=False)
+            except Exception:
+                self._close(conn)
+                conn = None
+                with self._cond:
+                    self._metrics["pingFailed"] += 1
+
+        if conn is None:
+            conn = self._connect()
+            with self._cond:
+                self._createdAt[id(conn)] = time.monotonic()
+                self._metrics["created"] += 1
+
+        return conn
+
+    def release(self, conn, discard=False):
+        '''
+        Return a connection to the pool.
+        Pass discard=True when the connection may be broken, it will be closed
+        and its slot freed.
+        '''
+        if discard:
+            self._close(conn)
+
+        with self._cond:
+            self._inUse -= 1
+
+            if discard:
+                self._total -= 1
+            else:
+                self._idle.append((conn, self._createdAt.get(id(conn), time.monotonic()), time.monotonic()))
+
+            self._cond.notify()
+
+    def stats(self):
+        '''
+        Snapshot of pool usage and wait metrics
+        '''
+        with self._cond:
+            result = dict(self._metrics)
+            result["size"] = self.size
+            result["open"] = self._total
+            result["idle"] = len(self._idle)
+            result["inUse"] = self._inUse
+            result["waitTimeAvg"] = result["waitTimeTotal"] / result["acquired"] if result["acquired"] else 0.0
+
+        return result
+
+    def closeAll(self):
+        '''
+        Close every idle connection, e.g. before the process exits
+        '''
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._total -= len(idle)
+
+        for conn, _, _ in idle:
+            self._close(conn)
@@ -0,0 +1,603 @@
+from collections import namedtuple
+import threading
+from . import bckndSql
+from .bckndTools import arrangementTextToObj, arrangementRowsToInfo, splitArrangeInfo, weeksToMask
+
+# 一个教学班，*Key 字段为 None 表示对应的维度表 JOIN 不上，与 SQL 中的内连接语义保持一致
+ClassRow = namedtuple("ClassRow", [
+    "id", "code", "courseCode", "courseName", "credit",
+    "labelKey", "labelName", "facultyKey", "faculty",
+    "campusKey", "campus", "languageKey", "language",
+    "number", "elcNumber",
+])
+
+# 一条教师记录，arrangementInfo 是 arrangeInfoText 解析后的结果
+TeacherRow = namedtuple("TeacherRow", [
+    "id", "teacherCode", "teacherName", "arrangeInfoText", "arrangementInfo",
+])
+
+def parseLocations(text):
+    '''
+    Parse arrangeInfoText into arrangementInfo, malformed lines are skipped
+    '''
+    result = []
+
+    for location in splitArrangeInfo(text or ""):
+        try:
+            result.append(arrangementTextToObj(location))
+        except Exception:
+            pass
+
+    return result
+
+def copyArrangementInfo(arrangementInfo):
+    '''
+    Copies of the arrangement dicts of a snapshot, down to their lists,
+    so that callers can modify a result without changing the shared snapshot
+    '''
+    return [
+        {**arrangement, "occupyTime": list(arrangement["occupyTime"]), "occupyWeek": list(arrangement["occupyWeek"])}
+        for arrangement in arrangementInfo
+    ]
+
+class GlobalSnapshot:
+    '''
+    Data that does not belong to a calendar: calendars, campuses, faculties and majors
+    '''
+    def __init__(self, version, sql):
+        self.version = version
+
+        self.calendars = sql.getAllCalendar()
+        self.campuses = sql.getAllCampus()
+        self.faculties = sql.getAllFaculty()
+
+        # 只为已知的学期建立快照
+        self.calendarIds = {calendar["calendarId"] for calendar in self.calendars}
+
+        sql.cursor.execute("SELECT grade, code, name FROM major ORDER BY code ASC")
+
+        self.majorsByGrade = {}
+        for grade, code, name in sql.cursor.fetchall():
+            self.majorsByGrade.setdefault(grade, []).append({"code": code, "name": name})
+
+class SemesterSnapshot:
+    '''
+    All course data of one calendar, answering the same queries as bckndSql in memory.
+    Return values have the same shape as the bckndSql methods, except that
+    course locations are returned already parsed as arrangementInfo.
+    '''
+    def __init__(self, calendarId, version, sql):
+        self.calendarId = calendarId
+        self.version = version
+
+        # 教学班
+        sql.cursor.execute(
+            "SELECT c.id, c.code, c.courseCode, c.courseName, c.credit,"
+            " n.courseLabelId, n.courseLabelName, f.faculty, f.facultyI18n,"
+            " ca.campus, ca.campusI18n, l.teachingLanguage, l.teachingLanguageI18n,"
+            " c.number, c.elcNumber"
+            " FROM coursedetail AS c"
+            " LEFT JOIN coursenature AS n ON n.courseLabelId = c.courseLabelId"
+            " LEFT JOIN faculty AS f ON f.faculty = c.faculty"
+            " LEFT JOIN campus AS ca ON ca.campus = c.campus"
+            " LEFT JOIN language AS l ON l.teachingLanguage = c.teachingLanguage"
+            " WHERE c.calendarId = %s"
+            " ORDER BY c.courseCode, c.code",
+            (calendarId, )
+        )
+
+        self.classes = {}
+        self.classesByCourseCode = {}
+
+        for row in sql.cursor.fetchall():
+            cls = ClassRow(*row)
+            self.classes[cls.id] = cls
+            self.classesByCourseCode.setdefault(cls.courseCode, []).append(cls)
+
+        # 教师与排课
+        sql.cursor.execute(
+            "SELECT t.teachingClassId, t.id, t.teacherCode, t.teacherName, t.arrangeInfoText"
+            " FROM teacher AS t"
+            " JOIN coursedetail AS c ON c.id = t.teachingClassId"
+            " WHERE c.calendarId = %s"
+            " ORDER BY t.id",
+            (calendarId, )
+        )
+
+        teacherRows = sql.cursor.fetchall()
+
+        # 爬取时已解析的排课
+        sql.cursor.execute(
+            "SELECT a.teacherId, a.id, a.arrangementText, a.occupyDay, a.startSection, a.endSection,"
+            " a.weekMask, a.room, a.teacherAndCode"
+            " FROM arrangement AS a"
+            " WHERE a.calendarId = %s",
+            (calendarId, )
+        )
+
+        arrangements = {}
+
+        for teacherId, *row in sql.cursor.fetchall():
+            arrangements.setdefault(teacherId, []).append(
+                dict(zip(("id", "text", "day", "start", "end", "weekMask", "room", "teacher"), row))
+            )
+
+        self.teachers = {}
+
+        for classId, teacherId, teacherCode, teacherName, arrangeInfoText in teacherRows:
+            if teacherId in arrangements:
+                arrangementInfo = arrangementRowsToInfo(arrangements[teacherId])
+            else:
+                arrangementInfo = parseLocations(arrangeInfoText) # 旧数据
+
+            self.teachers.setdefault(classId, []).append(TeacherRow(
+                teacherId, teacherCode, teacherName, arrangeInfoText, arrangementInfo
+            ))
+
+        # 专业与课程
+        sql.cursor.execute(
+            "SELECT mac.courseId, m.id, m.code, m.grade"
+            " FROM majorandcourse AS mac"
+            " JOIN major AS m ON m.id = mac.majorId"
+            " JOIN coursedetail AS c ON c.id = mac.courseId"
+            " WHERE c.calendarId = %s",
+            (calendarId, )
+        )
+
+        self.majorsOfClass = {} # classId -> {majorId}
+        self.classesOfMajor = {} # majorId -> [classId]
+        self.majorsByCode = {} # code -> {(majorId, grade)}
+
+        for classId, majorId, code, grade in sql.cursor.fetchall():
+            self.majorsOfClass.setdefault(classId, set()).add(majorId)
+            self.classesOfMajor.setdefault(majorId, []).append(classId)
+            self.majorsByCode.setdefault(code, set()).add((majorId, grade))
+
+        self._optionalRows = {} # tuple(labelList) -> rows
+
+        self.grades = sorted({grade for majors in self.majorsByCode.values() for _, grade in majors if grade is not None}, reverse=True)
+
+    def _teacherList(self, classId):
+        return [
+            {"teacherCode": teacher.teacherCode, "teacherName": teacher.teacherName}
+            for teacher in self.teachers.get(classId, [])
+        ]
+
+    def findGradeByCalendarId(self, calendarId):
+        return list(self.grades)
+
+    def findCourseByMajor(self, grade, code, calendarId):
+        # 目标专业的课程，(courseCode, grade, majorId)
+        codes = set()
+
+        for majorId, majorGrade in self.majorsByCode.get(code, ()):
+            if majorGrade is None or majorGrade > int(grade):
+                continue
+
+            for classId in self.classesOfMajor.get(majorId, []):
+                codes.add((self.classes[classId].courseCode, majorGrade, majorId))
+
+        groups = {}
+
+        for courseCode, majorGrade, majorId in sorted(codes, key=lambda x: (x[0], -x[1])):
+            for cls in self.classesByCourseCode.get(courseCode, []):
+                if None in (cls.labelKey, cls.facultyKey, cls.campusKey, cls.languageKey):
+                    continue
+
+                teachers = self.teachers.get(cls.id)
+
+                if not teachers:
+                    continue
+
+                key = (cls.courseCode, cls.courseName, cls.faculty, majorGrade, cls.credit)
+
+                if key not in groups:
+                    groups[key] = {
+                        "courseCode": cls.courseCode,
+                        "courseName": cls.courseName,
+                        "faculty": cls.faculty,
+                        "credit": cls.credit,
+                        "grade": majorGrade,
+                        "courseNature": [],
+                        "courses": [],
+                    }
+
+                group = groups[key]
+
+                if cls.labelName not in group["courseNature"]:
+                    group["courseNature"].append(cls.labelName)
+
+                teacherList = self._teacherList(cls.id)
+                isExclusive = 1 if majorId in self.majorsOfClass.get(cls.id, ()) else 0
+
+                # 与 SQL 相同，每条教师记录对应一个条目
+                for teacher in teachers:
+                    group["courses"].append({
+                        "code": cls.code,
+                        "teachers": teacherList,
+                        "campus": cls.campus,
+                        "arrangementInfo": copyArrangementInfo(teacher.arrangementInfo),
+                        "teachingLanguage": cls.language,
+                        "isExclusive": isExclusive,
+                    })
+
+        return list(groups.values())
+
+    def findOptionalCourseType(self, labelList, calendarId):
+        labels = {
+            (cls.labelKey, cls.labelName)
+            for cls in self.classes.values()
+            if cls.labelKey is not None and cls.labelName in labelList
+        }
+
+        return [
+            {"courseLabelId": labelId, "courseLabelName": labelName}
+            for labelId, labelName in sorted(labels, reverse=True)
+        ]
+
+    def findCourseByNatureId(self, natureIds, calendarId):
+        labels = {}
+
+        for cls in self.classes.values():
+            if cls.labelKey not in natureIds or None in (cls.facultyKey, cls.campusKey):
+                continue
+
+            label = labels.setdefault(cls.labelKey, {"courseLabelName": cls.labelName, "courses": {}})
+            key = (cls.courseCode, cls.courseName, cls.credit, cls.faculty)
+            label["courses"].setdefault(key, set()).add(cls.campus)
+
+        result = []
+
+        for labelId in sorted(labels, reverse=True):
+            label = labels[labelId]
+
+            result.append({
+                "courseLabelId": labelId,
+                "courseLabelName": label["courseLabelName"],
+                "courses": [
+                    {
+                        "courseCode": courseCode,
+                        "courseName": courseName,
+                        "faculty": faculty,
+                        "credit": credit,
+                        "campus": sorted(campus),
+                    }
+                    for (courseCode, courseName, credit, faculty), campus
+                    in sorted(label["courses"].items(), key=lambda x: x[0][0], reverse=True)
+                ],
+            })
+
+        return result
+
+    def findCourseDetailByCode(self, code, calendarId):
+        result = []
+
+        for cls in self.classesByCourseCode.get(code, []):
+            if None in (cls.labelKey, cls.facultyKey, cls.campusKey, cls.languageKey):
+                continue
+
+            teacherList = self._teacherList(cls.id)
+
+            for teacher in self.teachers.get(cls.id, []):
+                result.append({
+                    "code": cls.code,
+                    "teachers": teacherList,
+                    "campus": cls.campus,
+                    "arrangementInfo": copyArrangementInfo(teacher.arrangementInfo),
+                    "teachingLanguage": cls.language,
+                })
+
+        return result
+
+    def findCourseBySearch(self, searchBody, sizeLimit=50):
+        # MySQL 的排序规则不区分大小写
+        courseName = searchBody['courseName'].casefold()
+        courseCode = searchBody['courseCode']
+        teacherCode = searchBody['teacherCode']
+        teacherName = searchBody['teacherName'].casefold()
+        campus = searchBody['campus'].casefold()
+        faculty = searchBody['faculty'].casefold()
+
+        groups = {}
+
+        for cls in self.classes.values():
+            if None in (cls.labelKey, cls.facultyKey, cls.campusKey):
+                continue
+            if courseName and courseName not in (cls.courseName or "").casefold():
+                continue
+            if courseCode and courseCode not in (cls.courseCode, cls.code):
+                continue
+            if campus and campus != (cls.campus or "").casefold():
+                continue
+            if faculty and faculty != (cls.faculty or "").casefold():
+                continue
+
+            matched = [
+                teacher for teacher in self.teachers.get(cls.id, [])
+                if (not teacherCode or teacher.teacherCode == teacherCode)
+                and (not teacherName or (teacher.teacherName or "").casefold() == teacherName)
+            ]
+
+            if not matched:
+                continue
+
+            key = (cls.courseCode, cls.courseName, cls.faculty, cls.credit)
+            group = groups.setdefault(key, (set(), set()))
+            group[0].add(cls.labelName)
+            group[1].add(cls.campus)
+
+        result = []
+
+        for (courseCode, courseName, faculty, credit), (natures, campuses) in sorted(groups.items(), key=lambda x: x[0][0]):
+            if len(result) >= sizeLimit:
+                break
+
+            result.append({
+                "courseCode": courseCode,
+                "courseName": courseName,
+                "faculty": faculty,
+                "credit": credit,
+                "courseNature": sorted(natures),
+                "campus": sorted(campuses),
+            })
+
+        return result
+
+    def findOptionalCourseArrangement(self, labelList, calendarId):
+        key = tuple(sorted(labelList))
+
+        if key not in self._optionalRows:
+            self._optionalRows[key] = self._optionalCourseArrangement(labelList)
+
+        return list(self._optionalRows[key])
+
+    def _optionalCourseArrangement(self, labelList):
+        rows = set()
+
+        for cls in self.classes.values():
+            if cls.labelKey not in labelList or None in (cls.facultyKey, cls.campusKey):
+                continue
+
+            for teacher in self.teachers.get(cls.id, []):
+                for arrangement in teacher.arrangementInfo:
+                    rows.add((
+                        cls.courseCode, cls.courseName, cls.faculty, cls.credit, cls.labelName, cls.campus,
+                        arrangement["occupyDay"], arrangement["occupyTime"][0], arrangement["occupyTime"][-1],
+                        weeksToMask(arrangement["occupyWeek"]),
+                    ))
+
+        return list(rows)
+
+    def findCourseByTime(self, day, sectionRange, labelList, calendarId, week=None):
+        firstSection, lastSection = sectionRange
+        groups = {}
+
+        for courseCode, courseName, faculty, credit, labelName, campus, occupyDay, startSection, endSection, weekMask in self.findOptionalCourseArrangement(labelList, calendarId):
+            if occupyDay != day or startSection > lastSection or endSection < firstSection:
+                continue
+
+            if week is not None and not weekMask >> (week - 1) & 1:
+                continue
+
+            key = (courseCode, courseName, faculty, labelName, credit)
+            groups.setdefault(key, set()).add(campus)
+
+        return [
+            {
+                "courseCode": courseCode,
+                "courseName": courseName,
+                "faculty": faculty,
+                "credit": credit,
+                "courseNature": [labelName],
+                "campus": sorted(campus),
+            }
+            for (courseCode, courseName, faculty, labelName, credit), campus
+            in sorted(groups.items(), key=lambda x: x[0][0], reverse=True)
+        ]
+
+    def getAllRooms(self, calendarId):
+        # 与 SQL 相同，每条教师记录只取 arrangeInfoText 中最后一个 "] " 之后的部分，
+        # 即最后一行排课的教室，其他行的教室不会出现在列表中
+        rooms = set()
+
+        for teachers in self.teachers.values():
+            for teacher in teachers:
+                room = (teacher.arrangeInfoText or "").split("] ")[-1].strip()
+
+                if room:
+                    rooms.add(room)
+
+        return sorted(rooms)
+
+    def getCoursesByRoom(self, room, calendarId):
+        pattern = f"] {room}"
+        result = []
+
+        for classId, teachers in self.teachers.items():
+            cls = self.classes[classId]
+
+            if None in (cls.facultyKey, cls.campusKey):
+                continue
+
+            # 与 SQL 相同，按 (教学班, 排课文本) 分组
+            groups = {}
+
+            for teacher in teachers:
+                if teacher.arrangeInfoText and pattern in teacher.arrangeInfoText:
+                    groups.setdefault(teacher.arrangeInfoText, []).append(teacher)
+
+            for group in groups.values():
+                result.append({
+                    "courseCode": cls.courseCode,
+                    "courseName": cls.courseName,
+                    "code": cls.code,
+                    "faculty": cls.faculty,
+                    "credit": cls.credit,
+                    "campus": cls.campus,
+                    "teachers": [
+                        {"teacherCode": teacher.teacherCode, "teacherName": teacher.teacherName}
+                        for teacher in group
+                    ],
+                    "arrangementInfo": copyArrangementInfo(group[0].arrangementInfo),
+                })
+
+        return result
+
+class SnapshotStore:
+    '''
+    Holds one snapshot per calendar and reloads it when fetchlog shows a new crawl.
+
+    A snapshot is built completely before it replaces the old one, so a request
+    sees either the old or the new data, never a mix. While a calendar reloads,
+    other requests keep being served from its previous snapshot.
+    '''
+    def __init__(self, crawlVersion):
+        self.crawlVersion = crawlVersion
+
+        self._global = None
+        self._calendars = {} # calendarId -> SemesterSnapshot
+        self._loadLock = threading.Lock()
+
+    def version(self):
+        '''
+        Latest crawl time
+        '''
+        return self.crawlVersion.get()
+
+    def _get(self, current, build):
+        '''
+        Return `current` if it is up to date, otherwise build a new one.
+        A stale snapshot is still returned while another thread is rebuilding it.
+        '''
+        version = self.version()
+
+        if current is not None and current.version == version:
+            return current
+
+        if current is not None:
+            if not self._loadLock.acquire(blocking=False):
+                return current
+        else:
+            self._loadLock.acquire()
+
+        try:
+            with bckndSql.bckndSql() as sql:
+                return build(version, sql)
+        finally:
+            self._loadLock.release()
+
+    def globalSnapshot(self):
+        current = self._global
+
+        def build(version, sql):
+            if self._global is not None and self._global.version == version:
+                return self._global
+            self._global = GlobalSnapshot(version, sql)
+            return self._global
+
+        return self._get(current, build)
+
+    def calendar(self, calendarId):
+        '''
+        The snapshot of a calendar, None for a calendar not in getAllCalendar,
+        so that arbitrary ids sent by clients do not each build and keep a snapshot
+        '''
+        calendarId = int(calendarId)
+
+        if calendarId not in self.globalSnapshot().calendarIds:
+            return None
+
+        current = self._calendars.get(calendarId)
+
+        def build(version, sql):
+            snapshot = self._calendars.get(calendarId)
+            if snapshot is not None and snapshot.version == version:
+                return snapshot
+            snapshot = SemesterSnapshot(calendarId, version, sql)
+            self._calendars[calendarId] = snapshot # 整体替换，原子操作
+            return snapshot
+
+        return self._get(current, build)
+
+    def session(self):
+        return snapshotSql(self)
+
+class snapshotSql:
+    '''
+    Drop-in replacement of bckndSql backed by SnapshotStore,
+    queries not covered by the snapshot still go to MySQL
+    '''
+    def __init__(self, store):
+        self.store = store
+        self._sql = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._sql is not None:
+            self._sql.__exit__(exc_type, exc_value, traceback)
+            self._sql = None
+
+    def _mysql(self):
+        if self._sql is None:
+            self._sql = bckndSql.bckndSql()
+        return self._sql
+
+    def _calendar(self, calendarId):
+        '''
+        The snapshot of a calendar, MySQL for a calendar without one (see SnapshotStore.calendar)
+        '''
+        snapshot = self.store.calendar(calendarId)
+
+        return snapshot if snapshot is not None else self._mysql()
+
+    # 全局数据的列表和字典由所有请求共享，返回副本
+
+    def getAllCalendar(self):
+        return [dict(calendar) for calendar in self.store.globalSnapshot().calendars]
+
+    def getAllCampus(self):
+        return [dict(campus) for campus in self.store.globalSnapshot().campuses]
+
+    def getAllFaculty(self):
+        return [dict(faculty) for faculty in self.store.globalSnapshot().faculties]
+
+    def findMajorByGrade(self, grade):
+        return [dict(major) for major in self.store.globalSnapshot().majorsByGrade.get(int(grade), [])]
+
+    def getLatestUpdateTime(self):
+        return self.store.version()
+
+    def findGradeByCalendarId(self, calendarId):
+        return self._calendar(calendarId).findGradeByCalendarId(calendarId)
+
+    def findCourseByMajor(self, grade, code, calendarId):
+        return self._calendar(calendarId).findCourseByMajor(grade, code, calendarId)
+
+    def findOptionalCourseType(self, labelList, calendarId):
+        return self._calendar(calendarId).findOptionalCourseType(labelList, calendarId)
+
+    def findCourseByNatureId(self, natureIds, calendarId):
+        return self._calendar(calendarId).findCourseByNatureId(natureIds, calendarId)
+
+    def findCourseDetailByCode(self, code, calendarId):
+        return self._calendar(calendarId).findCourseDetailByCode(code, calendarId)
+
+    def findCourseBySearch(self, searchBody, sizeLimit=50):
+        return self._calendar(searchBody['calendarId']).findCourseBySearch(searchBody, sizeLimit)
+
+    def findOptionalCourseArrangement(self, labelList, calendarId):
+        return self._calendar(calendarId).findOptionalCourseArrangement(labelList, calendarId)
+
+    def findCourseByTime(self, day, sectionRange, labelList, calendarId, week=None):
+        return self._calendar(calendarId).findCourseByTime(day, sectionRange, labelList, calendarId, week)
+
+    def getAllRooms(self, calendarId):
+        return self._calendar(calendarId).getAllRooms(calendarId)
+
+    def getCoursesByRoom(self, room, calendarId):
+        return self._calendar(calendarId).getCoursesByRoom(room, calendarId)
+
+    def getCourseReviews(self, courseCode):
+        return self._mysql().getCourseReviews(courseCode)
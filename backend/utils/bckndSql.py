@@ -1,6 +1,8 @@
 import mysql.connector
 import configparser
-import json
+from . import bckndJson
+from .bckndPool import ConnectionPool
+from .bckndTools import arrangementRowsToInfo, arrangementTextToObj, splitArrangeInfo
 
 # 读取配置文件
 CONFIG = configparser.ConfigParser()
@@ -14,30 +16,75 @@ DB_DATABASE = CONFIG['Sql']['database']
 DB_PORT = int(CONFIG['Sql']['port'])
 DB_CHARSET = CONFIG['Sql']['charset']
 
+# 连接池配置，[Pool] 段可省略
+POOL_SIZE = CONFIG.getint('Pool', 'size', fallback=8)
+POOL_RECYCLE = CONFIG.getint('Pool', 'recycle', fallback=3600) # 秒，超过这个时间的连接会被替换
+POOL_PING_INTERVAL = CONFIG.getint('Pool', 'ping_interval', fallback=30) # 秒，空闲超过这个时间的连接在使用前先 ping
+POOL_TIMEOUT = CONFIG.getint('Pool', 'timeout', fallback=10) # 秒，等待空闲连接的最长时间
+
+# 进程内共享的连接池
+POOL = ConnectionPool(
+    size=POOL_SIZE,
+    recycle=POOL_RECYCLE,
+    pingInterval=POOL_PING_INTERVAL,
+    timeout=POOL_TIMEOUT,
+    host=DB_HOST,
+    user=DB_USER,
+    password=DB_PASSWORD,
+    database=DB_DATABASE,
+    port=DB_PORT,
+    charset=DB_CHARSET
+)
+
+# 一位教师在 arrangement 表中的全部排课，用于 LATERAL JOIN，后接 WHERE a.teacherId = ...
+ARRANGEMENTS_OF_TEACHER = """
+            SELECT JSON_ARRAYAGG(
+                JSON_OBJECT(
+                    'id', a.id,
+                    'text', a.arrangementText,
+                    'day', a.occupyDay,
+                    'start', a.startSection,
+                    'end', a.endSection,
+                    'weekMask', a.weekMask,
+                    'room', a.room,
+                    'teacher', a.teacherAndCode
+                )
+            ) AS arrangements
+            FROM arrangement AS a"""
+
 class bckndSql:
     '''
     A class for handling MySQL database
     '''
     def __init__(self):
         '''
-        Initialize the database connection
+        Borrow a connection from the pool
         '''
-        self.db = mysql.connector.connect(
-            host=DB_HOST,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_DATABASE,
-            port=DB_PORT,
-            charset=DB_CHARSET  
-        )
-        self.cursor = self.db.cursor()
+        self.db = POOL.acquire()
+
+        try:
+            self.cursor = self.db.cursor()
+        except Exception:
+            # 拿不到游标时连接多半已经坏了，丢弃而不是放回池中
+            POOL.release(self.db, discard=True)
+            raise
 
     def __enter__(self):
         return self
     
     def __exit__(self, exc_type, exc_value, traceback):
-        self.cursor.close()
-        self.db.close()
+        '''
+        Return the connection to the pool, drop it if a database error occurred
+        '''
+        isBroken = exc_type is not None and issubclass(exc_type, mysql.connector.Error)
+
+        try:
+            self.cursor.close()
+        except mysql.connector.Error:
+            isBroken = True
+
+        POOL.release(self.db, discard=isBroken)
+
     def getAllCalendar(self):
         '''
         Get all calendar data
@@ -47,7 +94,7 @@ class bckndSql:
         result = self.cursor.fetchall()
 
         # json str result to json
-        return [json.loads(calendar[0]) for calendar in result]
+        return [bckndJson.loads(calendar[0]) for calendar in result]
 
     def getAllCampus(self):
         '''
@@ -58,7 +105,7 @@ class bckndSql:
         result = self.cursor.fetchall()
 
         # json str result to json
-        return [json.loads(campus[0]) for campus in result]
+        return [bckndJson.loads(campus[0]) for campus in result]
     
     def getAllFaculty(self):
         '''
@@ -69,7 +116,7 @@ class bckndSql:
         result = self.cursor.fetchall()
 
         # json str result to json
-        return [json.loads(faculty[0]) for faculty in result]
+        return [bckndJson.loads(faculty[0]) for faculty in result]
 
     def findGradeByCalendarId(self, calendarId):
         '''
@@ -109,7 +156,7 @@ class bckndSql:
         result = self.cursor.fetchall()
 
         # json str result to json
-        return [json.loads(major[0]) for major in result]
+        return [bckndJson.loads(major[0]) for major in result]
 
     
     def findCourseByMajor(self, grade, code, calendarId):
@@ -132,6 +179,7 @@ class bckndSql:
                             'teachers', teachers.teachers,
                             'campus', ca.campusI18n,
                             'locations', locations.locations,
+                            'arrangements', arr.arrangements,
                             'teachingLanguage', l.teachingLanguageI18n,
                             'isExclusive', 
                                 -- 判断是否存在关联的专业课程记录
@@ -159,9 +207,15 @@ class bckndSql:
         -- 获取地点信息
         JOIN (
             SELECT t.teachingClassid, 
+                   t.id AS teacherId,
                    t.arrangeInfoText AS locations
             FROM teacher AS t
         ) AS locations ON c.id = locations.teachingClassid
+        -- 爬取时已解析的排课，旧数据为 NULL
+        LEFT JOIN LATERAL (
+            {ARRANGEMENTS_OF_TEACHER}
+            WHERE a.teacherId = locations.teacherId
+        ) AS arr ON TRUE
         -- 获取筛选条件和grade，并关联专业课程关系
         JOIN (
             SELECT DISTINCT 
@@ -187,7 +241,7 @@ class bckndSql:
 
         result = self.cursor.fetchall()
         
-        result = [json.loads(course[0]) for course in result]
+        result = [bckndJson.loads(course[0]) for course in result]
 
         return result
 
@@ -268,7 +322,7 @@ class bckndSql:
         result = self.cursor.fetchall()
 
         # json
-        result = [json.loads(res[0]) for res in result]
+        result = [bckndJson.loads(res[0]) for res in result]
 
         # 再对courses字段进行json解析
         # for res in result:
@@ -289,6 +343,7 @@ class bckndSql:
             'teachers', teachers.teachers,
             'campus', ca.campusI18n,
             'locations', locations.locations,
+            'arrangements', arr.arrangements,
             'teachingLanguage', l.teachingLanguageI18n
             )
         FROM coursedetail as c
@@ -311,9 +366,15 @@ class bckndSql:
         -- 获取地点信息
         JOIN (
             SELECT t.teachingClassid, 
+                t.id AS teacherId,
                 t.arrangeInfoText AS locations
             FROM teacher AS t
         ) AS locations ON c.id = locations.teachingClassid
+        -- 爬取时已解析的排课，旧数据为 NULL
+        LEFT JOIN LATERAL (
+            {ARRANGEMENTS_OF_TEACHER}
+            WHERE a.teacherId = locations.teacherId
+        ) AS arr ON TRUE
         WHERE c.courseCode = %s
         AND c.calendarId = %s
         """
@@ -323,12 +384,54 @@ class bckndSql:
         result = self.cursor.fetchall()
 
         # json
-        result = [json.loads(res[0]) for res in result]
+        result = [bckndJson.loads(res[0]) for res in result]
 
         # print(result)
 
         return result
     
+    def getEnrollmentByCodes(self, codes, calendarId):
+        '''
+        Get capacity and enrolled count of teaching classes by code,
+        returns {code: (number, elcNumber)}, uses calendarCode_idx
+        '''
+        query = (
+            f"SELECT c.code, c.number, c.elcNumber"
+            f" FROM coursedetail AS c"
+            f" WHERE c.calendarId = %s"
+            f" AND c.code IN ({','.join(['%s' for _ in codes])})")
+
+        self.cursor.execute(query, (calendarId, *codes))
+
+        result = self.cursor.fetchall()
+
+        return {code: (number, elcNumber) for code, number, elcNumber in result}
+    
+    def getLatestEnrollmentChangeId(self):
+        '''
+        Get the id of the latest enrollmenthistory row, 0 when there is none
+        '''
+        self.cursor.execute("SELECT COALESCE(MAX(id), 0) FROM enrollmenthistory")
+
+        return self.cursor.fetchall()[0][0]
+
+    def getEnrollmentChanges(self, afterId, limit=5000):
+        '''
+        Get enrollment changes after an enrollmenthistory id in id order,
+        as (id, calendarId, code, number, elcNumber)
+        '''
+        query = (
+            "SELECT h.id, c.calendarId, c.code, h.number, h.elcNumber"
+            " FROM enrollmenthistory AS h"
+            " JOIN coursedetail AS c ON c.id = h.courseId"
+            " WHERE h.id > %s"
+            " ORDER BY h.id ASC"
+            " LIMIT %s")
+
+        self.cursor.execute(query, (afterId, limit))
+
+        return self.cursor.fetchall()
+    
     def findCourseBySearch(self, searchBody, sizeLimit=50):
         '''
         Find course by search.
@@ -402,13 +505,15 @@ class bckndSql:
         result = self.cursor.fetchall()
 
         # json
-        result = [json.loads(res[0]) for res in result]
+        result = [bckndJson.loads(res[0]) for res in result]
 
         return result
     
-    def findCourseByTime(self, strSet, labelList, calendarId):
+    def findCourseByTime(self, day, sectionRange, labelList, calendarId, week=None):
         '''
-        Find course by time
+        Find course by time, sectionRange is (first section, last section),
+        a course matches if any of its arrangements overlaps the range on that day,
+        and, when week is given, is held in that week
         '''
         query = f"""
         SELECT
@@ -424,30 +529,81 @@ class bckndSql:
         JOIN faculty AS f ON f.faculty = c.faculty
         JOIN campus as ca ON ca.campus = c.campus
         JOIN coursenature as n ON c.courseLabelId = n.courseLabelId
-        JOIN teacher as t ON t.teachingClassid = c.id
         WHERE c.calendarId = %s
-        AND ({' OR '.join(['t.arrangeInfoText LIKE %s' for _ in strSet])})
+        AND c.id IN (
+            -- 走 calendarDaySection_idx 索引
+            SELECT a.teachingClassId
+            FROM arrangement AS a
+            WHERE a.calendarId = %s
+            AND a.occupyDay = %s
+            AND a.startSection <= %s
+            AND a.endSection >= %s
+            {"AND a.weekMask & %s <> 0" if week is not None else ""}
+        )
         AND n.courseLabelId IN ({','.join(['%s' for _ in labelList])})
         GROUP BY c.courseCode, c.courseName, f.facultyI18n, n.courseLabelName, c.credit
         ORDER BY courseCode desc
         """
 
-        print(strSet)
+        firstSection, lastSection = sectionRange
 
-        self.cursor.execute(query, (calendarId, *strSet, *labelList))
+        # 第 week 周有课，即 weekMask 的第 week - 1 位为 1
+        weekParams = (1 << (week - 1),) if week is not None else ()
+
+        self.cursor.execute(query, (calendarId, calendarId, day, lastSection, firstSection, *weekParams, *labelList))
 
         result = self.cursor.fetchall()
 
         # json
-        result = [json.loads(res[0]) for res in result]
+        result = [bckndJson.loads(res[0]) for res in result]
 
         return result
 
+    def findOptionalCourseArrangement(self, labelList, calendarId):
+        '''
+        Find every (course, nature, campus, day, sections, weekMask) of optional courses
+        in a calendar in one pass, used to build the time grid
+        '''
+        query = f"""
+        SELECT DISTINCT
+            c.courseCode,
+            c.courseName,
+            f.facultyI18n,
+            c.credit,
+            n.courseLabelName,
+            ca.campusI18n,
+            a.occupyDay,
+            a.startSection,
+            a.endSection,
+            a.weekMask
+        FROM arrangement AS a
+        JOIN coursedetail AS c ON c.id = a.teachingClassId
+        JOIN faculty AS f ON f.faculty = c.faculty
+        JOIN campus AS ca ON ca.campus = c.campus
+        JOIN coursenature AS n ON n.courseLabelId = c.courseLabelId
+        WHERE a.calendarId = %s
+        AND c.courseLabelId IN ({','.join(['%s' for _ in labelList])})
+        """
+
+        self.cursor.execute(query, (calendarId, *labelList))
+
+        return self.cursor.fetchall()
+
     def getLatestUpdateTime(self):
         '''
-        Get the latest update time
+        Get the latest update time,
+        incremental syncs that changed nothing and crawls still running are skipped
         '''
-        self.cursor.execute(f'SELECT fetchTime FROM fetchlog ORDER BY fetchTime DESC LIMIT 1')
+        query = """
+        SELECT fetchTime
+        FROM fetchlog
+        WHERE fetchTime IS NOT NULL
+        AND (inserted IS NULL OR inserted + updated + retired > 0)
+        ORDER BY fetchTime DESC
+        LIMIT 1
+        """
+
+        self.cursor.execute(query)
 
         result = self.cursor.fetchall()
 
@@ -455,7 +611,7 @@ class bckndSql:
     
     def getAllRooms(self, calendarId):
         '''
-        Get all rooms from teacher arrangeInfoText
+        Get all rooms from teacher arrangeInfoText, i.e. the room of the last line of each text
         '''
         query = """
         SELECT DISTINCT 
@@ -472,20 +628,16 @@ class bckndSql:
         self.cursor.execute(query, (calendarId,))
         result = self.cursor.fetchall()
         
-        # 过滤掉无效教室名称（只包含换行符等）
-        rooms = []
-        for room_tuple in result:
-            room = room_tuple[0].strip()
-            if room and room != '\n':
-                rooms.append(room)
-        
-        return rooms
+        # 过滤掉无效教室名称（只包含换行符等）；去掉换行后可能重复，去重后按码位排序，与内存快照的结果一致
+        rooms = {room_tuple[0].strip() for room_tuple in result}
+
+        return sorted(room for room in rooms if room)
     
     def getCoursesByRoom(self, room, calendarId):
         '''
         Get courses by room name
         '''
-        query = """
+        query = f"""
         SELECT DISTINCT
             JSON_OBJECT(
                 'courseCode', c.courseCode,
@@ -495,7 +647,8 @@ class bckndSql:
                 'credit', c.credit,
                 'campus', ca.campusI18n,
                 'teachers', teachers.teachers,
-                'arrangementInfo', teachers.arrangementInfo
+                'arrangementInfo', teachers.arrangementInfo,
+                'arrangements', arr.arrangements
             )
         FROM coursedetail as c
         JOIN faculty as f ON f.faculty = c.faculty
@@ -509,11 +662,17 @@ class bckndSql:
                         'teacherName', t.teacherName
                     )
                 ) AS teachers,
-                t.arrangeInfoText AS arrangementInfo
+                t.arrangeInfoText AS arrangementInfo,
+                MIN(t.id) AS teacherId
             FROM teacher AS t
             WHERE t.arrangeInfoText LIKE %s
             GROUP BY t.teachingClassid, t.arrangeInfoText
         ) AS teachers ON c.id = teachers.teachingClassid
+        -- 同一分组的排课文本相同，取其中一位教师的解析结果即可
+        LEFT JOIN LATERAL (
+            {ARRANGEMENTS_OF_TEACHER}
+            WHERE a.teacherId = teachers.teacherId
+        ) AS arr ON TRUE
         WHERE c.calendarId = %s
         """
         
@@ -525,19 +684,21 @@ class bckndSql:
         # 解析JSON结果
         courses = []
         for course_json in result:
-            course_data = json.loads(course_json[0])
+            course_data = bckndJson.loads(course_json[0])
             
-            # 解析排课信息
-            arrangement_info = []
-            if course_data['arrangementInfo']:
-                # 处理arrangeInfoText字符串
-                from .bckndTools import arrangementTextToObj, splitEndline
-                for location in splitEndline(course_data['arrangementInfo']):
+            # 优先使用爬取时解析好的排课，旧数据再解析 arrangeInfoText 字符串
+            if course_data['arrangements']:
+                arrangement_info = arrangementRowsToInfo(course_data['arrangements'])
+            else:
+                arrangement_info = []
+                for location in splitArrangeInfo(course_data['arrangementInfo'] or ""):
                     try:
                         arrangement_info.append(arrangementTextToObj(location))
-                    except:
+                    except ValueError:
+                        # 无法解析的排课文本跳过
                         pass
             
+            del course_data['arrangements']
             course_data['arrangementInfo'] = arrangement_info
             courses.append(course_data)
         
@@ -0,0 +1,160 @@
+import threading
+import time
+from . import bckndSql
+
+class Subscription:
+    '''
+    One client of EnrollmentFeed, watching a set of teaching classes of a calendar.
+
+    Changes are coalesced per code until the client takes them, so a slow
+    client only ever holds the latest counts, never a growing backlog.
+    '''
+    def __init__(self, calendarId, codes):
+        self.calendarId = calendarId
+        self.codes = frozenset(codes)
+
+        self._pending = {} # code -> (number, elcNumber)
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+
+    def push(self, code, counts):
+        with self._lock:
+            self._pending[code] = counts
+
+        self._ready.set()
+
+    def take(self, timeout):
+        '''
+        Wait up to timeout seconds for changes, returns {code: (number, elcNumber)}, empty on timeout
+        '''
+        self._ready.wait(timeout)
+
+        with self._lock:
+            changes, self._pending = self._pending, {}
+            self._ready.clear()
+
+        return changes
+
+class EnrollmentFeed:
+    '''
+    Shared source of enrollment changes for every stream subscriber.
+
+    One background thread reads new enrollmenthistory rows (written by
+    crawler/refreshEnrollment.py) every `pollInterval` seconds and hands each
+    change to the subscribers watching that class, so the database sees one
+    query per interval however many clients are connected. The thread starts
+    with the first subscriber and idles while there is none; the first
+    subscriber after an idle period sets the starting point, so only changes
+    after it subscribed are pushed.
+    '''
+    def __init__(self, pollInterval, maxSubscribers):
+        self.pollInterval = pollInterval
+        self.maxSubscribers = maxSubscribers
+
+        self._watchers = {} # (calendarId, code) -> set of Subscription
+        self._count = 0
+        self._cond = threading.Condition()
+        self._thread = None
+
+        self._lastId = None # 已分发的最后一条 enrollmenthistory.id，没有订阅者时重置
+
+    def _latestId(self):
+        with bckndSql.bckndSql() as sql:
+            return sql.getLatestEnrollmentChangeId()
+
+    def subscribe(self, calendarId, codes):
+        '''
+        Start watching codes of a calendar, returns None when there are already maxSubscribers
+        '''
+        subscription = Subscription(calendarId, codes)
+
+        # 空闲时在订阅时就确定起点，而不是等到第一次轮询，两者之间的变化不会丢失
+        latestId = self._latestId() if self._count == 0 else None
+
+        with self._cond:
+            if self._count >= self.maxSubscribers:
+                return None
+
+            if self._count == 0:
+                self._lastId = latestId if latestId is not None else self._latestId()
+
+            for code in subscription.codes:
+                self._watchers.setdefault((calendarId, code), set()).add(subscription)
+
+            self._count += 1
+
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+            self._cond.notify_all()
+
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._cond:
+            for code in subscription.codes:
+                watchers = self._watchers.get((subscription.calendarId, code))
+
+                if watchers is not None:
+                    watchers.discard(subscription)
+
+                    if not watchers:
+                        del self._watchers[(subscription.calendarId, code)]
+
+            self._count -= 1
+
+            if self._count == 0:
+                self._lastId = None
+
+    def stats(self):
+        with self._cond:
+            return {"subscribers": self._count, "watchedCodes": len(self._watchers), "lastId": self._lastId}
+
+    def _poll(self):
+        '''
+        Read and dispatch the changes since the last poll
+        '''
+        with self._cond:
+            lastId = self._lastId
+
+        if lastId is None:
+            return
+
+        with bckndSql.bckndSql() as sql:
+            rows = sql.getEnrollmentChanges(lastId)
+
+        if not rows:
+            return
+
+        # 同一教学班在一次轮询中的多次变化只保留最后一次
+        latest = {(calendarId, code): (number, elcNumber) for _, calendarId, code, number, elcNumber in rows}
+
+        with self._cond:
+            if self._lastId != lastId:
+                # 读取期间所有订阅者都已离开，起点已重置
+                return
+
+            self._lastId = rows[-1][0]
+
+            targets = [
+                (subscription, code, counts)
+                for (calendarId, code), counts in latest.items()
+                for subscription in self._watchers.get((calendarId, code), ())
+            ]
+
+        for subscription, code, counts in targets:
+            subscription.push(code, counts)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._count == 0:
+                    self._cond.wait()
+
+            try:
+                self._poll()
+            except Exception as e:
+                print(f"读取选课人数变化失败：{e}")
+
+            time.sleep(self.pollInterval)
@@ -1,5 +1,10 @@
 # 存放了工具函数
 
+from common.arrangement import MAX_WEEK, maskToWeeks, parseArrangement, splitArrangeInfo, weeksToMask
+
+# 请求中 weekFormat 可选的取值，见 applyWeekFormat
+WEEK_FORMATS = ("list", "mask", "both")
+
 def dayTextToNum(text):
     '''
     输入："星期一"
@@ -34,59 +39,6 @@ def numToDayText(num):
     }
     return day_mapping.get(num, None)
 
-def timeTextToArray(text):
-    '''
-    输入："2-4节"
-    输出：[2, 3, 4]
-    '''
-    # 忽略最后的节字
-    text = text[:-1]
-    
-    # 以 - 分割
-    time = text.split("-")
-    
-    # 转换为数字
-    result = []
-    for i in range(int(time[0]), int(time[1]) + 1):
-        result.append(i)
-
-    return result
-
-def weekTextToArray(text):
-    '''
-    输入："2-4双 5-6 10-12 14 17"
-    输出：[2, 4, 5, 6, 10, 11, 12, 14, 15, 16, 17]
-    '''
-    # 去掉中括号
-    # text = text[1:-1]
-
-    # 以空格分割
-    weeks = text.split(" ")
-
-    # 有这样几种类型
-    # 没有 - 的，直接转换为数字，最简单
-    # 有 -，且没有单/双，遍历区间
-    # 有 -，如果有单/双，遍历区间，步长为 2，不需要判断单双是因为起始值已经保证了
-
-    result = []
-
-    for week in weeks:
-        if "-" not in week:
-            result.append(int(week))
-        elif "单" in week or "双" in week:
-            week = week[:-1]
-            week = week.split("-")
-            for i in range(int(week[0]), int(week[1]) + 1, 2):
-                result.append(i)
-        else:
-            week = week.split("-")
-            for i in range(int(week[0]), int(week[1]) + 1):
-                result.append(i)
-    
-    return result
-
-    
-
 def arrangementTextToObj(text):
     '''
     输入："李华(13060) 星期三7-8节 [2-4双 5-6 10-12 14 17] 北214"
@@ -98,73 +50,180 @@ def arrangementTextToObj(text):
         "occupyRoom": "北214"
         "teacherAndCode": "李华(13060)"
     }
+    相同的文本只解析一次，每次返回新的对象，调用方可以随意修改；无法解析时抛出 ValueError
+    '''
+    arrangementText, occupyDay, startSection, endSection, occupyWeek, occupyRoom, teacherAndCode = parseArrangement(text)
+
+    return {
+        "arrangementText": arrangementText,
+        "occupyDay": occupyDay,
+        "occupyTime": list(range(startSection, endSection + 1)),
+        "occupyWeek": list(occupyWeek),
+        "occupyRoom": occupyRoom,
+        "teacherAndCode": teacherAndCode,
+    }
+
+def arrangementCacheInfo():
+    '''
+    命中率等缓存统计，见 functools.lru_cache
     '''
+    return parseArrangement.cache_info()
 
-    # print(text)
+def applyWeekFormat(courses, weekFormat):
+    '''
+    按请求中的 weekFormat 改写 courses 中每条 arrangementInfo 的周次字段：
+    "list"：只有 occupyWeek 数组（默认，与旧接口相同）
+    "mask"：只有 occupyWeekMask 整数，第 w 周对应第 w - 1 位
+    "both"：两者都有
+    课程和排课对象可能来自内存快照而被多个请求共享，这里总是生成新的课程和排课对象，不修改原对象
+    '''
+    if weekFormat == "list":
+        return courses
 
-    result = {
-        "arrangementText": "星期" + text.split(" 星期", 1)[1],
-        "occupyDay": None,
-        "occupyTime": None,
-        "occupyWeek": None,
-        "occupyRoom": None,
-        "teacherAndCode": text.split(" 星期", 1)[0].strip() # 对复旦的老师，似乎只有工号没有名字，要注意
-    }
+    result = []
+
+    for course in courses:
+        arrangementInfo = []
 
+        for arrangement in course['arrangementInfo']:
+            arrangement = {**arrangement, "occupyWeekMask": weeksToMask(arrangement["occupyWeek"])}
 
-    # 星期几
-    result["occupyDay"] = dayTextToNum("星期" + text.split(" 星期")[1][0])
+            if weekFormat == "mask":
+                del arrangement["occupyWeek"]
 
-    # 节次
-    result["occupyTime"] = timeTextToArray(text.split(" 星期")[1][1:].split(" [")[0])
+            arrangementInfo.append(arrangement)
 
-    # 周次
-    result["occupyWeek"] = weekTextToArray(text.split("[")[1].split("]")[0])
-    
-    # 教室
-    try:
-        result["occupyRoom"] = text.split("] ")[1].strip()
-    except:
-        result["occupyRoom"] = None
+        result.append({**course, 'arrangementInfo': arrangementInfo})
 
     return result
 
-def splitEndline(text):
+def arrangementRowsToInfo(rows):
     '''
-    输入： "关佶红(05222) 星期一3-4节 [1-17] 南129\n关佶红(05222) 星期三3-4节 [1-17单] 北301\n"
-    输出： ["关佶红(05222) 星期一3-4节 [1-17] 南129", "关佶红(05222) 星期三3-4节 [1-17单] 北301"]
+    输入：arrangement 表中一位教师的排课，形如
+    [{"id": 1, "text": "星期三7-8节 [2-4双 5-6 10-12 14 17] 北214", "day": 3, "start": 7, "end": 8,
+      "weekMask": 77370, "room": "北214", "teacher": "李华(13060)"}]
+    输出：与 arrangementTextToObj 相同结构的数组，不需要再解析文本
     '''
-    
-    # print(text.split("\n")[:-1])
+    return [
+        {
+            "arrangementText": row["text"],
+            "occupyDay": row["day"],
+            "occupyTime": list(range(row["start"], row["end"] + 1)),
+            "occupyWeek": maskToWeeks(row["weekMask"]),
+            "occupyRoom": row["room"],
+            "teacherAndCode": row["teacher"],
+        }
+        for row in sorted(rows, key=lambda x: x["id"])
+    ]
+
+def attachArrangementInfo(course):
+    '''
+    生成 course 的 arrangementInfo 并删除 locations 和 arrangements 字段。
+    已经带有 arrangementInfo 的课程（来自内存快照）保持不变；
+    优先使用爬取时解析好的 arrangements，旧数据没有 arrangements，才解析 locations 文本
+    '''
+    if 'arrangementInfo' in course:
+        pass
+    elif course.get('arrangements'):
+        course['arrangementInfo'] = arrangementRowsToInfo(course['arrangements'])
+    else:
+        course['arrangementInfo'] = [arrangementTextToObj(location) for location in splitArrangeInfo(course['locations'])]
+
+    course.pop('locations', None)
+    course.pop('arrangements', None)
+
+    return course
+
+def mergeSameCode(courses):
+    '''
+    按 code 排序，并把 code 相同的课程的 arrangementInfo 合并到第一条中
+    '''
+    courses = sorted(courses, key=lambda x: x['code']) # 先排序
+
+    merged = []
+    current = None
+
+    for course in courses:
+        if not current or current['code'] != course['code']:
+            merged.append(course)
+            current = course
+        else:
+            # 如果arrangementInfo不同，则合并
+            if current['arrangementInfo'] != course['arrangementInfo']:
+                current['arrangementInfo'].extend(course['arrangementInfo'])
 
-    return text.split("\n")[:-1]
+    return merged
 
-def optCourseQueryListGenerator(day, section):
+def optCourseSectionRange(section):
     '''
     输入：1
-    输出："1-2"
-    由于学校新作息删除了 12 节，且第 9 节开始排课，这段代码为了向后兼容前 4 年的数据，现在如此编写。未来可以想想更好的分组方式。
-    现在的不足在于，对新学期的数据点击第 10 节和第 11 节，本来应该显示的课程不会显示。
-    现在的迂回方式是，点击第 9 节可以获得完整的选修课数据，因为没有选修课从第 10 节开始。
-    '''
-    if section in [1, 2, 3, 4]:
-        return ["%" + numToDayText(day) + str(2 * section - 1) + "-" + str(2 * section) + "%"]
-    elif section == 5:
-        return [f"%{numToDayText(day)}9-%"]
-    elif section == 6:
-        return [f"%{numToDayText(day)}10-11%", f"%{numToDayText(day)}10-12%"]
-    else:
-        return None
+    输出：(1, 2)
+    前端时间表把节次分成 6 组，返回这一组的第一节和最后一节。
+    学校新作息删除了 12 节，且第 9 节开始排课，第 5 组只有第 9 节，第 6 组是 10-12 节；
+    查询时按区间相交判断，所以 9-11 节这样跨组的课程在两组中都会出现。
+    '''
+    sectionMapping = {
+        1: (1, 2),
+        2: (3, 4),
+        3: (5, 6),
+        4: (7, 8),
+        5: (9, 9),
+        6: (10, 12),
+    }
+    return sectionMapping.get(section, None)
+
+
+def optCourseTimeGrid(rows, sectionCount=6):
+    '''
+    输入：findOptionalCourseArrangement 的结果，每行是
+    (courseCode, courseName, faculty, credit, courseLabelName, campus, day, startSection, endSection, weekMask)
+    输出：7 * sectionCount 的二维数组，grid[day - 1][section - 1] 与 findCourseByTime(day, section) 的结果相同
+    '''
+    # 先按格子聚合，key 与 findCourseByTime 的 GROUP BY 一致
+    cells = [[{} for _ in range(sectionCount)] for _ in range(7)]
+
+    for courseCode, courseName, faculty, credit, labelName, campus, day, startSection, endSection, _ in rows:
+        if day is None or not 1 <= day <= 7:
+            continue
+
+        for section in range(1, sectionCount + 1):
+            first, last = optCourseSectionRange(section)
+
+            if startSection > last or endSection < first:
+                continue
+
+            key = (courseCode, courseName, faculty, labelName, credit)
+            cells[day - 1][section - 1].setdefault(key, set()).add(campus)
+
+    grid = []
+
+    for day in cells:
+        gridRow = []
+
+        for cell in day:
+            courses = [
+                {
+                    "courseCode": courseCode,
+                    "courseName": courseName,
+                    "faculty": faculty,
+                    "credit": credit,
+                    "courseNature": [labelName],
+                    "campus": sorted(campus),
+                }
+                for (courseCode, courseName, faculty, labelName, credit), campus in cell.items()
+            ]
+            courses.sort(key=lambda x: x["courseCode"], reverse=True)
+            gridRow.append(courses)
+
+        grid.append(gridRow)
+
+    return grid
 
 
 # debug
 
 if __name__ == "__main__":
-    # print(dayTextToNum("星期一"))
-    # print(timeTextToArray(debugText))
-    # print(weekTextToArray(debugText))
-    # while True:
     debugText =  "关佶红(05222) 星期一3-4节 [1-17] 南129\n关佶红(05222) 星期三3-4节 [1-17单] 北301\n"
-    print(splitEndline(debugText))
-    for de in splitEndline(debugText):
+    print(splitArrangeInfo(debugText))
+    for de in splitArrangeInfo(debugText):
         print(arrangementTextToObj(de))
@@ -0,0 +1,42 @@
+import threading
+import time
+from . import bckndSql
+
+class CrawlVersion:
+    '''
+    The latest crawl time in fetchlog, which versions every piece of data the backend serves.
+
+    It is read from MySQL at most once per `checkInterval` seconds, so callers
+    can ask for it on every request.
+    '''
+    def __init__(self, checkInterval):
+        self.checkInterval = checkInterval
+
+        self._version = None
+        self._lastCheck = None
+        self._lock = threading.Lock()
+
+    def _isFresh(self):
+        return self._lastCheck is not None and time.monotonic() - self._lastCheck < self.checkInterval
+
+    def get(self):
+        '''
+        Get the latest crawl time
+        '''
+        if self._isFresh():
+            return self._version
+
+        with self._lock:
+            if not self._isFresh():
+                with bckndSql.bckndSql() as sql:
+                    self._version = sql.getLatestUpdateTime()
+                self._lastCheck = time.monotonic()
+
+        return self._version
+
+    def invalidate(self):
+        '''
+        Force the next get() to read fetchlog again
+        '''
+        with self._lock:
+            self._lastCheck = None
@@ -0,0 +1,141 @@
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+class CacheWarmer:
+    '''
+    Fill the response cache in the background whenever the data version changes,
+    i.e. at startup and after every crawl, so the first users of a new semester
+    do not pay for the cold queries.
+
+    plan(sql) reads the cheap lists (caching them as a side effect) and returns
+    (calendarId, [(description, task)]), each task(sql) runs one heavy query.
+    Every task gets its own session from `session`, so a warm-up holds at most
+    one pooled connection at a time.
+    '''
+    def __init__(self, version, session, plan, checkInterval, maxTracked=1000):
+        self.version = version # 返回当前数据版本的函数
+        self.session = session
+        self.plan = plan
+        self.checkInterval = checkInterval
+        self.maxTracked = maxTracked
+
+        self._popular = Counter() # 请求次数，用于选出最热门的查询
+        self._lock = threading.Lock()
+        self._thread = None
+
+        self._warmedVersion = None
+        self._status = {
+            "state": "pending", # pending / running / done / failed
+            "version": None,
+            "calendarId": None,
+            "done": 0,
+            "total": None,
+            "errors": 0,
+            "startedAt": None,
+            "finishedAt": None,
+            "seconds": None,
+            "lastError": None,
+        }
+
+    def record(self, key):
+        '''
+        Count a request, e.g. (grade, code) of findCourseByMajor, see hottest
+        '''
+        with self._lock:
+            self._popular[key] += 1
+
+            # 只保留最热门的一部分，避免无限增长
+            if len(self._popular) > 2 * self.maxTracked:
+                self._popular = Counter(dict(self._popular.most_common(self.maxTracked)))
+
+    def hottest(self, n):
+        with self._lock:
+            return [key for key, _ in self._popular.most_common(n)]
+
+    def start(self):
+        '''
+        Start the background thread, does nothing when it is already running
+        '''
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def status(self):
+        with self._lock:
+            return dict(self._status)
+
+    def isReady(self):
+        '''
+        Whether a warm-up has finished at least once. A new data version being
+        warmed later does not make it unready again, the old entries still serve, see isStale
+        '''
+        with self._lock:
+            return self._warmedVersion is not None
+
+    def isStale(self, version):
+        '''
+        Whether a finished warm-up is for an older data version than `version`,
+        i.e. the new version is waiting for or in the middle of its warm-up
+        '''
+        with self._lock:
+            return self._warmedVersion is not None and version is not None and version != self._warmedVersion
+
+    def _update(self, **fields):
+        with self._lock:
+            self._status.update(fields)
+
+    def warm(self, version):
+        '''
+        Run one warm-up for a data version
+        '''
+        start = time.monotonic()
+
+        self._update(
+            state="running", version=str(version), calendarId=None, done=0, total=None, errors=0,
+            startedAt=datetime.now().isoformat(timespec='seconds'), finishedAt=None, seconds=None, lastError=None
+        )
+
+        try:
+            with self.session() as sql:
+                calendarId, tasks = self.plan(sql)
+        except Exception as e:
+            self._update(state="failed", lastError=str(e), finishedAt=datetime.now().isoformat(timespec='seconds'))
+            raise
+
+        self._update(calendarId=calendarId, total=len(tasks))
+
+        for description, task in tasks:
+            try:
+                with self.session() as sql:
+                    task(sql)
+            except Exception as e:
+                with self._lock:
+                    self._status["errors"] += 1
+                    self._status["lastError"] = f"{description}: {e}"
+
+            with self._lock:
+                self._status["done"] += 1
+
+        with self._lock:
+            self._warmedVersion = version
+            self._status.update(
+                state="done", finishedAt=datetime.now().isoformat(timespec='seconds'),
+                seconds=round(time.monotonic() - start, 1)
+            )
+
+        print(f"缓存预热完成：学期 {calendarId}，{len(tasks)} 个查询，用时 {time.monotonic() - start:.1f}s")
+
+    def _run(self):
+        while True:
+            try:
+                version = self.version()
+
+                if version is not None and version != self._warmedVersion:
+                    self.warm(version)
+            except Exception as e:
+                print(f"缓存预热失败：{e}")
+
+            time.sleep(self.checkInterval)
@@ -0,0 +1,176 @@
+# 排课文本的解析和周次位掩码，crawler 入库和 backend 查询共用，两边的结果保持一致
+
+import functools
+import re
+
+DAY_MAPPING = {"一": 1, "二": 2, "三": 3, "四": 4, "五": 5, "六": 6, "日": 7, "天": 7}
+
+# 形如：李华(13060) 星期三7-8节 [2-4双 5-6 10-12 14 17] 北214，从"星期"开始匹配，前面的部分是教师，可以为空
+ARRANGEMENT_PATTERN = re.compile(r"星期([一二三四五六日天])\s*(\d+)(?:-(\d+))?节\s*\[([^\]]*)\]\s*(.*)")
+
+# 形如：2-4双、5-6、14，只在周次格式不规范时使用
+WEEK_PATTERN = re.compile(r"(\d+)(?:-(\d+))?([单双])?")
+
+# 周次的上限。前端用 32 位整数做位运算，第 32 周会变成负数，更大的周次会回绕，
+# 所以整个系统只保留 1 到 31 周，超出的周次在解析时丢弃
+MAX_WEEK = 31
+
+# 解析结果缓存的条目数，同一学期不同的排课文本大约在这个量级
+ARRANGEMENT_CACHE_SIZE = 16384
+
+def splitArrangeInfo(arrangeInfo):
+    '''
+    输入："张三(01234) \n星期五5-8节 [6-7] 博楼B202\n张三(01234) 星期一1-2节 [1-17] 南129"
+    输出：["张三(01234) 星期五5-8节 [6-7] 博楼B202", "张三(01234) 星期一1-2节 [1-17] 南129"]
+    1 系统偶尔会在教师和星期之间插入换行，这里把断开的行重新拼起来
+    '''
+    result = []
+    pending = ""
+
+    for line in arrangeInfo.split("\n"):
+        line = line.strip()
+
+        if not line:
+            continue
+
+        if "星期" not in line:
+            # 只有教师，没有时间，等待下一行
+            pending += line + " "
+            continue
+
+        if pending and not line.startswith("星期"):
+            # 上一行是孤立的教师，但这一行自带教师，丢弃孤立的部分
+            pending = ""
+
+        result.append(pending + line)
+        pending = ""
+
+    return result
+
+def parseWeeks(text):
+    '''
+    输入："2-4双 5-6 10-12 14 17"
+    输出：(2, 4, 5, 6, 10, 11, 12, 14, 17)
+    不在 1 到 MAX_WEEK 之间的周次被丢弃
+    '''
+    weeks = []
+
+    try:
+        for week in text.split():
+            if "-" not in week:
+                weeks.append(int(week))
+                continue
+
+            # 有单/双时步长为 2，起始值已经保证了单双
+            step = 1
+            if week[-1] in "单双":
+                week = week[:-1]
+                step = 2
+
+            start, end = week.split("-")
+            weeks.extend(range(int(start), int(end) + 1, step))
+    except ValueError:
+        # 格式不规范（如带"周"字），退回到逐个匹配
+        weeks = []
+        for start, end, oddEven in WEEK_PATTERN.findall(text):
+            start = int(start)
+            weeks.extend(range(start, (int(end) if end else start) + 1, 2 if oddEven else 1))
+
+    return tuple(week for week in weeks if 1 <= week <= MAX_WEEK)
+
+def weeksToMask(weeks):
+    '''
+    输入：[1, 2, 4]
+    输出：0b1011
+    第 w 周对应第 w - 1 位，不在 1 到 MAX_WEEK 之间的周次被忽略
+    '''
+    mask = 0
+
+    for week in weeks:
+        if 1 <= week <= MAX_WEEK:
+            mask |= 1 << (week - 1)
+
+    return mask
+
+def maskToWeeks(mask):
+    '''
+    输入：0b1011
+    输出：[1, 2, 4]
+    与 weeksToMask 互逆
+    '''
+    weeks = []
+    week = 1
+
+    while mask:
+        if mask & 1:
+            weeks.append(week)
+        mask >>= 1
+        week += 1
+
+    return weeks
+
+def weekTextToMask(text):
+    '''
+    输入："2-4双 5-6 10-12 14 17"
+    输出：第 w 周对应第 w - 1 位的位掩码
+    '''
+    return weeksToMask(parseWeeks(text))
+
+@functools.lru_cache(maxsize=ARRANGEMENT_CACHE_SIZE)
+def parseArrangement(text):
+    '''
+    输入："李华(13060) 星期三7-8节 [2-4双 5-6 10-12 14 17] 北214"
+    输出：("星期三7-8节 [2-4双 5-6 10-12 14 17] 北214", 3, 7, 8, (2, 4, 5, 6, 10, 11, 12, 14, 17), "北214", "李华(13060)")
+    即 (arrangementText, occupyDay, startSection, endSection, weeks, room, teacherAndCode)，
+    没有教室时 room 为 None。用一个预编译的正则一次读完整行，结果是不可变的元组，可以安全地缓存；
+    无法解析时抛出 ValueError
+    '''
+    text = text.strip()
+    match = ARRANGEMENT_PATTERN.search(text)
+
+    if match is None:
+        raise ValueError(f"无法解析的排课信息：{text}")
+
+    day, start, end, weekText, room = match.groups()
+
+    start = int(start)
+    end = int(end) if end else start
+
+    return (
+        text[match.start():], # 从"星期"开始的原文
+        DAY_MAPPING[day],
+        start,
+        end,
+        parseWeeks(weekText),
+        room.strip() or None,
+        text[:match.start()].strip(), # 对复旦的老师，似乎只有工号没有名字，要注意
+    )
+
+def parseArrangeLine(line):
+    '''
+    输入："李华(13060) 星期三7-8节 [2-4双 5-6 10-12 14 17] 北214"
+    输出：{
+        "teacherAndCode": "李华(13060)",
+        "occupyDay": 3,
+        "startSection": 7,
+        "endSection": 8,
+        "weekMask": 0b10010111000111010,
+        "occupyRoom": "北214",
+        "arrangementText": "星期三7-8节 [2-4双 5-6 10-12 14 17] 北214"
+    }
+    即 arrangement 表的一行，无法解析时返回 None
+    '''
+    try:
+        arrangementText, occupyDay, startSection, endSection, weeks, room, teacherAndCode = parseArrangement(line)
+    except ValueError:
+        return None
+
+    return {
+        "teacherAndCode": teacherAndCode,
+        "occupyDay": occupyDay,
+        "startSection": startSection,
+        "endSection": endSection,
+        "weekMask": weeksToMask(weeks),
+        "occupyRoom": room,
+        "arrangementText": arrangementText,
+    }
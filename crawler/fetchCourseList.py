@@ -1,97 +1,152 @@
 from utils import loginout
+from utils import tjArchive
+from utils import tjFetch
+from utils import tjPipeline
 from utils import tjSql
+import argparse
+import contextlib
+import threading
 import time
 
-def fetchCourseList(session):
+def fetchCourseList(session, calendarIds, pageSize=tjFetch.FETCH_PAGE_SIZE):
     '''
-    Fetch course list from url, receive the authenticated session as parameter
+    Fetch course list from url, receive the authenticated session as parameter.
+    Calendars are fetched one after another, waiting for input between pages
     '''
 
-    # 在这里指定每页的大小和要爬的学期
-    PAGESIZE = 100
-    CALENDAR = 120
-
-    # prepare payload
-    payload = {
-        "condition":
-        {
-            "trainingLevel":"",
-            "campus":"",
-            "calendar":CALENDAR,
-            "college":"",
-            "course":"",
-            "ids":[],
-            "isChineseTeaching": None,
-        },
-        "pageNum_":1,
-        "pageSize_":PAGESIZE
-    }
-
-    # Mock a browser
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/133.0.0.0 Safari/537.36",
-        "Referer": "https://1.tongji.edu.cn/taskResultQuery"
-    }
-
-    # fetch course list
-    response = session.post("https://1.tongji.edu.cn/api/arrangementservice/manualArrange/page?profile", headers=headers, json=payload)
-
-    # Recursively fetch all courses
-    total = response.json()['data']['total_']
-
     # Debug
     isWait = True
 
-    for i in range(1, total // PAGESIZE + 1 + 1): # floor division
-        # Prepare payload
-        payload['pageNum_'] = i
+    # 同一个连接写入所有页面，已知的维度表主键和专业 id 在页面之间复用
+    with tjSql.tjSql() as sql:
+        for calendarId in calendarIds:
+            # prepare payload
+            payload = tjFetch.pagePayload(calendarId, 1, pageSize)
+
+            # fetch course list
+            response = session.post(tjFetch.PAGE_URL, headers=tjFetch.HEADERS, json=payload)
+
+            # Recursively fetch all courses
+            total = response.json()['data']['total_']
+            pageTotal = tjFetch.pageCount(total, pageSize)
 
-        # Fetch
-        response = session.post("https://1.tongji.edu.cn/api/arrangementservice/manualArrange/page?profile", headers=headers, json=payload)
+            for i in range(1, pageTotal + 1):
+                # Prepare payload
+                payload['pageNum_'] = i
 
-        # Insert into database
-        with tjSql.tjSql() as sql:
-            sql.insertCourseList(response.json()['data']['list'])
+                # Fetch
+                response = session.post(tjFetch.PAGE_URL, headers=tjFetch.HEADERS, json=payload)
 
-        print("\n\n\n=====================================")
-        print("第", i, "页，共", total // PAGESIZE + 1, "页")
-        print("=====================================\n\n\n")
+                # Insert into database, one transaction per page
+                sql.insertCourseList(response.json()['data']['list'])
 
-        # Debug
-        if isWait:
-            print("Press Enter to continue, input NOBREAK to disable waiting")
+                print("\n\n\n=====================================")
+                print("学期", calendarId, "第", i, "页，共", pageTotal, "页")
+                print("=====================================\n\n\n")
 
-            if input() == "NOBREAK":
-                isWait = False
+                # Debug
+                if isWait:
+                    print("Press Enter to continue, input NOBREAK to disable waiting")
 
-        else:
-            time.sleep(3)
+                    if input() == "NOBREAK":
+                        isWait = False
+
+                else:
+                    time.sleep(3)
 
     print("Course list fetched successfully")
 
-    loginout.logout(session)
-    
+    loginout.releaseSession(session)
 
-if __name__ == "__main__":
-    # Login
-    session = loginout.login()
+def fetchCourseListConcurrent(session, calendarIds, pageSize=tjFetch.FETCH_PAGE_SIZE, workers=tjFetch.FETCH_WORKERS, rate=tjFetch.FETCH_RATE, incremental=False, resume=False):
+    '''
+    Fetch course list of several calendars at once without waiting for input.
+    All calendars share the session, one rate limiter of at most `rate`
+    requests per second and `workers` request slots, so no more than `workers`
+    requests are in flight in total however many calendars there are; pages are
+    written through one shared connection as they arrive.
+    When incremental, only changed courses are written, and after a complete run
+    the courses no longer returned by 1 系统 are retired.
+    Every calendar gets its own fetchlog row with counts, pages and timing, and
+    its raw pages are archived for replayArchive.py unless [Archive] enabled = false.
+    When resume, an unfinished crawl of a calendar continues from its first uncommitted page
+    '''
+    limiter = tjFetch.RateLimiter(rate)
+    # 所有学期共用的请求名额，每个学期的线程池都可以用满，先抓完的学期把名额让给其他学期
+    slots = threading.BoundedSemaphore(workers)
+    start = time.monotonic()
 
-    if (session is None):
-        exit(-1)
+    with tjSql.tjSql() as sql, contextlib.ExitStack() as archives:
+        resumed = {}
+        sources = {}
+
+        for calendarId in calendarIds:
+            if resume:
+                crawl = sql.resumeCrawl(calendarId)
+
+                if crawl is None:
+                    print("学期", calendarId, "没有未完成的爬取，从头开始")
+                else:
+                    resumed[calendarId] = crawl
+                    print("学期", calendarId, "从断点继续，已提交", len(crawl[2]), "页")
+
+            skip = resumed[calendarId][2] if calendarId in resumed else ()
+            pages = tjFetch.fetchPages(session, calendarId, pageSize, limiter, workers, skip, slots)
 
-    # import json
-    # 测试环境，记录 cookies
-    # with open("cookies.json", "w") as f:
-        # json.dump(session.cookies.get_dict(), f)
+            if tjArchive.ARCHIVE_ENABLED:
+                archive = archives.enter_context(tjArchive.PageArchive(calendarId))
+                print("学期", calendarId, "原始页面存档到", archive.path)
 
-    # read cookies
-    # with open("cookies.json", "r") as f:
-        # cookies = json.load(f)
+                pages = archive.tee(pages)
 
-    # import requests
+            sources[calendarId] = pages
 
-    # session = requests.Session()
-    # session.cookies.update(cookies)
+        pipeline = tjPipeline.IngestPipeline(sql)
+
+        try:
+            pipeline.run(sources, incremental, resumed)
+        finally:
+            print("\n=====================================")
+
+            for run in pipeline.runs.values():
+                print(run.summary())
+
+            print("=====================================")
+
+    print("Course list fetched successfully in", round(time.monotonic() - start, 1), "s")
+
+    loginout.releaseSession(session)
+
+
+if __name__ == "__main__":
+    # Usage: python fetchCourseList.py [118-120 122 ...] [--concurrent | --incremental] [--resume] [--page-size 100] [--workers 4] [--rate 2] [--fresh-login]
+    parser = argparse.ArgumentParser(description="Fetch course list of the given calendars into database")
+    parser.add_argument("calendars", nargs="*", default=[tjFetch.FETCH_CALENDARS], help="calendar ids or ranges like 118-120, default [Fetch] calendars")
+    parser.add_argument("--page-size", type=int, default=tjFetch.FETCH_PAGE_SIZE, help="courses per page")
+    parser.add_argument("--concurrent", action="store_true", help="fetch pages concurrently without waiting for input")
+    parser.add_argument("--incremental", action="store_true", help="like --concurrent, but only write changed courses and retire removed ones")
+    parser.add_argument("--resume", action="store_true", help="continue an unfinished crawl from its first uncommitted page")
+    parser.add_argument("--workers", type=int, default=tjFetch.FETCH_WORKERS, help="number of concurrent requests")
+    parser.add_argument("--rate", type=float, default=tjFetch.FETCH_RATE, help="max requests per second")
+    parser.add_argument("--fresh-login", action="store_true", help="login again even if the saved session is still valid")
+    args = parser.parse_args()
+
+    try:
+        calendarIds = tjFetch.parseCalendars(args.calendars)
+    except ValueError as e:
+        parser.error(f"invalid calendar: {e}")
+
+    if not calendarIds:
+        parser.error("no calendar to fetch")
+
+    # Login, reusing the session saved by the last run if it is still valid
+    session = loginout.cachedLogin(args.fresh_login)
+
+    if (session is None):
+        exit(-1)
 
     # Fetch course list
-    fetchCourseList(session)
\ No newline at end of file
+    if args.concurrent or args.incremental or args.resume:
+        fetchCourseListConcurrent(session, calendarIds, args.page_size, args.workers, args.rate, args.incremental, args.resume)
+    else:
+        fetchCourseList(session, calendarIds, args.page_size)
\ No newline at end of file
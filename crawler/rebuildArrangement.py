@@ -0,0 +1,21 @@
+from utils import tjSql
+import sys
+
+def rebuildArrangement(calendarIds):
+    '''
+    Rebuild arrangement table from teacher.arrangeInfoText for the given calendars,
+    no need to login
+    '''
+    with tjSql.tjSql() as sql:
+        for calendarId in calendarIds:
+            count = sql.rebuildArrangements(calendarId)
+
+            print("学期", calendarId, "共处理", count, "条教师排课")
+
+if __name__ == "__main__":
+    # Usage: python rebuildArrangement.py 119 120
+    if len(sys.argv) < 2:
+        print("Usage: python rebuildArrangement.py <calendarId> [calendarId ...]")
+        exit(-1)
+
+    rebuildArrangement([int(calendarId) for calendarId in sys.argv[1:]])
@@ -0,0 +1,71 @@
+from utils import loginout
+from utils import tjFetch
+from utils import tjPipeline
+from utils import tjSql
+from utils.tjParse import enrollmentRow
+import argparse
+import time
+
+def refreshEnrollment(session, calendarIds, pageSize=tjFetch.FETCH_PAGE_SIZE, workers=tjFetch.FETCH_WORKERS, rate=tjFetch.FETCH_RATE, batchSize=tjPipeline.PIPELINE_BATCH):
+    '''
+    Re-pull the course list of the given calendars and update only the capacity
+    and enrolled count (number, elcNumber) of known courses, see tjSql.refreshEnrollment.
+    Nothing else is parsed or written, so it is cheap enough to run every few minutes
+    during course selection. Returns {calendarId: counts}
+    '''
+    limiter = tjFetch.RateLimiter(rate)
+    result = {}
+
+    with tjSql.tjSql() as sql:
+        for calendarId in calendarIds:
+            start = time.monotonic()
+            counts = dict.fromkeys(tjSql.ENROLLMENT_COUNTS, 0)
+            rows = []
+
+            def flush():
+                for key, count in sql.refreshEnrollment(rows).items():
+                    counts[key] += count
+
+                rows.clear()
+
+            for pageNum, pageTotal, data in tjFetch.fetchPages(session, calendarId, pageSize, limiter, workers):
+                rows.extend(enrollmentRow(course) for course in data['list'])
+
+                if len(rows) >= batchSize:
+                    flush()
+
+            flush()
+
+            result[calendarId] = counts
+            print("学期", calendarId, "选课人数刷新完成：", counts, "用时", round(time.monotonic() - start, 1), "s")
+
+    return result
+
+
+if __name__ == "__main__":
+    # Usage: python refreshEnrollment.py [120 ...] [--page-size 100] [--workers 4] [--rate 2] [--fresh-login]
+    parser = argparse.ArgumentParser(description="Refresh number and elcNumber of the given calendars")
+    parser.add_argument("calendars", nargs="*", default=[tjFetch.FETCH_CALENDARS], help="calendar ids or ranges like 118-120, default [Fetch] calendars")
+    parser.add_argument("--page-size", type=int, default=tjFetch.FETCH_PAGE_SIZE, help="courses per page")
+    parser.add_argument("--workers", type=int, default=tjFetch.FETCH_WORKERS, help="number of concurrent requests")
+    parser.add_argument("--rate", type=float, default=tjFetch.FETCH_RATE, help="max requests per second")
+    parser.add_argument("--fresh-login", action="store_true", help="login again even if the saved session is still valid")
+    args = parser.parse_args()
+
+    try:
+        calendarIds = tjFetch.parseCalendars(args.calendars)
+    except ValueError as e:
+        parser.error(f"invalid calendar: {e}")
+
+    if not calendarIds:
+        parser.error("no calendar to refresh")
+
+    session = loginout.cachedLogin(args.fresh_login)
+
+    if (session is None):
+        exit(-1)
+
+    try:
+        refreshEnrollment(session, calendarIds, args.page_size, args.workers, args.rate)
+    finally:
+        loginout.releaseSession(session)
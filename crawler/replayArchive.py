@@ -0,0 +1,84 @@
+from utils import tjArchive
+from utils import tjFetch
+from utils import tjPipeline
+from utils import tjSql
+import argparse
+import time
+
+def archivePages(path):
+    '''
+    (calendarId, pages) of an archive written by fetchCourseList.py,
+    pages yields (pageNum, pageTotal, data) as the fetcher does
+    '''
+    records = tjArchive.readArchive(path)
+    first = next(records, None)
+
+    if first is None:
+        return None, iter(())
+
+    def pages():
+        for record in [first, *records]:
+            yield record['pageNum'], record['pageTotal'], record['data']
+
+    return first['calendarId'], pages()
+
+def replayArchive(paths, incremental=False, workers=tjPipeline.PIPELINE_WORKERS):
+    '''
+    Feed archives written by fetchCourseList.py through the same ingestion path,
+    no need to login or reach 1 系统. Archives of different calendars are
+    parsed in parallel by `workers` processes and written by one connection
+    '''
+    sources = {}
+
+    for path in paths:
+        calendarId, pages = archivePages(path)
+
+        if calendarId is None:
+            print("存档为空：", path)
+            continue
+
+        if calendarId in sources:
+            raise ValueError(f"学期 {calendarId} 有多个存档，一次只能重放其中一个")
+
+        sources[calendarId] = pages
+
+    if not sources:
+        return
+
+    start = time.monotonic()
+
+    # 每个学期的计数和用时由 IngestPipeline 在该学期结束时输出
+    with tjSql.tjSql() as sql:
+        tjPipeline.IngestPipeline(sql, workers).run(sources, incremental)
+
+    print("重放完成，用时", round(time.monotonic() - start, 1), "s")
+
+if __name__ == "__main__":
+    # Usage: python replayArchive.py archive/120/20250101-120000.jsonl.gz [...] [--incremental]
+    #        python replayArchive.py --latest 118-120 [--incremental] [--workers 4]
+    parser = argparse.ArgumentParser(description="Replay archived pages into database")
+    parser.add_argument("paths", nargs="*", help="archive files written by fetchCourseList.py")
+    parser.add_argument("--latest", nargs="+", metavar="CALENDAR", help="replay the latest archive of each calendar, ids or ranges like 118-120")
+    parser.add_argument("--incremental", action="store_true", help="only write changed courses, and retire removed ones when the archive holds every page")
+    parser.add_argument("--workers", type=int, default=tjPipeline.PIPELINE_WORKERS, help="parser processes, 0 to parse in the writer")
+    args = parser.parse_args()
+
+    paths = list(args.paths)
+
+    try:
+        latest = tjFetch.parseCalendars(args.latest or [])
+    except ValueError as e:
+        parser.error(f"invalid calendar: {e}")
+
+    for calendarId in latest:
+        path = tjArchive.latestArchive(calendarId)
+
+        if path is None:
+            parser.error(f"no archive of calendar {calendarId}")
+
+        paths.append(path)
+
+    if not paths:
+        parser.error("no archive to replay")
+
+    replayArchive(paths, args.incremental, args.workers)
@@ -0,0 +1,28 @@
+# 模块在导入时读取当前目录下的 config.ini，测试在临时目录中提供一份不连接任何服务的配置
+
+import os
+import sys
+import tempfile
+
+CRAWLER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROOT_DIR = os.path.dirname(CRAWLER_DIR) # common 包所在的目录
+
+CONFIG = '''[Sql]
+host = 127.0.0.1
+port = 3306
+database = tjcs
+charset = utf8mb4
+w_user = test
+w_password = test
+
+[Archive]
+enabled = false
+'''
+
+CONFIG_DIR = tempfile.mkdtemp(prefix="tjcs-crawler-")
+
+with open(os.path.join(CONFIG_DIR, 'config.ini'), 'w', encoding='utf-8') as f:
+    f.write(CONFIG)
+
+os.chdir(CONFIG_DIR)
+sys.path[:0] = [CRAWLER_DIR, ROOT_DIR]
@@ -0,0 +1,52 @@
+from common.arrangement import MAX_WEEK, maskToWeeks, parseArrangeLine, splitArrangeInfo, weekTextToMask, weeksToMask
+
+def test_parseArrangeLine():
+    row = parseArrangeLine("李华(13060) 星期三7-8节 [2-4双 5-6 10-12 14 17] 北214")
+
+    assert row == {
+        "teacherAndCode": "李华(13060)",
+        "occupyDay": 3,
+        "startSection": 7,
+        "endSection": 8,
+        "weekMask": 0b10010111000111010,
+        "occupyRoom": "北214",
+        "arrangementText": "星期三7-8节 [2-4双 5-6 10-12 14 17] 北214",
+    }
+
+def test_parseArrangeLineWithoutTeacherOrRoom():
+    row = parseArrangeLine("星期日3节 [1-17单] ")
+
+    assert row["teacherAndCode"] == ""
+    assert (row["occupyDay"], row["startSection"], row["endSection"]) == (7, 3, 3)
+    assert row["occupyRoom"] is None
+    assert maskToWeeks(row["weekMask"]) == list(range(1, 18, 2))
+
+def test_parseArrangeLineInvalid():
+    assert parseArrangeLine("李华(13060) 待定") is None
+
+def test_weekTextToMask():
+    assert weekTextToMask("1-3") == 0b111
+    assert weekTextToMask("2-8双") == 0b10101010
+    assert weekTextToMask("1 3 5-6") == 0b110101
+    assert weekTextToMask("") == 0
+
+def test_weekTextToMaskIrregular():
+    # 带"周"字等不规范写法退回到逐个匹配
+    assert weekTextToMask("1-4周 6周") == weeksToMask([1, 2, 3, 4, 6])
+
+def test_weeksAboveMaxWeekAreDropped():
+    # 前端用 32 位整数做位运算，周次只保留 1 到 MAX_WEEK
+    assert MAX_WEEK == 31
+    assert weekTextToMask("30-34") == weeksToMask([30, 31])
+    assert weeksToMask([0, 31, 32, 64]) == 1 << 30
+    assert maskToWeeks(weekTextToMask("1 31 32 64")) == [1, 31]
+
+def test_maskRoundTrip():
+    weeks = [1, 2, 5, 9, 16, 17]
+
+    assert maskToWeeks(weeksToMask(weeks)) == weeks
+
+def test_splitArrangeInfo():
+    text = "张三(01234) \n星期五5-8节 [6-7] 博楼B202\n张三(01234) 星期一1-2节 [1-17] 南129\n"
+
+    assert splitArrangeInfo(text) == ["张三(01234) 星期五5-8节 [6-7] 博楼B202", "张三(01234) 星期一1-2节 [1-17] 南129"]
@@ -0,0 +1,162 @@
+import email.message
+import imaplib
+import socket
+import threading
+import time
+import pytest
+from utils import imap_email
+
+def verificationMail(code):
+    msg = email.message.EmailMessage()
+    msg["Subject"] = "加强认证验证码通知"
+    msg.set_content(f"您的验证码：{code}，5 分钟内有效")
+
+    return msg.as_bytes()
+
+class FakeImapServer:
+    '''
+    A one-connection-at-a-time IMAP server on localhost, just enough for EmailVerifier.
+    idle is "push" (new mail during IDLE after pushDelay seconds), "silent" or "reject";
+    mail arrives after the `mailAfter`-th SEARCH when idle is not "push"
+    '''
+    def __init__(self, idle="push", pushDelay=0.1, mailAfter=None):
+        self.idle = idle
+        self.pushDelay = pushDelay
+        self.mailAfter = mailAfter
+        self.mail = []
+        self.commands = []
+        self.searches = 0
+
+        self.listener = socket.create_server(("127.0.0.1", 0))
+        self.port = self.listener.getsockname()[1]
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+        self.thread.start()
+
+    def serve(self):
+        while True:
+            try:
+                conn, _ = self.listener.accept()
+            except OSError:
+                return
+
+            with conn, conn.makefile("rb") as reader:
+                try:
+                    self.session(conn, reader)
+                except OSError:
+                    pass
+
+    def session(self, conn, reader):
+        conn.sendall(b"* OK [CAPABILITY IMAP4rev1 IDLE] fake ready\r\n")
+
+        for line in reader:
+            tag, command = line.split(b" ", 2)[:2]
+            command = command.strip().upper().decode()
+            self.commands.append(command)
+
+            if command == "CAPABILITY":
+                conn.sendall(b"* CAPABILITY IMAP4rev1 IDLE\r\n" + tag + b" OK completed\r\n")
+            elif command in ("LOGIN", "NOOP"):
+                conn.sendall(tag + b" OK completed\r\n")
+            elif command == "SELECT":
+                conn.sendall(f"* {len(self.mail)} EXISTS\r\n".encode() + tag + b" OK [READ-WRITE]\r\n")
+            elif command == "SEARCH":
+                self.searches += 1
+
+                if self.mailAfter is not None and self.searches > self.mailAfter and not self.mail:
+                    self.mail.append(verificationMail("654321"))
+
+                ids = " ".join(str(i + 1) for i in range(len(self.mail)))
+                conn.sendall(f"* SEARCH {ids}\r\n".encode() + tag + b" OK completed\r\n")
+            elif command == "FETCH":
+                body = self.mail[-1]
+                conn.sendall(f"* {len(self.mail)} FETCH (RFC822 {{{len(body)}}}\r\n".encode() + body + b")\r\n" + tag + b" OK completed\r\n")
+            elif command == "IDLE":
+                self.handleIdle(conn, reader, tag)
+            elif command == "LOGOUT":
+                conn.sendall(b"* BYE\r\n" + tag + b" OK completed\r\n")
+                return
+            else:
+                conn.sendall(tag + b" BAD unknown command\r\n")
+
+    def handleIdle(self, conn, reader, tag):
+        if self.idle == "reject":
+            conn.sendall(tag + b" BAD IDLE not allowed\r\n")
+            return
+
+        conn.sendall(b"+ idling\r\n")
+
+        if self.idle == "push":
+            time.sleep(self.pushDelay)
+            self.mail.append(verificationMail("123456"))
+            conn.sendall(f"* {len(self.mail)} EXISTS\r\n".encode())
+
+        done = reader.readline()
+        self.commands.append(done.strip().decode())
+        conn.sendall(tag + b" OK IDLE terminated\r\n")
+
+    def close(self):
+        self.listener.close()
+
+@pytest.fixture
+def server(request):
+    server = FakeImapServer(**getattr(request, "param", {}))
+    yield server
+    server.close()
+
+@pytest.fixture
+def verifier(server, monkeypatch):
+    verifier = imap_email.EmailVerifier("test@example.com", "grant", "127.0.0.1", server.port)
+
+    def connect():
+        # 测试服务器不使用 SSL
+        verifier.mailbox = imaplib.IMAP4("127.0.0.1", server.port)
+        verifier.mailbox.login(verifier.email_addr, verifier.grant_code)
+        verifier.mailbox.select("INBOX")
+
+    monkeypatch.setattr(verifier, "connect", connect)
+
+    with verifier:
+        yield verifier
+
+def test_idleReturnsOnExists(server, verifier):
+    start = time.monotonic()
+
+    assert verifier._idle(5) is True
+    assert time.monotonic() - start < 2
+    assert server.commands[-2:] == ["IDLE", "DONE"]
+
+    # IDLE 结束后连接仍然可用
+    assert verifier.mailbox.noop()[0] == "OK"
+
+@pytest.mark.parametrize("server", [{"idle": "silent"}], indirect=True)
+def test_idleTimesOut(server, verifier):
+    start = time.monotonic()
+
+    assert verifier._idle(0.3) is False
+    assert time.monotonic() - start < 2
+    assert server.commands[-2:] == ["IDLE", "DONE"]
+    assert verifier.mailbox.noop()[0] == "OK"
+
+def test_waitUsesIdle(server, verifier):
+    assert verifier.wait_for_verification_code(timeout=5, idle_interval=5) == "123456"
+    assert "IDLE" in server.commands
+
+@pytest.mark.parametrize("server", [{"idle": "silent"}], indirect=True)
+def test_waitReturnsNoneAfterTimeout(server, verifier):
+    assert verifier.wait_for_verification_code(timeout=0.5, idle_interval=0.2) is None
+    assert server.commands.count("DONE") == server.commands.count("IDLE") >= 2
+
+@pytest.mark.parametrize("server", [{"idle": "reject", "mailAfter": 2}], indirect=True)
+def test_waitFallsBackToPollingWhenIdleFails(server, verifier):
+    assert verifier.wait_for_verification_code(timeout=5, poll_interval=0.1) == "654321"
+
+    # 只尝试一次 IDLE，之后轮询
+    assert server.commands.count("IDLE") == 1
+    assert "NOOP" in server.commands
+
+@pytest.mark.parametrize("server", [{"idle": "silent", "mailAfter": 2}], indirect=True)
+def test_waitPollsWithoutImaplibInternals(server, verifier, monkeypatch):
+    monkeypatch.setattr(verifier, "_idle_handles", lambda: None)
+
+    assert verifier.wait_for_verification_code(timeout=5, poll_interval=0.1) == "654321"
+    assert "IDLE" not in server.commands
@@ -0,0 +1,33 @@
+from utils.tjParse import courseFingerprint
+
+def course(**fields):
+    '''
+    A course record of manualArrange/page with the fields the fingerprint reads
+    '''
+    record = {
+        "id": 101, "code": "10001001", "name": "高等数学", "courseLabelId": 811, "courseLabelName": "通识选修课",
+        "campus": "3", "campusI18n": "嘉定校区", "number": 120, "elcNumber": 80, "credits": 5.0,
+        "calendarId": 120, "majorList": ["2024(10054 计算机科学与技术)"],
+        "arrangeInfo": "李华(13060) 星期三7-8节 [1-17] 北214",
+        "teacherList": [{"id": 1, "teachingClassId": 101, "teacherCode": "13060", "teacherName": "李华"}],
+    }
+    record.update(fields)
+
+    return record
+
+def test_fingerprintIsStable():
+    assert courseFingerprint(course()) == courseFingerprint(dict(reversed(list(course().items()))))
+
+def test_fingerprintIgnoresEnrollment():
+    # 选课人数由 refreshEnrollment 更新，不算作课程的更新
+    assert courseFingerprint(course(number=150, elcNumber=149)) == courseFingerprint(course())
+
+def test_fingerprintFollowsStoredFields():
+    base = courseFingerprint(course())
+
+    assert courseFingerprint(course(arrangeInfo="李华(13060) 星期四7-8节 [1-17] 北214")) != base
+    assert courseFingerprint(course(credits=4.0)) != base
+    assert courseFingerprint(course(teacherList=[{"id": 1, "teachingClassId": 101, "teacherCode": "13061", "teacherName": "李华"}])) != base
+
+def test_fingerprintIgnoresUnstoredFields():
+    assert courseFingerprint(course(unknownField="x")) == courseFingerprint(course())
@@ -0,0 +1,75 @@
+import pytest
+from utils import tjPipeline
+
+class FakeSql:
+    '''
+    Records what IngestPipeline writes, every course is unchanged
+    '''
+    def __init__(self):
+        self.retired = []
+        self.finished = []
+
+    def beginCrawl(self, calendarId):
+        return 1000 + calendarId
+
+    def syncCourses(self, prepared, crawlId, force=False):
+        return {"inserted": 0, "updated": 0, "unchanged": len(prepared)}
+
+    def checkpointPages(self, crawlId, pages, counts):
+        pass
+
+    def retireCourses(self, calendarId, crawlId):
+        self.retired.append(calendarId)
+        return 3
+
+    def finishCrawl(self, crawlId, counts, msg, failed=False, pages=None):
+        self.finished.append((crawlId, pages, failed))
+
+@pytest.fixture(autouse=True)
+def preparePage(monkeypatch):
+    # 每页一门课，不需要真实的课程记录
+    monkeypatch.setattr(tjPipeline, "preparePage", lambda data: [{"id": data["id"]}])
+
+def pages(pageNums, pageTotal):
+    return iter([(pageNum, pageTotal, {"id": pageNum}) for pageNum in pageNums])
+
+def run(sources, incremental=True, resumed=None):
+    sql = FakeSql()
+    pipeline = tjPipeline.IngestPipeline(sql, workers=0)
+
+    return sql, pipeline.run(sources, incremental, resumed), pipeline.runs
+
+def test_completeRunRetires():
+    sql, counts, runs = run({120: pages([1, 2, 3], 3)})
+
+    assert runs[120].complete()
+    assert sql.retired == [120]
+    assert counts[120]["retired"] == 3
+
+def test_partialRunDoesNotRetire():
+    # 例如只有前两页的存档
+    sql, counts, runs = run({120: pages([1, 2], 3)})
+
+    assert not runs[120].complete()
+    assert sql.retired == []
+    assert counts[120]["retired"] == 0
+    assert sql.finished == [(1120, 2, False)]
+
+def test_emptySourceDoesNotRetire():
+    sql, counts, runs = run({120: pages([], 3)})
+
+    assert not runs[120].complete()
+    assert sql.retired == []
+
+def test_resumedRunCountsCommittedPages():
+    resumed = {120: (77, {"inserted": 0, "updated": 0, "unchanged": 2, "retired": 0}, {1, 2})}
+    sql, counts, runs = run({120: pages([3], 3)}, resumed=resumed)
+
+    assert runs[120].complete()
+    assert sql.retired == [120]
+
+def test_fullRunDoesNotRetire():
+    sql, counts, runs = run({120: pages([1, 2, 3], 3)}, incremental=False)
+
+    assert runs[120].complete()
+    assert sql.retired == []
@@ -0,0 +1,98 @@
+import pytest
+from utils import tjSql
+
+class FakeCursor:
+    def __init__(self, stored):
+        self.stored = stored
+        self.statements = []
+
+    def execute(self, sql, params=None):
+        self.statements.append((sql, params))
+
+    def executemany(self, sql, rows):
+        self.statements.append((sql, list(rows)))
+
+    def fetchall(self):
+        return [(id, *row) for id, row in self.stored.items()]
+
+class FakeDb:
+    def __init__(self):
+        self.commits = 0
+        self.rollbacks = 0
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+def fakeSql(stored):
+    '''
+    A tjSql without a connection, holding (fingerprint, number, elcNumber) of each course in `stored`
+    '''
+    sql = tjSql.tjSql.__new__(tjSql.tjSql)
+    sql.cursor = FakeCursor(stored)
+    sql.db = FakeDb()
+    sql.written = []
+    sql.enrollment = []
+    sql.writeCourses = lambda courses, crawlId, commit=True: sql.written.extend(course['id'] for course in courses)
+    sql.refreshEnrollment = lambda rows, commit=True: sql.enrollment.extend(rows)
+    sql._dropCaches = lambda: None
+
+    return sql
+
+def prepared(id, fingerprint, number=100, elcNumber=50):
+    course = (id, "code", "name", 811, "assessment", 32, 2, "3", number, elcNumber, 1, 17, "course", "name", 2.0, "zh", "faculty", 120)
+
+    return {"id": id, "fingerprint": fingerprint, "course": course}
+
+def history(sql):
+    return [rows for statement, rows in sql.cursor.statements if statement == tjSql.ENROLLMENT_HISTORY_INSERT]
+
+def test_syncCoursesIncremental():
+    sql = fakeSql({1: ("a", 100, 50), 2: ("b", 100, 50)})
+
+    counts = sql.syncCourses([prepared(1, "a", 101, 60), prepared(2, "changed"), prepared(3, "c")], crawlId=9)
+
+    assert counts == {"inserted": 1, "updated": 1, "unchanged": 1}
+    assert sql.written == [2, 3]
+    assert sql.enrollment == [(1, 101, 60)]
+
+def test_syncCoursesForceCountsRewritesAsUpdated():
+    sql = fakeSql({1: ("a", 100, 50), 2: ("b", 100, 50)})
+
+    counts = sql.syncCourses([prepared(1, "a"), prepared(2, "changed"), prepared(3, "c")], crawlId=9, force=True)
+
+    # 强制重写的课程算作更新，后端的数据版本才会前进
+    assert counts == {"inserted": 1, "updated": 2, "unchanged": 0}
+    assert sql.written == [1, 2, 3]
+
+def test_syncCoursesCommitsPageOnce():
+    sql = fakeSql({1: ("a", 100, 50), 2: ("b", 100, 50)})
+
+    sql.syncCourses([prepared(1, "a", 101, 60), prepared(2, "changed"), prepared(3, "c")], crawlId=9)
+
+    assert (sql.db.commits, sql.db.rollbacks) == (1, 0)
+
+def test_syncCoursesRollsBackPage():
+    sql = fakeSql({1: ("a", 100, 50)})
+
+    def fail(rows, commit=True):
+        raise RuntimeError("refresh failed")
+
+    sql.refreshEnrollment = fail
+
+    with pytest.raises(RuntimeError):
+        sql.syncCourses([prepared(1, "a", 101, 60), prepared(2, "b")], crawlId=9)
+
+    # 已写入的课程和 crawlId 随同回滚
+    assert (sql.db.commits, sql.db.rollbacks) == (0, 1)
+
+def test_syncCoursesRecordsHistoryOfRewrittenCourses():
+    sql = fakeSql({1: ("a", 100, 50), 2: ("b", 100, 50), 3: ("c", 100, 50)})
+
+    sql.syncCourses([prepared(1, "changed", 100, 55), prepared(2, "changed"), prepared(3, "c", 120, 50), prepared(4, "d")], crawlId=9)
+
+    # 1 重写且人数变化；2 重写但人数不变；3 未变化，由 refreshEnrollment 记录；4 是新课程
+    assert history(sql) == [[(1, 100, 55)]]
+    assert sql.enrollment == [(3, 120, 50)]
@@ -4,6 +4,7 @@ import email.message
 import imaplib
 import email
 import re
+import time
 from bs4 import BeautifulSoup
 
 class EmailVerifier:
@@ -70,6 +71,153 @@ class EmailVerifier:
                 return match.group(1)
             
         return None  # Verification code not found
+
+    def wait_for_verification_code(self, timeout: float = 120, poll_interval: float = 5, idle_interval: float = 30):
+        """
+        Wait until a verification email arrives and return its code,
+        or None after timeout seconds.
+        With IMAP IDLE the server pushes new mail on this connection,
+        so the code is read as soon as it is delivered; each IDLE lasts
+        at most idle_interval seconds before searching again.
+        Servers without IDLE, an imaplib without the internals IDLE
+        needs (see _idle_handles), or an IDLE that fails, fall back to
+        searching every poll_interval seconds.
+        """
+        if self.mailbox is None:
+            self.connect()
+
+        deadline = time.monotonic() + timeout
+        use_idle = "IDLE" in self.mailbox.capabilities and self._idle_handles() is not None
+
+        # 验证码可能在连接之前就已经到达
+        code = self.get_latest_verification_code()
+
+        while code is None:
+            remaining = deadline - time.monotonic()
+
+            if remaining <= 0:
+                return None
+
+            if use_idle:
+                try:
+                    self._idle(min(remaining, idle_interval))
+                except (imaplib.IMAP4.error, OSError) as e:
+                    print(f"IMAP IDLE 失败 {e}，改为轮询")
+                    use_idle = False
+                    self._reconnect()
+            else:
+                time.sleep(min(poll_interval, remaining))
+                self.mailbox.noop()
+
+            code = self.get_latest_verification_code()
+
+        return code
+
+    def _idle(self, timeout: float):
+        """
+        Block in IMAP IDLE (RFC 2177) until the server reports new mail
+        or timeout seconds pass. Returns whether new mail arrived.
+        The raw socket is read directly, because a timed out read
+        would break the buffered file imaplib reads responses from.
+        """
+        handles = self._idle_handles()
+
+        if handles is None:
+            raise imaplib.IMAP4.error("IDLE is not available with this imaplib")
+
+        new_tag, sock = handles
+        tag = new_tag()
+        buffer = bytearray()
+
+        self.mailbox.send(tag + b" IDLE\r\n")
+
+        sock.settimeout(timeout)
+
+        try:
+            line = self._read_line(sock, buffer)
+
+            if not line.startswith(b"+"):
+                raise imaplib.IMAP4.error(f"IDLE rejected: {line!r}")
+
+            arrived = False
+            deadline = time.monotonic() + timeout
+
+            while not arrived:
+                remaining = deadline - time.monotonic()
+
+                if remaining <= 0:
+                    break
+
+                sock.settimeout(remaining)
+
+                try:
+                    line = self._read_line(sock, buffer)
+                except TimeoutError:
+                    break
+
+                # e.g. "* 23 EXISTS"
+                arrived = line.startswith(b"*") and line.rstrip().upper().endswith((b"EXISTS", b"RECENT"))
+
+            # 结束 IDLE，读到本命令的完成响应为止
+            sock.settimeout(timeout)
+            self.mailbox.send(b"DONE\r\n")
+
+            while not line.startswith(tag):
+                line = self._read_line(sock, buffer)
+
+            if not line[len(tag):].lstrip().upper().startswith(b"OK"):
+                raise imaplib.IMAP4.error(f"IDLE failed: {line!r}")
+        finally:
+            sock.settimeout(None)
+
+        return arrived
+
+    def _idle_handles(self):
+        """
+        imaplib has no IDLE command, so _idle needs two of its internals:
+        the function that allocates the next command tag and the raw socket.
+        This is the only place that touches them. Returns (new_tag, sock),
+        or None when this imaplib does not have them, in which case
+        wait_for_verification_code polls instead.
+        """
+        new_tag = getattr(self.mailbox, "_new_tag", None)
+        sock = getattr(self.mailbox, "sock", None)
+
+        if not callable(new_tag) or sock is None:
+            return None
+
+        return new_tag, sock
+
+    @staticmethod
+    def _read_line(sock, buffer: bytearray):
+        """
+        Read one CRLF terminated line from sock, bytes received after it
+        stay in buffer. A timeout leaves the partial line in buffer too.
+        """
+        while b"\r\n" not in buffer:
+            chunk = sock.recv(4096)
+
+            if not chunk:
+                raise imaplib.IMAP4.abort("connection closed during IDLE")
+
+            buffer.extend(chunk)
+
+        end = buffer.index(b"\r\n")
+        line = bytes(buffer[:end])
+        del buffer[:end + 2]
+
+        return line
+
+    def _reconnect(self):
+        """
+        Drop a connection left in an unknown state and open a new one.
+        """
+        try:
+            self.close()
+        except (imaplib.IMAP4.error, OSError):
+            self.mailbox = None
+
+        self.connect()
     
     def _get_email_content(self, msg: email.message.Message):
         """
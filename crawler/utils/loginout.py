@@ -2,6 +2,7 @@ import requests
 from . import myEncrypt
 from urllib.parse import urlencode
 import json
+import os
 import time
 import xml.etree.ElementTree as ET
 
@@ -10,6 +11,7 @@ from email.mime.multipart import MIMEMultipart
 from email.utils import formataddr
 import smtplib
 from . import imap_email
+from .tjFetch import FETCH_CALENDARS, HEADERS, PAGE_URL, pagePayload, parseCalendars
 import configparser
 
 CONFIG = configparser.ConfigParser()
@@ -20,8 +22,117 @@ IMAP_SERVER = CONFIG["IMAP"]["server_domain"]
 IMAP_PORT = CONFIG["IMAP"]["server_port"]
 IMAP_USERNAME =  CONFIG["IMAP"]["qq_emailaddr"]
 IMAP_PASSWORD =  CONFIG["IMAP"]["qq_grantcode"]
+IMAP_TIMEOUT = CONFIG.getfloat("IMAP", "timeout", fallback=120) # 等待验证码邮件的最长秒数
+IMAP_POLL_INTERVAL = CONFIG.getfloat("IMAP", "poll_interval", fallback=5) # 服务器不支持 IDLE 时的轮询间隔
 MANUAL_LOGIN = False
 
+# 登录状态缓存，可在 config.ini 的 [Session] 中覆盖
+SESSION_CACHE = CONFIG.getboolean("Session", "enabled", fallback=True)
+SESSION_FILE = CONFIG.get("Session", "file", fallback="session.json")
+
+def saveSession(session, path=SESSION_FILE):
+    '''
+    Save the cookies and headers of an authenticated session, readable only by the owner
+    '''
+    state = {
+        "savedAt": int(time.time()),
+        "headers": dict(session.headers),
+        "cookies": [
+            {
+                "name": cookie.name,
+                "value": cookie.value,
+                "domain": cookie.domain,
+                "path": cookie.path,
+                "secure": cookie.secure,
+                "expires": cookie.expires,
+            }
+            for cookie in session.cookies
+        ],
+    }
+
+    # 先写临时文件再替换，中途退出不会留下损坏的缓存
+    temp = path + ".tmp"
+
+    with open(os.open(temp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+
+    os.replace(temp, path)
+
+def loadSession(path=SESSION_FILE):
+    '''
+    Session restored from saveSession, None if there is no usable cache.
+    Expired cookies are dropped, the session is not checked, see isSessionValid
+    '''
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    session = requests.Session()
+    session.headers.update(state.get("headers", {}))
+
+    now = time.time()
+
+    for cookie in state.get("cookies", []):
+        if cookie.get("expires") is not None and cookie["expires"] <= now:
+            continue
+
+        session.cookies.set(cookie["name"], cookie["value"], domain=cookie["domain"], path=cookie["path"], secure=cookie["secure"], expires=cookie["expires"])
+
+    if "sessionid" not in session.cookies.get_dict():
+        return None
+
+    return session
+
+def isSessionValid(session):
+    '''
+    Check a session with one cheap authenticated call: a single-row page of the course list
+    '''
+    calendars = parseCalendars([FETCH_CALENDARS])
+    payload = pagePayload(calendars[0] if calendars else "", 1, 1)
+
+    try:
+        response = session.post(PAGE_URL, headers=HEADERS, json=payload, timeout=10, allow_redirects=False)
+
+        return response.status_code == 200 and response.json().get("data") is not None
+    except (requests.RequestException, ValueError, AttributeError):
+        return False
+
+def cachedLogin(refresh=False, path=SESSION_FILE):
+    '''
+    Reuse the session saved by a previous run when 1 系统 still accepts it,
+    otherwise (or when refresh) login() and save the new session.
+    Without [Session] enabled this is just login()
+    '''
+    if not SESSION_CACHE:
+        return login()
+
+    session = None if refresh else loadSession(path)
+
+    if session is not None:
+        if isSessionValid(session):
+            print("复用已保存的登录状态")
+            return session
+
+        print("已保存的登录状态已失效，重新登录")
+
+    session = login()
+
+    if session is not None:
+        saveSession(session, path)
+
+    return session
+
+def releaseSession(session, path=SESSION_FILE):
+    '''
+    End of a run: keep the session for the next run when caching, otherwise logout
+    '''
+    if SESSION_CACHE:
+        saveSession(session, path)
+    else:
+        logout(session)
+
 # 登录
 def login():
     # ----- 第一步：登录前页面 ----- #
@@ -99,7 +210,7 @@ def login():
         session.post("https://iam.tongji.edu.cn/idp/sendCheckCode.do",
                         data=veri_data, allow_redirects=False)
 
-        sleep_time = 30
+        sleep_time = 0 # 第一次不等待，验证码到达时 IMAP IDLE 立即返回
         failed_time = 0
 
     while True:
@@ -111,10 +222,10 @@ def login():
                     if not code:
                         raise Exception("登录失败！验证码不能为空")
                 else:
-                    # 自动获取验证码
-                    time.sleep(sleep_time)  # 等待 30 秒
+                    # 自动获取验证码，重试前等待
+                    time.sleep(sleep_time)
                     with imap_email.EmailVerifier(IMAP_USERNAME, IMAP_PASSWORD, IMAP_SERVER, IMAP_PORT) as v:
-                        code = v.get_latest_verification_code()
+                        code = v.wait_for_verification_code(IMAP_TIMEOUT, IMAP_POLL_INTERVAL)
                         if code:
                             print(code)
                         else:
@@ -251,6 +362,10 @@ def logout(session):
 
     response = session.post("https://1.tongji.edu.cn/api/sessionservice/session/logout", data=logout_data)
 
+    # 已退出的登录状态不能再复用
+    if os.path.exists(SESSION_FILE):
+        os.remove(SESSION_FILE)
+
     if (response.status_code == 200):
         print("退出登录成功！")
     else:
@@ -0,0 +1,91 @@
+# 原始页面存档，每次爬取每个学期一个 gzip 压缩的 JSONL 文件，只追加不修改
+
+from datetime import datetime
+import configparser
+import gzip
+import json
+import os
+
+CONFIG = configparser.ConfigParser()
+CONFIG.read('config.ini', encoding='utf-8')
+
+# 可在 config.ini 的 [Archive] 中覆盖
+ARCHIVE_ENABLED = CONFIG.getboolean('Archive', 'enabled', fallback=True)
+ARCHIVE_DIRECTORY = CONFIG.get('Archive', 'directory', fallback='archive')
+
+class PageArchive:
+    '''
+    Append raw pages of one crawl of a calendar to
+    `{directory}/{calendarId}/{runId}.jsonl.gz`, one JSON object per line:
+    {"calendarId": 120, "pageNum": 1, "pageTotal": 10, "fetchTime": "...", "data": {...}}
+    '''
+    def __init__(self, calendarId, directory=ARCHIVE_DIRECTORY, runId=None):
+        self.calendarId = calendarId
+        self.runId = runId or datetime.now().strftime("%Y%m%d-%H%M%S")
+        self.path = os.path.join(directory, str(calendarId), f"{self.runId}.jsonl.gz")
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        # 追加模式，每页写完立即落盘，中途退出时已写入的页面仍然可读
+        self._file = gzip.open(self.path, 'at', encoding='utf-8')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, pageNum, pageTotal, data):
+        '''
+        Append a page, data is the `data` object of the response
+        '''
+        record = {
+            "calendarId": self.calendarId,
+            "pageNum": pageNum,
+            "pageTotal": pageTotal,
+            "fetchTime": datetime.now().isoformat(timespec='seconds'),
+            "data": data,
+        }
+
+        self._file.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+        self._file.flush()
+
+    def tee(self, pages):
+        '''
+        Write every (pageNum, pageTotal, data) of pages and pass it on
+        '''
+        for pageNum, pageTotal, data in pages:
+            self.write(pageNum, pageTotal, data)
+
+            yield pageNum, pageTotal, data
+
+    def close(self):
+        self._file.close()
+
+def readArchive(path):
+    '''
+    Read an archive written by PageArchive, yields records in written order.
+    A truncated last line, e.g. from an interrupted crawl, ends the archive
+    '''
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        try:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    return
+        except EOFError:
+            return
+
+def latestArchive(calendarId, directory=ARCHIVE_DIRECTORY):
+    '''
+    Path of the latest archive of a calendar, None if there is none
+    '''
+    folder = os.path.join(directory, str(calendarId))
+
+    if not os.path.isdir(folder):
+        return None
+
+    names = sorted(name for name in os.listdir(folder) if name.endswith('.jsonl.gz'))
+
+    return os.path.join(folder, names[-1]) if names else None
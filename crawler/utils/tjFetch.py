@@ -0,0 +1,171 @@
+# 并发、限速地抓取 1 系统的排课列表
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import configparser
+import contextlib
+import threading
+import time
+import requests
+
+CONFIG = configparser.ConfigParser()
+CONFIG.read('config.ini', encoding='utf-8')
+
+PAGE_URL = "https://1.tongji.edu.cn/api/arrangementservice/manualArrange/page?profile"
+
+# Mock a browser
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/133.0.0.0 Safari/537.36",
+    "Referer": "https://1.tongji.edu.cn/taskResultQuery"
+}
+
+# 默认值，可在 config.ini 的 [Fetch] 中覆盖
+FETCH_WORKERS = CONFIG.getint('Fetch', 'workers', fallback=4) # 同时进行的请求数
+FETCH_RATE = CONFIG.getfloat('Fetch', 'rate', fallback=2.0) # 每秒最多发出的请求数
+FETCH_RETRIES = CONFIG.getint('Fetch', 'retries', fallback=3) # 失败后的重试次数
+FETCH_BACKOFF = CONFIG.getfloat('Fetch', 'backoff', fallback=2.0) # 第 n 次重试前等待 backoff * 2 ** (n - 1) 秒
+FETCH_PAGE_SIZE = CONFIG.getint('Fetch', 'page_size', fallback=100) # 每页的课程数
+FETCH_CALENDARS = CONFIG.get('Fetch', 'calendars', fallback='120') # 不指定学期时要爬的学期，格式见 parseCalendars
+
+class FetchError(Exception):
+    '''
+    A page still fails after all retries
+    '''
+    pass
+
+class RateLimiter:
+    '''
+    Spread requests at most `rate` per second over all threads sharing this object
+    '''
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate > 0 else 0
+
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        '''
+        Block until the caller may send the next request
+        '''
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+
+        if start > now:
+            time.sleep(start - now)
+
+def parseCalendars(values):
+    '''
+    Calendar ids from command line values, each one an id, a range like `118-120`,
+    or several of them separated by commas, e.g. ["118-120", "122,124"].
+    Returns the ids in the given order without duplicates
+    '''
+    calendarIds = []
+
+    for value in values:
+        for part in str(value).split(','):
+            part = part.strip()
+
+            if not part:
+                continue
+
+            if '-' in part:
+                first, last = (int(bound) for bound in part.split('-', 1))
+
+                if first > last:
+                    raise ValueError(f"学期范围 {part} 有误")
+
+                calendarIds.extend(range(first, last + 1))
+            else:
+                calendarIds.append(int(part))
+
+    return list(dict.fromkeys(calendarIds))
+
+def pagePayload(calendarId, pageNum, pageSize):
+    '''
+    Payload of manualArrange/page for one page of a calendar
+    '''
+    return {
+        "condition":
+        {
+            "trainingLevel":"",
+            "campus":"",
+            "calendar":calendarId,
+            "college":"",
+            "course":"",
+            "ids":[],
+            "isChineseTeaching": None,
+        },
+        "pageNum_":pageNum,
+        "pageSize_":pageSize
+    }
+
+def fetchPage(session, calendarId, pageNum, pageSize, limiter, retries=FETCH_RETRIES, backoff=FETCH_BACKOFF, slots=None):
+    '''
+    Fetch one page, returns the `data` object of the response, i.e. {"total_": ..., "list": [...]}.
+    Network errors, non-200 responses and malformed bodies are retried with exponential backoff.
+    With `slots`, a semaphore shared by several fetches, each request holds one slot while it is sent
+    '''
+    payload = pagePayload(calendarId, pageNum, pageSize)
+
+    for attempt in range(retries + 1):
+        if attempt:
+            time.sleep(backoff * 2 ** (attempt - 1))
+
+        try:
+            # 退避等待时不占用名额
+            with slots if slots is not None else contextlib.nullcontext():
+                limiter.wait()
+                response = session.post(PAGE_URL, headers=HEADERS, json=payload, timeout=30)
+
+            response.raise_for_status()
+
+            data = response.json()['data']
+
+            if data is None or data.get('list') is None:
+                raise ValueError("响应中没有 data.list")
+
+            return data
+        except (requests.RequestException, ValueError, KeyError, TypeError) as e:
+            print("第", pageNum, "页第", attempt + 1, "次请求失败：", e)
+
+    raise FetchError(f"学期 {calendarId} 第 {pageNum} 页重试 {retries} 次后仍然失败")
+
+def pageCount(total, pageSize):
+    '''
+    Number of pages holding `total` rows
+    '''
+    return max(1, -(-total // pageSize))
+
+def fetchPages(session, calendarId, pageSize, limiter, workers=FETCH_WORKERS, skip=(), slots=None):
+    '''
+    Fetch every page of a calendar with a pool of `workers` threads,
+    yields (pageNum, pageTotal, data) in completion order, see fetchPage.
+    The first page is fetched alone to learn the total.
+    Pages in `skip`, e.g. the ones committed before a resume, are not yielded.
+    `slots` bounds the requests in flight across every fetch sharing it
+    '''
+    first = fetchPage(session, calendarId, 1, pageSize, limiter, slots=slots)
+    pageTotal = pageCount(first['total_'], pageSize)
+
+    if 1 not in skip:
+        yield 1, pageTotal, first
+
+    rest = [pageNum for pageNum in range(2, pageTotal + 1) if pageNum not in skip]
+
+    if not rest:
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(fetchPage, session, calendarId, pageNum, pageSize, limiter, slots=slots): pageNum
+            for pageNum in rest
+        }
+
+        try:
+            for future in as_completed(futures):
+                yield futures[future], pageTotal, future.result()
+        finally:
+            # 出错或调用方提前退出时，不再发出排队中的请求
+            for future in futures:
+                future.cancel()
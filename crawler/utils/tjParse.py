@@ -0,0 +1,137 @@
+# 解析 1 系统返回的排课文本和课程记录，这里的函数不访问数据库，可以在子进程中运行
+
+import hashlib
+import json
+from common.arrangement import parseArrangeLine, splitArrangeInfo
+
+# 维度表：表名 -> (主键列, 名称列)，列名与 1 系统返回的字段名相同
+DIMENSIONS = {
+    "language": ("teachingLanguage", "teachingLanguageI18n"),
+    "coursenature": ("courseLabelId", "courseLabelName"),
+    "assessment": ("assessmentMode", "assessmentModeI18n"),
+    "campus": ("campus", "campusI18n"),
+    "faculty": ("faculty", "facultyI18n"),
+    "calendar": ("calendarId", "calendarIdI18n"),
+}
+
+# 参与指纹计算的字段，即入库时用到的除选课人数（number, elcNumber）以外的全部字段，其中任何一个变化都需要重新写入这门课；
+# 选课人数在选课期间不断变化，单独由 tjSql.refreshEnrollment 更新，不算作课程的更新
+FINGERPRINT_FIELDS = [
+    "id", "code", "name", "courseLabelId", "courseLabelName", "assessmentMode", "assessmentModeI18n",
+    "period", "weekHour", "campus", "campusI18n", "startWeek", "endWeek",
+    "courseCode", "courseName", "credits", "teachingLanguage", "teachingLanguageI18n",
+    "faculty", "facultyI18n", "calendarId", "calendarIdI18n", "majorList", "arrangeInfo",
+]
+
+def courseFingerprint(course):
+    '''
+    sha1 of the stored fields of a course record from the API,
+    so that it can be compared with the stored course without reading the course back
+    '''
+    record = {field: course.get(field) for field in FINGERPRINT_FIELDS}
+    record["teacherList"] = [
+        (teacher['id'], teacher['teachingClassId'], teacher['teacherCode'], teacher['teacherName'])
+        for teacher in course.get('teacherList') or []
+    ]
+
+    text = json.dumps(record, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+def parseMajor(major):
+    '''
+    输入："2023(10054 计算机科学与技术)"
+    输出：("2023(10054 计算机科学与技术)", "10054", 2023)，即 (name, code, grade)
+    '''
+    return major, major.split('(')[1].split(' ')[0], int(major[:4])
+
+def teacherSchedules(course):
+    '''
+    Split arrangeInfo of a course by teacher,
+    returns [(teacher, teacherSchedule)] where teacherSchedule is the lines of that teacher
+    '''
+    # split arrangeInfo to array by '\n', broken lines are joined back
+    arrangeInfo = splitArrangeInfo(course['arrangeInfo']) if course['arrangeInfo'] else []
+
+    result = []
+
+    for teacher in course['teacherList'] or []:
+        # Grep arrangeInfo for this teacher
+        teacherSchedule = ""
+
+        for info in arrangeInfo:
+            if teacher['teacherName'] in info:
+                teacherSchedule += info + '\n'
+
+        result.append((teacher, teacherSchedule))
+
+    return result
+
+def arrangementRows(teacher, teacherSchedule, calendarId):
+    '''
+    One row of arrangement table per arrangement line of a teacher
+    '''
+    rows = []
+
+    for line in teacherSchedule.split('\n'):
+        arrangement = parseArrangeLine(line)
+
+        if arrangement is None:
+            continue
+
+        rows.append((
+            teacher['teachingClassId'], teacher['id'], teacher['teacherCode'], calendarId,
+            arrangement['occupyDay'], arrangement['startSection'], arrangement['endSection'],
+            arrangement['weekMask'], arrangement['occupyRoom'], arrangement['teacherAndCode'],
+            arrangement['arrangementText']
+        ))
+
+    return rows
+
+def enrollmentRow(course):
+    '''
+    (id, number, elcNumber) of a course record, i.e. its capacity and enrolled count
+    '''
+    return course['id'], course['number'], course['elcNumber']
+
+def prepareCourse(course):
+    '''
+    Turn a course record of manualArrange/page into the rows tjSql writes, i.e.
+    {
+        "id": 教学班 id,
+        "fingerprint": courseFingerprint(course),
+        "dimensions": [(表名, 主键, 名称)],
+        "majors": [parseMajor(major)],
+        "course": coursedetail 的一行，不含 fingerprint 和 crawlId,
+        "teachers": teacher 表的行,
+        "arrangements": arrangement 表的行,
+    }
+    The result only holds plain tuples, so it can be sent back from a worker process
+    '''
+    teachers = []
+    arrangements = []
+
+    for teacher, teacherSchedule in teacherSchedules(course):
+        teachers.append((teacher['id'], teacher['teachingClassId'], teacher['teacherCode'], teacher['teacherName'], teacherSchedule))
+        arrangements.extend(arrangementRows(teacher, teacherSchedule, course['calendarId']))
+
+    return {
+        "id": course['id'],
+        "fingerprint": courseFingerprint(course),
+        "dimensions": [
+            (table, course[keyColumn], course[nameColumn])
+            for table, (keyColumn, nameColumn) in DIMENSIONS.items()
+            if course[keyColumn] is not None
+        ],
+        "majors": [parseMajor(major) for major in dict.fromkeys(course['majorList'] or [])],
+        "course": (
+            course['id'], course['code'], course['name'],
+            course['courseLabelId'], course['assessmentMode'], course['period'],
+            course['weekHour'], course['campus'], course['number'],
+            course['elcNumber'], course['startWeek'], course['endWeek'],
+            course['courseCode'], course['courseName'], course['credits'],
+            course['teachingLanguage'], course['faculty'], course['calendarId'],
+        ),
+        "teachers": teachers,
+        "arrangements": arrangements,
+    }
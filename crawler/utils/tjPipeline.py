@@ -0,0 +1,250 @@
+# 分阶段入库：读取线程 -> 解析进程池 -> 单个批量写入者
+
+from concurrent.futures import Future, ProcessPoolExecutor
+import configparser
+import os
+import queue
+import threading
+import time
+from .tjParse import prepareCourse
+from .tjSql import SYNC_COUNTS
+
+CONFIG = configparser.ConfigParser()
+CONFIG.read('config.ini', encoding='utf-8')
+
+# 默认值，可在 config.ini 的 [Pipeline] 中覆盖
+PIPELINE_WORKERS = CONFIG.getint('Pipeline', 'workers', fallback=os.cpu_count() or 1) # 解析进程数，0 表示在写入线程中解析
+PIPELINE_PENDING = CONFIG.getint('Pipeline', 'pending', fallback=16) # 已读取但未写入的页面数上限
+PIPELINE_BATCH = CONFIG.getint('Pipeline', 'batch', fallback=500) # 每个事务最多写入的课程数
+
+def preparePage(data):
+    '''
+    Prepare every course of a page, runs in a worker process
+    '''
+    return [prepareCourse(course) for course in data['list']]
+
+class CalendarRun:
+    '''
+    Bookkeeping of one calendar in a pipeline run
+    '''
+    def __init__(self, calendarId, crawlId, counts=None, skipped=0):
+        self.calendarId = calendarId
+        self.crawlId = crawlId
+        self.counts = dict(counts) if counts else dict.fromkeys(SYNC_COUNTS, 0)
+        self.skipped = skipped # 续爬时之前已提交的页面数
+
+        self.read = 0 # 读取线程交给进程池的页面数
+        self.readDone = False
+        self.written = 0
+        self.pageTotal = None # 来源报告的总页数，写入第一页后才知道
+        self.error = None
+
+        self.started = time.monotonic()
+        self.elapsed = None # 结束时的耗时，秒
+
+        # 尚未写入的批次，[(pageNum, pageTotal, prepared)]
+        self.batch = []
+
+    def batchSize(self):
+        return sum(len(prepared) for _, _, prepared in self.batch)
+
+    def finished(self):
+        return self.error is not None or (self.readDone and self.written == self.read)
+
+    def complete(self):
+        '''
+        Whether every page of the calendar is committed, counting the ones committed before a resume.
+        A source that ends early, e.g. a partial archive, is finished but not complete
+        '''
+        return self.pageTotal is not None and self.skipped + self.written == self.pageTotal
+
+    def summary(self):
+        '''
+        One line of counts and timing for the final report
+        '''
+        counts = ", ".join(f"{key} {self.counts[key]}" for key in SYNC_COUNTS)
+        status = "完成" if self.error is None else f"失败（{self.error}）"
+        elapsed = self.elapsed if self.elapsed is not None else time.monotonic() - self.started
+
+        return f"学期 {self.calendarId} {status}：{self.skipped + self.written} 页，{counts}，用时 {elapsed:.1f}s"
+
+class IngestPipeline:
+    '''
+    Ingest the pages of several calendars with three stages:
+    one reader thread per calendar pulls pages from its source, a process pool
+    prepares them (tjParse.prepareCourse), and the calling thread is the only writer,
+    merging prepared pages into transactions of up to `batchSize` courses.
+    At most `pending` pages are read but not yet written, so a slow writer
+    throttles the readers instead of filling memory.
+    '''
+    def __init__(self, sql, workers=PIPELINE_WORKERS, pending=PIPELINE_PENDING, batchSize=PIPELINE_BATCH):
+        self.sql = sql
+        self.workers = workers
+        self.batchSize = batchSize
+
+        self._slots = threading.BoundedSemaphore(pending)
+        self._ready = queue.Queue() # 大小受 _slots 限制
+        self._stop = threading.Event()
+
+        self.runs = {} # {calendarId: CalendarRun} of the last run
+
+    def _read(self, run, pages, executor):
+        '''
+        Reader thread: hand every page of a source to the pool, then report that the source is done
+        '''
+        try:
+            for pageNum, pageTotal, data in pages:
+                # 等待写入者腾出位置
+                while not self._slots.acquire(timeout=1):
+                    if self._stop.is_set() or run.error is not None:
+                        return
+
+                if self._stop.is_set() or run.error is not None:
+                    self._slots.release()
+                    return
+
+                if executor is None:
+                    future = Future()
+                    future.set_result(preparePage(data))
+                else:
+                    future = executor.submit(preparePage, data)
+
+                run.read += 1
+                future.add_done_callback(lambda f, pageNum=pageNum, pageTotal=pageTotal: self._ready.put(("page", run, (pageNum, pageTotal, f))))
+
+            self._ready.put(("done", run, None))
+        except Exception as e:
+            self._ready.put(("error", run, e))
+        finally:
+            close = getattr(pages, 'close', None)
+
+            if close is not None:
+                close()
+
+    def _flush(self, run, incremental):
+        '''
+        Write the pending batch of a calendar in one transaction
+        '''
+        if not run.batch or run.error is not None:
+            return
+
+        prepared = [course for _, _, courses in run.batch for course in courses]
+
+        for key, count in self.sql.syncCourses(prepared, run.crawlId, force=not incremental).items():
+            run.counts[key] += count
+
+        # 课程提交之后再记录断点，两者之间中断时这些页面会在续爬时重写一次，写入本身是幂等的
+        self.sql.checkpointPages(run.crawlId, [(pageNum, pageTotal) for pageNum, pageTotal, _ in run.batch], run.counts)
+
+        for pageNum, pageTotal, _ in run.batch:
+            run.written += 1
+            run.pageTotal = pageTotal
+            print("学期", run.calendarId, "第", pageNum, "页完成，", run.skipped + run.written, "/", pageTotal, "页")
+
+        run.batch = []
+
+    def _finish(self, run, incremental):
+        '''
+        Close the fetchlog row of a calendar whose source is finished or which failed,
+        with its counts, committed pages and the time this run took.
+        When incremental, the courses not seen are retired only if the run is complete
+        '''
+        if run.error is None and incremental:
+            try:
+                if not run.complete():
+                    # 来源提前结束（如不完整的存档），没见到的课程不一定已被删除
+                    print("学期", run.calendarId, "只写入了", run.skipped + run.written, "/", run.pageTotal or "?", "页，跳过退役")
+                elif run.counts['inserted'] + run.counts['updated'] + run.counts['unchanged'] > 0:
+                    # 没有拿到任何课程时不退役，以免接口异常时清空整个学期
+                    run.counts['retired'] = self.sql.retireCourses(run.calendarId, run.crawlId)
+            except Exception as e:
+                run.error = e
+
+        run.elapsed = time.monotonic() - run.started
+        pages = run.skipped + run.written
+
+        if run.error is None:
+            msg = f"{'incremental' if incremental else 'full'} {run.elapsed:.1f}s"
+            self.sql.finishCrawl(run.crawlId, run.counts, msg, pages=pages)
+        else:
+            self.sql.finishCrawl(run.crawlId, run.counts, f"failed: {run.error}", failed=True, pages=pages)
+
+        print(run.summary())
+
+    def run(self, sources, incremental=False, resumed=None):
+        '''
+        sources maps calendarId to its pages, an iterable of (pageNum, pageTotal, data)
+        where data is the `data` object of manualArrange/page.
+        Every calendar is recorded in fetchlog, see tjSql.syncCourses and tjSql.retireCourses,
+        and every committed page is checkpointed. resumed maps calendarId to the result of
+        tjSql.resumeCrawl for calendars continuing an unfinished crawl, whose sources
+        should leave out the committed pages.
+        Returns {calendarId: counts}, raises the first error after all calendars are closed.
+        The CalendarRun of every calendar stays in self.runs for reporting, also after an error
+        '''
+        resumed = resumed or {}
+        runs = self.runs = {}
+
+        for calendarId in sources:
+            if calendarId in resumed:
+                crawlId, counts, pages = resumed[calendarId]
+                runs[calendarId] = CalendarRun(calendarId, crawlId, counts, len(pages))
+            else:
+                runs[calendarId] = CalendarRun(calendarId, self.sql.beginCrawl(calendarId))
+        active = set(runs)
+
+        executor = ProcessPoolExecutor(max_workers=self.workers) if self.workers > 0 else None
+
+        readers = [
+            threading.Thread(target=self._read, args=(runs[calendarId], pages, executor), daemon=True)
+            for calendarId, pages in sources.items()
+        ]
+
+        try:
+            for reader in readers:
+                reader.start()
+
+            while active:
+                kind, run, value = self._ready.get()
+
+                if kind == "page":
+                    self._slots.release()
+
+                    if run.error is None:
+                        pageNum, pageTotal, future = value
+
+                        try:
+                            run.batch.append((pageNum, pageTotal, future.result()))
+                        except Exception as e:
+                            run.error = e
+                elif kind == "done":
+                    run.readDone = True
+                else:
+                    run.error = value
+
+                # 批次已满或读取结束时写入；暂时没有更多已解析的页面时，写入所有批次，写入者不空等
+                idle = self._ready.empty()
+
+                for pending in runs.values():
+                    if pending.batch and (idle or (pending is run and (run.batchSize() >= self.batchSize or run.readDone))):
+                        try:
+                            self._flush(pending, incremental)
+                        except Exception as e:
+                            pending.error = e
+
+                for calendarId in list(active):
+                    if runs[calendarId].finished():
+                        self._finish(runs[calendarId], incremental)
+                        active.discard(calendarId)
+        finally:
+            self._stop.set()
+
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+        errors = [run.error for run in runs.values() if run.error is not None]
+
+        if errors:
+            raise errors[0]
+
+        return {calendarId: run.counts for calendarId, run in runs.items()}
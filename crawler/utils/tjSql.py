@@ -1,5 +1,6 @@
 import mysql.connector
 import configparser
+from .tjParse import DIMENSIONS, arrangementRows, prepareCourse
 
 # 读取配置文件
 CONFIG = configparser.ConfigParser()
@@ -13,6 +14,43 @@ DB_DATABASE = CONFIG['Sql']['database']
 DB_PORT = int(CONFIG['Sql']['port'])
 DB_CHARSET = CONFIG['Sql']['charset']
 
+COURSEDETAIL_COLUMNS = [
+    "id", "code", "name", "courseLabelId", "assessmentMode", "period",
+    "weekHour", "campus", "number", "elcNumber", "startWeek", "endWeek",
+    "courseCode", "courseName", "credit", "teachingLanguage", "faculty", "calendarId",
+    "fingerprint", "crawlId",
+]
+
+COURSEDETAIL_UPSERT = (
+    f"INSERT INTO coursedetail ({', '.join(COURSEDETAIL_COLUMNS)})"
+    f" VALUES ({', '.join(['%s'] * len(COURSEDETAIL_COLUMNS))})"
+    f" ON DUPLICATE KEY UPDATE {', '.join(f'{column} = VALUES({column})' for column in COURSEDETAIL_COLUMNS[1:])}"
+)
+
+TEACHER_UPSERT = (
+    "INSERT INTO teacher (id, teachingClassId, teacherCode, teacherName, arrangeInfoText)"
+    " VALUES (%s, %s, %s, %s, %s)"
+    " ON DUPLICATE KEY UPDATE teachingClassId = VALUES(teachingClassId), teacherCode = VALUES(teacherCode),"
+    " teacherName = VALUES(teacherName), arrangeInfoText = VALUES(arrangeInfoText)"
+)
+
+# 每次同步记录到 fetchlog 的计数
+SYNC_COUNTS = ("inserted", "updated", "unchanged", "retired")
+
+# 每次刷新选课人数的计数
+ENROLLMENT_COUNTS = ("changed", "unchanged", "unknown")
+
+ENROLLMENT_HISTORY_INSERT = (
+    "INSERT INTO enrollmenthistory (courseId, number, elcNumber, changeTime) VALUES (%s, %s, %s, NOW())"
+)
+
+ARRANGEMENT_INSERT = (
+    "INSERT INTO arrangement ("
+    "teachingClassId, teacherId, teacherCode, calendarId, "
+    "occupyDay, startSection, endSection, weekMask, room, teacherAndCode, arrangementText"
+    ") VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"
+)
+
 class tjSql:
     '''
     A class for handling MySQL database
@@ -31,6 +69,9 @@ class tjSql:
         )
         self.cursor = self.db.cursor()
 
+        # 已经在数据库中的维度表主键和专业 id，同一连接的后续页面不必再查询
+        self._dropCaches()
+
     def __enter__(self):
         return self
     
@@ -38,323 +79,444 @@ class tjSql:
         self.cursor.close()
         self.db.close()
 
-    def insertCalendar(self, course):
+    def _dimensionKeys(self, table):
         '''
-        Insert calendar into database
+        Primary keys already in a dimension table, read once per connection
         '''
-        # if exists, return
-        sql = "SELECT * FROM calendar WHERE calendarId = %s"
+        if table not in self.dimensionKeys:
+            self.cursor.execute(f"SELECT {DIMENSIONS[table][0]} FROM {table}")
 
-        val = (course['calendarId'], )
+            self.dimensionKeys[table] = {row[0] for row in self.cursor.fetchall()}
 
-        self.cursor.execute(sql, val)
+        return self.dimensionKeys[table]
 
-        if self.cursor.fetchone() is not None:
-            return
-        
-        # Insert
-        sql = "INSERT INTO calendar (calendarId, calendarIdI18n) VALUES (%s, %s)"
+    def _majorIds(self):
+        '''
+        Major ids keyed by name and by (code, grade), read once per connection
+        '''
+        if self.majorIdByName is None:
+            self.cursor.execute("SELECT id, code, grade, name FROM major ORDER BY id")
 
-        val = (course['calendarId'], course['calendarIdI18n'])
+            self.majorIdByName = {}
+            self.majorIdByCodeGrade = {}
 
-        self.cursor.execute(sql, val)
+            for majorId, code, grade, name in self.cursor.fetchall():
+                self.majorIdByName.setdefault(name, majorId)
+                self.majorIdByCodeGrade.setdefault((code, grade), majorId)
 
-        self.db.commit()
+        return self.majorIdByName, self.majorIdByCodeGrade
 
-    def insertCourseLabel(self, course):
+    def _dropCaches(self):
         '''
-        Insert courseLabel into database
+        Forget the cached keys, used after a rollback
         '''
-        # if none, return
-        if course['courseLabelId'] is None:
-            return
-        
-        # if exists, return
-        sql = "SELECT * FROM coursenature WHERE courseLabelId = %s"
+        self.dimensionKeys = {}
+        self.majorIdByName = None
+        self.majorIdByCodeGrade = None
 
-        val = (course['courseLabelId'], )
+    def insertDimensions(self, prepared):
+        '''
+        Insert the language, courseLabel, assessmentMode, campus, faculty and calendar
+        of prepared courses that are not in database yet, one executemany per table.
+        Commit is left to the caller
+        '''
+        rowsByTable = {}
 
-        self.cursor.execute(sql, val)
+        for course in prepared:
+            for table, key, name in course['dimensions']:
+                if key not in self._dimensionKeys(table):
+                    rowsByTable.setdefault(table, {}).setdefault(key, (key, name))
 
-        if self.cursor.fetchone() is not None:
-            return
-        
-        # Insert
-        sql = "INSERT INTO coursenature (courseLabelId, courseLabelName) VALUES (%s, %s)"
+        for table, rows in rowsByTable.items():
+            keyColumn, nameColumn = DIMENSIONS[table]
 
-        val = (course['courseLabelId'], course['courseLabelName'])
+            sql = (
+                f"INSERT INTO {table} ({keyColumn}, {nameColumn}) VALUES (%s, %s)"
+                f" ON DUPLICATE KEY UPDATE {nameColumn} = VALUES({nameColumn})"
+            )
 
-        self.cursor.execute(sql, val)
+            self.cursor.executemany(sql, list(rows.values()))
 
-        self.db.commit()
+            self.dimensionKeys[table].update(rows)
 
-    def insertAssessmentMode(self, course):
+    def insertMajors(self, majors):
         '''
-        Insert assessmentMode into database
+        Insert majors not in database yet and return their ids in order,
+        majors is an array of (name, code, grade), see tjParse.parseMajor.
+        Commit is left to the caller
         '''
-        # if none, return
-        if course['assessmentMode'] is None:
-            return
-        
-        # if exists, return
-        sql = "SELECT * FROM assessment WHERE assessmentMode = %s"
+        majorIdByName, majorIdByCodeGrade = self._majorIds()
+        result = []
 
-        val = (course['assessmentMode'], )
+        for name, code, grade in majors:
+            if name not in majorIdByName:
+                if (code, grade) not in majorIdByCodeGrade:
+                    sql = "INSERT INTO major (code, grade, name) VALUES (%s, %s, %s)"
 
-        self.cursor.execute(sql, val)
+                    self.cursor.execute(sql, (code, grade, name))
 
-        if self.cursor.fetchone() is not None:
-            return
-        
-        # Insert
-        sql = "INSERT INTO assessment (assessmentMode, assessmentModeI18n) VALUES (%s, %s)"
+                    majorIdByCodeGrade[(code, grade)] = self.cursor.lastrowid
 
-        val = (course['assessmentMode'], course['assessmentModeI18n'])
+                majorIdByName[name] = majorIdByCodeGrade[(code, grade)]
 
-        self.cursor.execute(sql, val)
+            result.append(majorIdByName[name])
 
-        self.db.commit()
+        return result
 
-    def insertCampus(self, course):
+    def insertArrangements(self, teacher, teacherSchedule, calendarId):
         '''
-        Insert campus into database
+        Insert one row per arrangement line of a teacher into arrangement table,
+        so that the backend never parses arrangement text again.
+        Commit is left to the caller
         '''
-        # if none, return
-        if course['campus'] is None:
-            return
-        
-        # if exists, return
-        sql = "SELECT * FROM campus WHERE campus = %s"
+        rows = arrangementRows(teacher, teacherSchedule, calendarId)
 
-        val = (course['campus'], )
+        if rows:
+            self.cursor.executemany(ARRANGEMENT_INSERT, rows)
 
-        self.cursor.execute(sql, val)
+    def rebuildArrangements(self, calendarId):
+        '''
+        Rebuild arrangement table of a calendar from teacher.arrangeInfoText,
+        used for data crawled before arrangement table existed
+        '''
+        sql = (
+            "SELECT t.id, t.teachingClassId, t.teacherCode, t.arrangeInfoText"
+            " FROM teacher AS t"
+            " JOIN coursedetail AS c ON c.id = t.teachingClassId"
+            " WHERE c.calendarId = %s"
+        )
 
-        if self.cursor.fetchone() is not None:
-            return
-        
-        # Insert
-        sql = "INSERT INTO campus (campus, campusI18n) VALUES (%s, %s)"
+        self.cursor.execute(sql, (calendarId, ))
 
-        val = (course['campus'], course['campusI18n'])
+        teachers = self.cursor.fetchall()
 
-        self.cursor.execute(sql, val)
+        self.cursor.execute("DELETE FROM arrangement WHERE calendarId = %s", (calendarId, ))
+
+        for teacherId, teachingClassId, teacherCode, arrangeInfoText in teachers:
+            teacher = {
+                "id": teacherId,
+                "teachingClassId": teachingClassId,
+                "teacherCode": teacherCode,
+            }
+
+            self.insertArrangements(teacher, arrangeInfoText or "", calendarId)
 
         self.db.commit()
 
-    def insertFaculty(self, course):
+        return len(teachers)
+
+    def insertCourseList(self, courses, crawlId=None):
         '''
-        Insert faculty into database
+        Insert or update a page of courses in one transaction, see writeCourses
         '''
-        # if exists, return
-        sql = "SELECT * FROM faculty WHERE faculty = %s"
+        self.writeCourses([prepareCourse(course) for course in courses], crawlId)
 
-        val = (course['faculty'], )
+    def writeCourses(self, prepared, crawlId=None, commit=True):
+        '''
+        Insert or update courses prepared by tjParse.prepareCourse in one transaction.
+        Existing courses are updated in place, and their teachers, arrangements and majors
+        are replaced by the prepared ones, so courses can be loaded again safely.
+        Courses are stamped with their fingerprint and crawlId, the fetchlog id of this crawl.
+        Everything is rolled back if anything fails; with commit=False the caller commits
+        '''
+        if not prepared:
+            return
 
-        self.cursor.execute(sql, val)
+        try:
+            self.insertDimensions(prepared) # Insert language, courseLabel, assessmentMode, campus, faculty, calendar
 
-        if self.cursor.fetchone() is not None:
-            return
-        
-        # Insert
-        sql = "INSERT INTO faculty (faculty, facultyI18n) VALUES (%s, %s)"
+            majorRows = []
 
-        val = (course['faculty'], course['facultyI18n'])
+            for course in prepared:
+                for majorId in dict.fromkeys(self.insertMajors(course['majors'])):
+                    majorRows.append((majorId, course['id']))
 
-        self.cursor.execute(sql, val)
+            # Insert or update courses
+            self.cursor.executemany(COURSEDETAIL_UPSERT, [
+                (*course['course'], course['fingerprint'], crawlId) for course in prepared
+            ])
 
-        self.db.commit()
+            teacherRows = [row for course in prepared for row in course['teachers']]
+            arrangementRows = [row for course in prepared for row in course['arrangements']]
 
-    def insertMajors(self, majors):
+            # 教学班的排课和专业整体替换，不再属于这些教学班的教师一并删除
+            classIds = [course['id'] for course in prepared]
+            classPlaceholders = ','.join(['%s'] * len(classIds))
+
+            self.cursor.execute(f"DELETE FROM arrangement WHERE teachingClassId IN ({classPlaceholders})", classIds)
+            self.cursor.execute(f"DELETE FROM majorandcourse WHERE courseId IN ({classPlaceholders})", classIds)
+
+            if teacherRows:
+                teacherIds = [row[0] for row in teacherRows]
+
+                self.cursor.execute(
+                    f"DELETE FROM teacher WHERE teachingClassId IN ({classPlaceholders})"
+                    f" AND id NOT IN ({','.join(['%s'] * len(teacherIds))})",
+                    classIds + teacherIds
+                )
+                self.cursor.executemany(TEACHER_UPSERT, teacherRows)
+            else:
+                self.cursor.execute(f"DELETE FROM teacher WHERE teachingClassId IN ({classPlaceholders})", classIds)
+
+            if arrangementRows:
+                self.cursor.executemany(ARRANGEMENT_INSERT, arrangementRows)
+
+            if majorRows:
+                self.cursor.executemany("INSERT INTO majorandcourse (majorId, courseId) VALUES (%s, %s)", majorRows)
+
+            if commit:
+                self.db.commit()
+        except Exception:
+            self.db.rollback()
+            self._dropCaches() # 缓存里可能有被回滚的键
+
+            raise
+
+    def syncCourseList(self, courses, crawlId, force=False):
         '''
-        Insert major into database,
-        majors is an array
+        Incremental version of insertCourseList, see syncCourses
         '''
-        # if majors is empty, return
-        if majors is None:
-            return
+        return self.syncCourses([prepareCourse(course) for course in courses], crawlId, force)
 
-        for major in majors:
-            # process major
-            processedMajor = {
-                "code": major.split('(')[1].split(' ')[0],
-                "grade": major[:4],  # first four characters of major is grade
-                "name": major
-            }
+    def syncCourses(self, prepared, crawlId, force=False):
+        '''
+        Incremental version of writeCourses: only the courses whose fingerprint differs
+        from the stored one are written (all of them when force), the others are just
+        marked as seen by crawlId and get their enrollment refreshed, see refreshEnrollment.
+        Rewritten courses whose number or elcNumber changed are added to enrollmenthistory too.
+        The whole page is written in one transaction and rolled back if anything fails.
+        Returns the counts of inserted, updated and unchanged courses; a course rewritten
+        only because of force counts as updated, so a full crawl always moves the data version
+        '''
+        counts = dict.fromkeys(SYNC_COUNTS[:3], 0)
+
+        if not prepared:
+            return counts
 
-            # if exists, skip
-            sql = "SELECT * FROM major WHERE code = %s AND grade = %s"
+        ids = [course['id'] for course in prepared]
+
+        self.cursor.execute(
+            f"SELECT id, fingerprint, number, elcNumber FROM coursedetail WHERE id IN ({','.join(['%s'] * len(ids))})",
+            ids
+        )
 
-            val = (processedMajor['code'], processedMajor['grade'])
+        stored = {id: (fingerprint, (number, elcNumber)) for id, fingerprint, number, elcNumber in self.cursor.fetchall()}
 
-            self.cursor.execute(sql, val)
+        changed = []
+        unchangedIds = []
+        enrollment = [] # 指纹不含选课人数，未变化的课程仍要同步 (id, number, elcNumber)
+        history = [] # 重写的课程中选课人数变化的 (id, number, elcNumber)
 
-            if self.cursor.fetchone() is not None:
+        for course in prepared:
+            row = course['course'][:1] + course['course'][8:10]
+
+            if course['id'] not in stored:
+                counts['inserted'] += 1
+                changed.append(course)
                 continue
 
-            # Insert
-            sql = "INSERT INTO major (code, grade, name) VALUES (%s, %s, %s)"
+            fingerprint, numbers = stored[course['id']]
 
-            val = (processedMajor['code'], processedMajor['grade'], processedMajor['name'])
+            if fingerprint != course['fingerprint'] or force:
+                # 强制重写也算更新，否则后端的数据版本不会前进
+                counts['updated'] += 1
+                changed.append(course)
 
-            self.cursor.execute(sql, val)
+                if numbers != row[1:]:
+                    history.append(row)
+            else:
+                counts['unchanged'] += 1
+                unchangedIds.append(course['id'])
+                enrollment.append(row)
 
-        self.db.commit()
+        try:
+            self.writeCourses(changed, crawlId, commit=False)
+
+            if unchangedIds:
+                sql = f"UPDATE coursedetail SET crawlId = %s WHERE id IN ({','.join(['%s'] * len(unchangedIds))})"
 
-    def insertTeachers(self, teachers, arrangeInfo):
+                self.cursor.execute(sql, [crawlId] + unchangedIds)
+
+            self.refreshEnrollment(enrollment, commit=False)
+
+            if history:
+                self.cursor.executemany(ENROLLMENT_HISTORY_INSERT, history)
+
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            self._dropCaches() # 缓存里可能有被回滚的键
+
+            raise
+
+        return counts
+
+    def retireCourses(self, calendarId, crawlId):
         '''
-        Insert teachers into database,
-        no need to check if exists,
-        because schedule is unique
+        Delete the courses of a calendar that crawlId has not seen, together with their
+        teachers, arrangements and majors. Call it only after every page is synced.
+        Returns the number of retired courses
         '''
-        # split arrangeInfo to array by '\n'
-        arrangeInfo = arrangeInfo.split('\n')
+        sql = "SELECT id FROM coursedetail WHERE calendarId = %s AND (crawlId IS NULL OR crawlId <> %s)"
+
+        self.cursor.execute(sql, (calendarId, crawlId))
 
-        for teacher in teachers:
-            # Grep arrangeInfo for this teacher
-            teacherSchedule = ""
-            
-            for info in arrangeInfo:
-                if teacher['teacherName'] in info:
-                    teacherSchedule += info + '\n'
-            
-            # Insert teacher
-            sql = "INSERT INTO teacher (id, teachingClassId, teacherCode, teacherName, arrangeInfoText) VALUES (%s, %s, %s, %s, %s)"
+        ids = [row[0] for row in self.cursor.fetchall()]
 
-            val = (teacher['id'], teacher['teachingClassId'], teacher['teacherCode'], teacher['teacherName'], teacherSchedule)
+        if not ids:
+            return 0
 
-            self.cursor.execute(sql, val) 
+        placeholders = ','.join(['%s'] * len(ids))
+
+        try:
+            self.cursor.execute(f"DELETE FROM arrangement WHERE teachingClassId IN ({placeholders})", ids)
+            self.cursor.execute(f"DELETE FROM majorandcourse WHERE courseId IN ({placeholders})", ids)
+            self.cursor.execute(f"DELETE FROM teacher WHERE teachingClassId IN ({placeholders})", ids)
+            self.cursor.execute(f"DELETE FROM coursedetail WHERE id IN ({placeholders})", ids)
+
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+
+            raise
+
+        return len(ids)
+
+    def beginCrawl(self, calendarId):
+        '''
+        Open a fetchlog row for a crawl of a calendar and return its id, the crawlId.
+        fetchTime stays NULL until finishCrawl, so the backend does not see a running crawl
+        '''
+        sql = "INSERT INTO fetchlog (fetchTime, startTime, msg, calendarId) VALUES (NULL, NOW(), %s, %s)"
+
+        self.cursor.execute(sql, ("running", calendarId))
 
         self.db.commit()
-    
-    def insertMajorAndCourse(self, majors, courseId):
+
+        return self.cursor.lastrowid
+
+    def finishCrawl(self, crawlId, counts, msg, failed=False, pages=None):
         '''
-        Insert major and course into database
+        Close the fetchlog row of a crawl with its counts and number of committed pages,
+        counts is a dict with the keys of SYNC_COUNTS.
+        Checkpoints of a successful crawl are dropped, those of a failed one are kept for resumeCrawl
         '''
-        # if majors is empty, return
-        if majors is None:
-            return
-        
-        for major in majors:
-            # Get majorId
-            sql = "SELECT id FROM major WHERE name = %s"
+        sql = (
+            "UPDATE fetchlog SET fetchTime = NOW(), msg = %s,"
+            " inserted = %s, updated = %s, unchanged = %s, retired = %s, pages = %s"
+            " WHERE id = %s"
+        )
 
-            val = (major, )
+        self.cursor.execute(sql, (msg[:100], *(counts.get(key, 0) for key in SYNC_COUNTS), pages, crawlId))
 
-            self.cursor.execute(sql, val)
+        if not failed:
+            self.cursor.execute("DELETE FROM crawlpage WHERE crawlId = %s", (crawlId, ))
 
-            majorId = self.cursor.fetchone()[0]
+        self.db.commit()
 
-            # Insert
-            sql = "INSERT INTO majorandcourse (majorId, courseId) VALUES (%s, %s)"
+    def checkpointPages(self, crawlId, pages, counts):
+        '''
+        Record pages of a crawl as committed, pages is an array of (pageNum, pageTotal),
+        together with the counts so far, so that resumeCrawl can continue from them.
+        Call it after the courses of these pages are committed
+        '''
+        if not pages:
+            return
 
-            val = (majorId, courseId)
+        sql = "INSERT IGNORE INTO crawlpage (crawlId, pageNum, pageTotal) VALUES (%s, %s, %s)"
 
-            self.cursor.execute(sql, val)
+        self.cursor.executemany(sql, [(crawlId, pageNum, pageTotal) for pageNum, pageTotal in pages])
+
+        sql = "UPDATE fetchlog SET inserted = %s, updated = %s, unchanged = %s, retired = %s WHERE id = %s"
+
+        self.cursor.execute(sql, (*(counts.get(key, 0) for key in SYNC_COUNTS), crawlId))
 
         self.db.commit()
 
-    def insertLanguage(self, course):
+    def resumeCrawl(self, calendarId):
         '''
-        Insert language into database
+        Reopen the unfinished crawl of a calendar, i.e. its latest fetchlog row when it is
+        still running (the process died) or failed.
+        Returns (crawlId, counts so far, set of committed pageNum), None if there is nothing to resume
         '''
-        # if exists, return
-        sql = "SELECT * FROM language WHERE teachingLanguage = %s"
+        sql = (
+            "SELECT id, msg, inserted, updated, unchanged, retired FROM fetchlog"
+            " WHERE calendarId = %s ORDER BY id DESC LIMIT 1"
+        )
 
-        val = (course['teachingLanguage'], )
+        self.cursor.execute(sql, (calendarId, ))
 
-        self.cursor.execute(sql, val)
+        row = self.cursor.fetchone()
 
-        if self.cursor.fetchone() is not None:
-            return
-        
-        # Insert
-        sql = "INSERT INTO language (teachingLanguage, teachingLanguageI18n) VALUES (%s, %s)"
+        if row is None or not (row[1] == "running" or (row[1] or "").startswith("failed")):
+            return None
 
-        val = (course['teachingLanguage'], course['teachingLanguageI18n'])
+        crawlId = row[0]
+        counts = {key: count or 0 for key, count in zip(SYNC_COUNTS, row[2:])}
 
-        self.cursor.execute(sql, val)
+        self.cursor.execute("SELECT pageNum FROM crawlpage WHERE crawlId = %s", (crawlId, ))
+
+        pages = {pageNum for pageNum, in self.cursor.fetchall()}
+
+        self.cursor.execute("UPDATE fetchlog SET msg = %s WHERE id = %s", ("running", crawlId))
 
         self.db.commit()
 
-    def insertCourseList(self, courses):
+        return crawlId, counts, pages
+
+    def refreshEnrollment(self, rows, commit=True):
         '''
-        Insert course list into database
+        Update the capacity and enrolled count of known courses, rows is an array of
+        (id, number, elcNumber), see tjParse.enrollmentRow. Only changed courses are written,
+        all of them in one UPDATE, and each change is appended to enrollmenthistory.
+        Courses not in coursedetail yet are left to the next full crawl.
+        With commit=False the caller commits.
+        Returns the counts of changed, unchanged and unknown courses
         '''
-        for course in courses: # The courses array contains 20 courses
-            # Handle Foreign Key Constraint First
-            
-            print(course)
-            print("\n\n\n")
-            # input()
+        counts = dict.fromkeys(ENROLLMENT_COUNTS, 0)
 
-            self.insertLanguage(course) # Insert language
-            
-            self.insertCourseLabel(course) # Insert courseLabel
-            
-            self.insertAssessmentMode(course) # Insert assessmentMode
+        if not rows:
+            return counts
 
-            self.insertCampus(course) # Insert campus
+        ids = [row[0] for row in rows]
 
-            self.insertFaculty(course) # Insert faculty
+        self.cursor.execute(f"SELECT id, number, elcNumber FROM coursedetail WHERE id IN ({','.join(['%s'] * len(ids))})", ids)
 
-            self.insertCalendar(course) # Insert calendar
+        stored = {id: (number, elcNumber) for id, number, elcNumber in self.cursor.fetchall()}
 
-            self.insertMajors(course['majorList']) # Insert major
+        changed = []
 
-            # print("下面要插入课程啦，按回车键继续")
-            # input()
+        for id, number, elcNumber in rows:
+            if id not in stored:
+                counts['unknown'] += 1
+            elif stored[id] != (number, elcNumber):
+                counts['changed'] += 1
+                changed.append((id, number, elcNumber))
+            else:
+                counts['unchanged'] += 1
 
-            # Insert course
-            sql = (
-                "INSERT INTO coursedetail ("
-                "id, "
-                "code, "
-                "name, "
-                "courseLabelId, "
-                "assessmentMode, "
-                "period, "
-                "weekHour, "
-                "campus, "
-                "number, "
-                "elcNumber, "
-                "startWeek, "
-                "endWeek, "
-                "courseCode, "
-                "courseName, "
-                "credit, "
-                "teachingLanguage, "
-                "faculty, "
-                "calendarId"
-                ") VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"
-            )
+        if not changed:
+            return counts
 
-            val = (
-                course['id'], course['code'], course['name'],
-                course['courseLabelId'], course['assessmentMode'], course['period'], 
-                course['weekHour'], course['campus'], course['number'], 
-                course['elcNumber'], course['startWeek'], course['endWeek'], 
-                course['courseCode'], course['courseName'], course['credits'],
-                course['teachingLanguage'], course['faculty'], course['calendarId']
-            )
+        # 多行 UPDATE：把新值拼成派生表，按 id 连接
+        values = " UNION ALL ".join(["SELECT %s AS id, %s AS number, %s AS elcNumber"] * len(changed))
+        sql = (
+            f"UPDATE coursedetail c JOIN ({values}) v ON c.id = v.id"
+            " SET c.number = v.number, c.elcNumber = v.elcNumber"
+        )
 
-            try:
-                self.cursor.execute(sql, val)
+        try:
+            self.cursor.execute(sql, [value for row in changed for value in row])
+            self.cursor.executemany(ENROLLMENT_HISTORY_INSERT, changed)
 
+            if commit:
                 self.db.commit()
-            except Exception as e:
-                print(e)
-                print(val)
-                print("\n\n\n插入数据发生异常\n\n\n")
-                # input()
-
-            try:
-                self.insertTeachers(course['teacherList'], course['arrangeInfo']) # Insert teachers
-                self.insertMajorAndCourse(course['majorList'], course['id']) # Insert major and course
-            except Exception as e:
-                print(e)
-                print("\n\n\n插入教师数据发生异常\n\n\n")
-                # input()
+        except Exception:
+            self.db.rollback()
+
+            raise
+
+        return counts
 
 # 亡羊补牢（更新表格结构）的时候需要的函数，暂时不用
 
@@ -72,6 +72,8 @@ CREATE TABLE `coursedetail` (
   `teachingLanguage` VARCHAR(255) DEFAULT NULL,
   `faculty` VARCHAR(255) DEFAULT NULL,
   `calendarId` INT DEFAULT NULL,
+  `fingerprint` CHAR(40) DEFAULT NULL,  -- 入库字段的 sha1，见 crawler/utils/tjSql.courseFingerprint
+  `crawlId` INT DEFAULT NULL,  -- 最近一次见到这门课的 fetchlog.id
   PRIMARY KEY (`id`),
   KEY `courseCode` (`courseCode`),
   KEY `nature_idx` (`courseLabelId`),  
@@ -79,6 +81,7 @@ CREATE TABLE `coursedetail` (
   KEY `campusKey_idx` (`campus`),  
   KEY `facultyKey_idx` (`faculty`),  
   KEY `calendarKey_idx` (`calendarId`),  
+  KEY `calendarCode_idx` (`calendarId`, `code`),  -- 按教学班代码查询选课人数
   KEY `langKey_idx` (`teachingLanguage`),  
 
   CONSTRAINT `coursedetail_ibfk_1` FOREIGN KEY (`courseLabelId`) REFERENCES `coursenature` (`courseLabelId`),
@@ -108,6 +111,29 @@ CREATE TABLE `teacher` (
   CONSTRAINT `teacher_ibfk_1` FOREIGN KEY (`teachingClassId`) REFERENCES `coursedetail` (`id`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 
+-- 排课表，每行对应 teacher.arrangeInfoText 中的一行
+CREATE TABLE `arrangement` (
+  `id` BIGINT NOT NULL AUTO_INCREMENT,
+  `teachingClassId` BIGINT NOT NULL,
+  `teacherId` BIGINT NOT NULL,
+  `teacherCode` VARCHAR(255) DEFAULT NULL,
+  `calendarId` INT NOT NULL,
+  `occupyDay` TINYINT NOT NULL,  -- 1-7
+  `startSection` TINYINT NOT NULL,
+  `endSection` TINYINT NOT NULL,
+  `weekMask` BIGINT UNSIGNED NOT NULL DEFAULT 0,  -- 第 w 周对应第 w - 1 位
+  `room` VARCHAR(255) DEFAULT NULL,
+  `teacherAndCode` VARCHAR(255) DEFAULT NULL,  -- 形如 李华(13060)
+  `arrangementText` VARCHAR(255) DEFAULT NULL,  -- 去掉教师后的原文
+  PRIMARY KEY (`id`),
+  KEY `calendarDaySection_idx` (`calendarId`, `occupyDay`, `startSection`, `endSection`, `teachingClassId`),
+  KEY `calendarRoom_idx` (`calendarId`, `room`),
+  KEY `classKey_idx` (`teachingClassId`),
+  KEY `teacherKey_idx` (`teacherId`),
+  CONSTRAINT `arrangement_ibfk_1` FOREIGN KEY (`teachingClassId`) REFERENCES `coursedetail` (`id`),
+  CONSTRAINT `arrangement_ibfk_2` FOREIGN KEY (`teacherId`) REFERENCES `teacher` (`id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
 -- 专业与课程关联表
 CREATE TABLE `majorandcourse` (
   `id` INT NOT NULL AUTO_INCREMENT,  
@@ -127,5 +153,31 @@ CREATE TABLE `fetchlog` (
   `id` INT NOT NULL AUTO_INCREMENT,
   `fetchTime` DATETIME DEFAULT NULL,
   `msg` varchar(100) DEFAULT NULL,
+  `calendarId` INT DEFAULT NULL,
+  `inserted` INT DEFAULT NULL,  -- 以下为本次同步的计数，为 NULL 表示旧的全量爬取
+  `updated` INT DEFAULT NULL,
+  `unchanged` INT DEFAULT NULL,
+  `retired` INT DEFAULT NULL,
+  `startTime` DATETIME DEFAULT NULL,  -- 爬取开始时间，与 fetchTime 之差为耗时
+  `pages` INT DEFAULT NULL,  -- 已提交的页面数
   PRIMARY KEY (`id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
+-- 爬取断点表，记录一次爬取中已经提交的页面，爬取成功后清空
+CREATE TABLE `crawlpage` (
+  `crawlId` INT NOT NULL,  -- fetchlog.id
+  `pageNum` INT NOT NULL,
+  `pageTotal` INT DEFAULT NULL,
+  PRIMARY KEY (`crawlId`, `pageNum`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
+-- 选课人数变化记录，由 refreshEnrollment.py 在人数变化时追加
+CREATE TABLE `enrollmenthistory` (
+  `id` BIGINT NOT NULL AUTO_INCREMENT,
+  `courseId` BIGINT NOT NULL,  -- coursedetail.id
+  `number` INT DEFAULT NULL,  -- 变化后的容量
+  `elcNumber` INT DEFAULT NULL,  -- 变化后的已选人数
+  `changeTime` DATETIME NOT NULL,
+  PRIMARY KEY (`id`),
+  KEY `course_time_idx` (`courseId`, `changeTime`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
\ No newline at end of file
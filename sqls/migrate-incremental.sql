@@ -0,0 +1,62 @@
+-- 为已有数据库添加排课表、增量同步、断点续爬和选课人数刷新需要的列和表，新建的数据库直接使用 init-schema 即可
+
+USE tongji_course;
+
+ALTER TABLE `coursedetail`
+  ADD COLUMN `fingerprint` CHAR(40) DEFAULT NULL,
+  ADD COLUMN `crawlId` INT DEFAULT NULL;
+
+ALTER TABLE `fetchlog`
+  ADD COLUMN `calendarId` INT DEFAULT NULL,
+  ADD COLUMN `inserted` INT DEFAULT NULL,
+  ADD COLUMN `updated` INT DEFAULT NULL,
+  ADD COLUMN `unchanged` INT DEFAULT NULL,
+  ADD COLUMN `retired` INT DEFAULT NULL,
+  ADD COLUMN `startTime` DATETIME DEFAULT NULL,
+  ADD COLUMN `pages` INT DEFAULT NULL;
+
+-- 解析后的排课，每条排课一行，供按时间、教室查询；
+-- 建表后在 crawler 目录执行 python rebuildArrangement.py <calendarId> [calendarId ...]，由已有的 teacher.arrangeInfoText 回填
+CREATE TABLE IF NOT EXISTS `arrangement` (
+  `id` BIGINT NOT NULL AUTO_INCREMENT,
+  `teachingClassId` BIGINT NOT NULL,
+  `teacherId` BIGINT NOT NULL,
+  `teacherCode` VARCHAR(255) DEFAULT NULL,
+  `calendarId` INT NOT NULL,
+  `occupyDay` TINYINT NOT NULL,  -- 1-7
+  `startSection` TINYINT NOT NULL,
+  `endSection` TINYINT NOT NULL,
+  `weekMask` BIGINT UNSIGNED NOT NULL DEFAULT 0,  -- 第 w 周对应第 w - 1 位
+  `room` VARCHAR(255) DEFAULT NULL,
+  `teacherAndCode` VARCHAR(255) DEFAULT NULL,  -- 形如 李华(13060)
+  `arrangementText` VARCHAR(255) DEFAULT NULL,  -- 去掉教师后的原文
+  PRIMARY KEY (`id`),
+  KEY `calendarDaySection_idx` (`calendarId`, `occupyDay`, `startSection`, `endSection`, `teachingClassId`),
+  KEY `calendarRoom_idx` (`calendarId`, `room`),
+  KEY `classKey_idx` (`teachingClassId`),
+  KEY `teacherKey_idx` (`teacherId`),
+  CONSTRAINT `arrangement_ibfk_1` FOREIGN KEY (`teachingClassId`) REFERENCES `coursedetail` (`id`),
+  CONSTRAINT `arrangement_ibfk_2` FOREIGN KEY (`teacherId`) REFERENCES `teacher` (`id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
+CREATE TABLE IF NOT EXISTS `crawlpage` (
+  `crawlId` INT NOT NULL,
+  `pageNum` INT NOT NULL,
+  `pageTotal` INT DEFAULT NULL,
+  PRIMARY KEY (`crawlId`, `pageNum`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
+-- 选课人数变化记录，由 refreshEnrollment.py 在人数变化时追加
+CREATE TABLE IF NOT EXISTS `enrollmenthistory` (
+  `id` BIGINT NOT NULL AUTO_INCREMENT,
+  `courseId` BIGINT NOT NULL,  -- coursedetail.id
+  `number` INT DEFAULT NULL,  -- 变化后的容量
+  `elcNumber` INT DEFAULT NULL,  -- 变化后的已选人数
+  `changeTime` DATETIME NOT NULL,
+  PRIMARY KEY (`id`),
+  KEY `course_time_idx` (`courseId`, `changeTime`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
+-- 按教学班代码查询选课人数（/api/getEnrollmentByCodes）
+ALTER TABLE `coursedetail`
+  ADD KEY `calendarCode_idx` (`calendarId`, `code`);
@@ -4,6 +4,7 @@ import { createApp } from "vue";
 import store from "./store";
 import Antd from "ant-design-vue";
 import App from "./App.vue";
+import { installEtagCache } from "./utils/etagCache";
 
 const app = createApp(App);
 
@@ -11,4 +12,6 @@ app.use(Antd).use(store);
 
 store.commit('loadSolidify');
 
+installEtagCache();
+
 app.mount("#app");
@@ -2,10 +2,24 @@
 
 import type { arrangementInfolet, occupyCell } from "./myInterface";
 
-// helper function，判断两个数组是否有交集
-function hasIntersection(arr1: number[], arr2: number[]): boolean {
-  // 下边这行做的是：arr1 是否有一些元素，这些元素是 arr2 的子集
-  return arr1.some((item) => arr2.includes(item));
+// 周次的上限，与 common/arrangement.py 的 MAX_WEEK 相同。
+// 位运算按 32 位有符号整数进行，第 32 周会变成负数，所以只用到第 31 位
+const MAX_WEEK = 31;
+
+// 周次数组转为位掩码，第 w 周对应第 w - 1 位，超出 1 到 MAX_WEEK 的周次被忽略（后端解析时已经丢弃）
+export function weeksToMask(weeks: number[]): number {
+  let mask = 0;
+  for (const week of weeks) {
+    if (week >= 1 && week <= MAX_WEEK) {
+      mask |= 1 << (week - 1);
+    }
+  }
+  return mask;
+}
+
+// helper function，取出周次位掩码，没有现成的就由周次数组计算
+function weekMaskOf(item: { occupyWeek: number[]; occupyWeekMask?: number }): number {
+  return item.occupyWeekMask ?? weeksToMask(item.occupyWeek);
 }
 
 // 判断是否能够添加课程到课程表中
@@ -37,14 +51,15 @@ export function canAddCourse(
   // arrangementInfo 是 数组
   // occupied 是 12 * 7 的二维数组，每个元素是一个数组，存放了当前时间课程的课号和占用的周
   for (const arr of arrangementInfo) {
+    const weekMask = weekMaskOf(arr);
     // 遍历了一门课的全部时间段
     for (const occupyTimelet of arr.occupyTime) {
       // 遍历了一个时间段的全部时间
       // 如果这个时间段已经被占用了
       if (occupied[occupyTimelet - 1][arr.occupyDay - 1]) {
-        // 检查是否与已占用时段的课程有时间冲突
-        const collideItem = occupied[occupyTimelet - 1][arr.occupyDay - 1].find((item) =>
-          hasIntersection(arr.occupyWeek, item.occupyWeek),
+        // 检查是否与已占用时段的课程有时间冲突，周次有交集即按位与不为 0
+        const collideItem = occupied[occupyTimelet - 1][arr.occupyDay - 1].find(
+          (item) => (weekMask & weekMaskOf(item)) !== 0,
         );
         if (collideItem) {
           return {
@@ -68,12 +83,14 @@ export function insertOccupied(
   courseName: string,
 ) {
   for (const arr of arrangementInfo) {
+    const occupyWeekMask = weekMaskOf(arr);
     for (const occupyTimelet of arr.occupyTime) {
       // console.log("zhanyong", occupied);
       occupied[occupyTimelet - 1][arr.occupyDay - 1].push({
         code: code,
         courseName: courseName,
         occupyWeek: arr.occupyWeek,
+        occupyWeekMask: occupyWeekMask,
       });
     }
   }
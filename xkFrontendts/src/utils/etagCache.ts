@@ -0,0 +1,69 @@
+// POST 查询接口的 ETag 缓存
+// 浏览器只会为 GET 自动带上 If-None-Match，POST 需要自己记录 ETag 和响应
+
+import axios from "axios";
+
+type Entry = { etag: string; data: unknown };
+
+// 最多保留的响应数，超出时丢弃最久未用的一条。Map 按插入顺序遍历，命中时重新插入到末尾
+const MAX_ENTRIES = 100;
+
+const cache = new Map<string, Entry>();
+
+function remember(key: string, entry: Entry) {
+  cache.delete(key);
+  cache.set(key, entry);
+
+  if (cache.size > MAX_ENTRIES) {
+    const oldest = cache.keys().next().value;
+
+    if (oldest !== undefined) {
+      cache.delete(oldest);
+    }
+  }
+}
+
+function cacheKey(url: string | undefined, data: unknown): string {
+  return url + " " + (typeof data === "string" ? data : JSON.stringify(data ?? null));
+}
+
+export function installEtagCache() {
+  axios.interceptors.request.use((config) => {
+    if (config.method?.toLowerCase() !== "post") {
+      return config;
+    }
+
+    const cached = cache.get(cacheKey(config.url, config.data));
+
+    if (cached) {
+      config.headers.set("If-None-Match", cached.etag);
+      // 304 也算成功，在响应拦截器中换成缓存的数据
+      config.validateStatus = (status) => (status >= 200 && status < 300) || status === 304;
+    }
+
+    return config;
+  });
+
+  axios.interceptors.response.use((response) => {
+    if (response.config.method?.toLowerCase() !== "post") {
+      return response;
+    }
+
+    const key = cacheKey(response.config.url, response.config.data);
+
+    if (response.status === 304) {
+      const cached = cache.get(key);
+
+      if (cached) {
+        remember(key, cached);
+        response.data = structuredClone(cached.data); // 组件可能会修改返回的数据
+        response.status = 200;
+      }
+    } else if (response.status === 200 && response.headers["etag"]) {
+      // 存一份副本，组件修改 response.data 不会影响之后 304 时返回的数据
+      remember(key, { etag: response.headers["etag"], data: structuredClone(response.data) });
+    }
+
+    return response;
+  });
+}
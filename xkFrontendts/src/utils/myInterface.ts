@@ -3,6 +3,7 @@ export interface occupyCell {
   code: string;
   courseName: string;
   occupyWeek: number[];
+  occupyWeekMask?: number; // 第 w 周对应第 w - 1 位，旧的持久化数据没有这个字段
 }
 
 // timeTable 中的元素
@@ -20,6 +21,7 @@ export interface arrangementInfolet {
   occupyDay: number;
   occupyTime: number[];
   occupyWeek: number[];
+  occupyWeekMask?: number; // 请求 weekFormat 为 "both" 时由后端给出
   occupyRoom: string;
   teacherAndCode: string;
 }